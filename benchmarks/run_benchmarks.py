@@ -0,0 +1,260 @@
+"""
+Benchmarks for the app's hot paths: start-up imports, PDF extraction,
+prayer parsing, selection from the cycle and end-to-end synthesis against a
+local fake TTS server. Nothing here touches the network or the app's own data files.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --baseline old_results.json
+    python benchmarks/run_benchmarks.py --only parse
+
+Results are written as JSON (benchmarks/results.json by default). The run
+fails (exit code 1) if any benchmark is slower than its limit in
+benchmarks/thresholds.json, or, with --baseline, slower than the baseline
+run by more than the allowed ratio.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = PROJECT_ROOT / 'src' / 'valley_of_vision_app'
+sys.path.insert(0, str(APP_DIR))
+
+from prayer_selector import parse_prayers, select_prayer_from_cycle  # noqa: E402
+from prayer_store import titles_digest  # noqa: E402
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+PDF_PATH = PROJECT_ROOT / 'data' / 'raw' / 'The Valley of Vision.pdf'
+
+# The bundled book has about this many prayers; the synthetic books are
+# multiples of it.
+BOOK_PRAYERS = 194
+
+# One silent MPEG-1 Layer III frame (128 kbit/s, 44.1 kHz), as the fake TTS
+# server's audio. A few of them stand in for one spoken chunk.
+FAKE_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+_WORDS = ("lord grace mercy heart soul spirit light peace love truth faith hope "
+          "sin glory praise thee thy thou art holy father christ power joy").split()
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict:
+    """Runs func `repeat` times and returns its timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'runs': repeat,
+    }
+
+
+def synthetic_book(prayer_count: int, seed: int = 1) -> str:
+    """Builds book text laid out like the extracted PDF, with prayer_count prayers."""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(prayer_count):
+        # Titles are runs of capitals, as the parser expects.
+        title = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(2, 4))).upper()
+        lines = [' '.join(rng.choice(_WORDS) for _ in range(rng.randint(6, 12)))
+                 for _ in range(rng.randint(15, 40))]
+        parts.append(f"\n\n{title}\n" + '\n'.join(lines))
+    return ''.join(parts)
+
+
+# --- Benchmarks ---
+# Each returns a dict of named cases and their timings.
+
+def bench_startup(repeat: int) -> Dict:
+    """Times importing main in a fresh interpreter, less the interpreter's own start-up."""
+    def run(code: str):
+        subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, check=True)
+
+    interpreter = measure(lambda: run('pass'), repeat)
+    with_main = measure(lambda: run('import main'), repeat)
+    return {'import_main': {
+        'median': max(0.0, with_main['median'] - interpreter['median']),
+        'min': max(0.0, with_main['min'] - interpreter['min']),
+        'max': max(0.0, with_main['max'] - interpreter['max']),
+        'runs': repeat,
+    }}
+
+
+def bench_extract(repeat: int) -> Dict:
+    try:
+        from pdf_parser import extract_text_from_pdf
+    except ImportError:
+        print("Skipping extract: PyMuPDF is not installed.")
+        return {}
+    return {'extract_text_from_pdf': measure(lambda: extract_text_from_pdf(PDF_PATH), repeat)}
+
+
+def bench_parse(repeat: int) -> Dict:
+    results = {}
+    for scale in (10, 100):
+        text = synthetic_book(BOOK_PRAYERS * scale)
+        results[f'parse_prayers_{scale}x'] = measure(lambda: parse_prayers(text), repeat)
+    return results
+
+
+def bench_select(repeat: int) -> Dict:
+    """Selects from large collections with a cycle that is already far along."""
+    results = {}
+    for size in (10_000, 1_000_000):
+        prayers = [{'title': f'PRAYER {i}', 'body': ''} for i in range(size)]
+        # The app selects from a PrayerStore, which knows its digest; a list's is computed once here.
+        digest = titles_digest(p['title'] for p in prayers)
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = Path(tmp) / 'prayer_cycle.json'
+            select_prayer_from_cycle(prayers, state_path)
+            state = json.loads(state_path.read_text())
+            state['cursor'] = size - repeat - 2
+            state_path.write_text(json.dumps(state))
+            results[f'select_prayer_{size}'] = measure(
+                lambda: select_prayer_from_cycle(prayers, state_path, digest), repeat)
+    return results
+
+
+class FakeTTSServer(ThreadingHTTPServer):
+    """A local ttsopenai-style endpoint that answers every request after `delay` seconds."""
+    daemon_threads = True
+
+    def __init__(self, delay: float):
+        super().__init__(('127.0.0.1', 0), FakeTTSHandler)
+        self.delay = delay
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/tts"
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.delay)
+        payload = FAKE_FRAME * 20
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_synthesize(repeat: int, latency: float = 0.05) -> Dict:
+    """Renders a full day's speech text to a file, with `latency` seconds per request."""
+    try:
+        import tts_engine
+        from ttsopenai_synthesizer import TTSOpenAIEngine
+    except ImportError:
+        print("Skipping synthesize: httpx is not installed.")
+        return {}
+    import main
+
+    # The fake server needs no real key, but the engine insists on one.
+    tts_engine._dotenv_loaded = True
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+    body = '\n'.join(synthetic_book(1, seed=7).splitlines()[2:])
+    text = main.format_speech_text({'title': 'A BENCHMARK PRAYER', 'body': body})
+
+    server = FakeTTSServer(latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            async def render_once():
+                async with TTSOpenAIEngine(url=server.url) as engine:
+                    await engine.render_to_file(text, Path(tmp) / 'prayer.mp3')
+
+            timings = measure(lambda: asyncio.run(render_once()), repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+    timings['request_latency'] = latency
+    return {'synthesize_to_file': timings}
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'extract': bench_extract,
+    'parse': bench_parse,
+    'select': bench_select,
+    'synthesize': bench_synthesize,
+}
+
+
+def check_results(results: Dict, thresholds: Dict, baseline: Dict = None) -> List[str]:
+    """Returns a description of every benchmark that is over its threshold or regressed."""
+    problems = []
+    limits = thresholds.get('max_seconds', {})
+    max_ratio = thresholds.get('max_regression_ratio', 1.5)
+    for name, timings in results.items():
+        if name in limits and timings['median'] > limits[name]:
+            problems.append(f"{name}: median {timings['median']:.4f}s is over its limit of {limits[name]}s")
+        if baseline and name in baseline:
+            previous = baseline[name]['median']
+            if previous > 0 and timings['median'] > previous * max_ratio:
+                problems.append(f"{name}: median {timings['median']:.4f}s is more than "
+                                f"{max_ratio}x the baseline's {previous:.4f}s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Valley of Vision app's hot paths.")
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), action='append',
+                        help="Run just this benchmark (can be given more than once).")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case.")
+    parser.add_argument('--output', type=Path, default=BENCHMARK_DIR / 'results.json')
+    parser.add_argument('--thresholds', type=Path, default=BENCHMARK_DIR / 'thresholds.json')
+    parser.add_argument('--baseline', type=Path, help="An earlier results file to compare against.")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...")
+        for case, timings in BENCHMARKS[name](args.repeat).items():
+            results[case] = timings
+            print(f"  {case:<28} median {timings['median'] * 1000:9.2f} ms   min {timings['min'] * 1000:9.2f} ms")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds.exists() else {}
+    baseline = json.loads(args.baseline.read_text())['results'] if args.baseline else None
+    problems = check_results(results, thresholds, baseline)
+    for problem in problems:
+        print(f"REGRESSION  {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
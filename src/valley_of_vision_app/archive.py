@@ -0,0 +1,412 @@
+import os
+import json
+import struct
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from email.utils import format_datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from file_utils import atomic_write_bytes, atomic_write_text, sha256_file
+from mp3_utils import mp3_duration
+from search_index import document_key
+
+logger = logging.getLogger(__name__)
+
+# The archive is an append-only log of every prayer a tenant has been given,
+# one JSON object per line:
+#
+#   {"date": "2024-05-02", "title": "THE TRINITY", "prayer_id": "9f2c...",
+#    "file": "prayer_2024-05-02.mp3", "sha256": "...", "duration": 312.4, "bytes": 5001234}
+#
+# "prayer_id" is the prayer's content key (the same one the search index
+# uses). If a day is generated again, the new line replaces the old one for
+# lookups. Unlike prayer_log.json, nothing is ever removed when a cycle ends.
+#
+# Next to the log are two indexes. Each entry in them is a date ordinal and
+# the offset and length of that date's current line in the log:
+#
+#   archive.idx          a header, then one entry per date, in date order
+#   archive.titles.idx   the same entries, in order of normalized title
+#
+# The header holds the format version, how many bytes of the log the
+# indexes cover, and a flag that is set while they are being changed.
+# Lookups are binary searches of the index files, reading only the log
+# lines they compare or return, so opening the archive, adding a day and
+# finding a title never read the whole log. Lines the indexes do not cover
+# yet (after a crash between the writes) are indexed when the archive is
+# next opened; indexes found mid-change, damaged or missing are rebuilt
+# from the log.
+
+ARCHIVE_NAME = 'archive.jsonl'
+FEED_NAME = 'feed.xml'
+
+INDEX_MAGIC = b'VOVA'
+INDEX_VERSION = 2
+_INDEX_HEADER = struct.Struct('<4sHHQ')
+_INDEX_ENTRY = struct.Struct('<IQI')
+# The header flag set while the indexes are being changed.
+_CHANGING = 1
+
+
+def _title_key(title: str) -> str:
+    return ' '.join(title.split()).casefold()
+
+
+def make_record(day: date, prayer, audio_path: Path) -> Dict:
+    """Builds the archive record for a day's audio file."""
+    return {
+        'date': day.isoformat(),
+        'title': prayer['title'],
+        'prayer_id': document_key(prayer['title'], prayer['body']),
+        'file': audio_path.name,
+        'sha256': sha256_file(audio_path),
+        'duration': round(mp3_duration(audio_path.read_bytes()), 3),
+        'bytes': audio_path.stat().st_size,
+    }
+
+
+def refresh_record(record: Dict, audio_path: Path) -> Dict:
+    """Returns a copy of a record with the hash, length and size of its audio file as it is now."""
+    return dict(record, sha256=sha256_file(audio_path), duration=round(mp3_duration(audio_path.read_bytes()), 3),
+                bytes=audio_path.stat().st_size)
+
+
+def _count(index: BinaryIO, base: int) -> int:
+    return (os.fstat(index.fileno()).st_size - base) // _INDEX_ENTRY.size
+
+
+def _entry(index: BinaryIO, base: int, position: int) -> Tuple[int, int, int]:
+    index.seek(base + position * _INDEX_ENTRY.size)
+    return _INDEX_ENTRY.unpack(index.read(_INDEX_ENTRY.size))
+
+
+def _search(index: BinaryIO, base: int, key: Callable[[Tuple[int, int, int]], Any], target: Any) -> int:
+    """Returns the position of the first entry whose key is not below target."""
+    low, high = 0, _count(index, base)
+    while low < high:
+        middle = (low + high) // 2
+        if key(_entry(index, base, middle)) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _insert(index: BinaryIO, base: int, position: int, entry: bytes):
+    index.seek(base + position * _INDEX_ENTRY.size)
+    rest = index.read()
+    index.seek(base + position * _INDEX_ENTRY.size)
+    index.write(entry + rest)
+
+
+def _delete(index: BinaryIO, base: int, position: int):
+    index.seek(base + (position + 1) * _INDEX_ENTRY.size)
+    rest = index.read()
+    index.seek(base + position * _INDEX_ENTRY.size)
+    index.write(rest)
+    index.truncate()
+
+
+def _read_record(log: BinaryIO, entry: Tuple[int, int, int]) -> Dict:
+    log.seek(entry[1])
+    return json.loads(log.read(entry[2]))
+
+
+class Archive:
+    """
+    A tenant's archive, with lookups by date and by title.
+
+    Every lookup, by date, date range, newest days or title prefix, is a
+    binary search of the persisted indexes that reads only the log lines it
+    compares or returns, so its cost does not grow with the years the
+    archive covers.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index_path = path.with_suffix('.idx')
+        self.titles_path = path.with_suffix('.titles.idx')
+        # The byte offset up to which the log is indexed.
+        self._indexed = 0
+        self._open_index()
+
+    # --- The indexes ---
+
+    def _open_index(self):
+        try:
+            log_size = self.path.stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+        try:
+            with open(self.index_path, 'rb') as f:
+                header = f.read(_INDEX_HEADER.size)
+            index_size = self.index_path.stat().st_size
+            titles_size = self.titles_path.stat().st_size
+        except FileNotFoundError:
+            header, index_size, titles_size = b'', 0, 0
+
+        if len(header) == _INDEX_HEADER.size:
+            magic, version, flags, indexed = _INDEX_HEADER.unpack(header)
+            entries_size = index_size - _INDEX_HEADER.size
+            if (magic == INDEX_MAGIC and version == INDEX_VERSION and not flags & _CHANGING
+                    and indexed <= log_size and entries_size % _INDEX_ENTRY.size == 0
+                    and titles_size == entries_size):
+                self._indexed = indexed
+                if log_size > indexed:
+                    self._index_tail()
+                return
+        if log_size:
+            logger.info(f"Rebuilding the indexes of {self.path}.")
+        self._rebuild()
+
+    def _rebuild(self):
+        """Builds both indexes afresh from the whole log."""
+        entries: Dict[int, Tuple[int, int, int]] = {}
+        title_keys: Dict[int, str] = {}
+        offset = 0
+        try:
+            with open(self.path, 'rb') as log:
+                for line in log:
+                    if not line.endswith(b'\n'):
+                        # Cut short by a crash; the next append starts a new line after it.
+                        break
+                    try:
+                        record = json.loads(line)
+                        ordinal = date.fromisoformat(record['date']).toordinal()
+                        title_keys[ordinal] = _title_key(record['title'])
+                        entries[ordinal] = (ordinal, offset, len(line))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        logger.warning(f"Skipping unreadable line at byte {offset} of {self.path}.")
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+
+        by_title = sorted(entries, key=lambda ordinal: (title_keys[ordinal], ordinal))
+        atomic_write_bytes(self.titles_path, b''.join(_INDEX_ENTRY.pack(*entries[o]) for o in by_title))
+        # The date index, with its header, goes last: until it is in place the
+        # old one (if any) still fails the checks and is rebuilt again.
+        atomic_write_bytes(self.index_path, _INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, offset)
+                           + b''.join(_INDEX_ENTRY.pack(*entries[o]) for o in sorted(entries)))
+        self._indexed = offset
+
+    def _write_header(self, dates: BinaryIO, flags: int):
+        dates.seek(0)
+        dates.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, flags, self._indexed))
+        dates.flush()
+        os.fsync(dates.fileno())
+
+    @contextmanager
+    def _changing(self) -> Iterator[Tuple[BinaryIO, BinaryIO, BinaryIO]]:
+        """
+        Opens the log and both indexes for a change. The header is flagged
+        first and only cleared once the indexes are on disk, so a crash in
+        between leaves a flag that makes the next open rebuild them.
+        """
+        with open(self.path, 'rb') as log, open(self.index_path, 'r+b') as dates, \
+                open(self.titles_path, 'r+b') as titles:
+            self._write_header(dates, _CHANGING)
+            yield log, dates, titles
+            titles.flush()
+            os.fsync(titles.fileno())
+            self._write_header(dates, 0)
+
+    def _index_tail(self):
+        """Indexes the complete lines of the log after the indexed offset."""
+        with self._changing() as (log, dates, titles), open(self.path, 'rb') as tail:
+            tail.seek(self._indexed)
+            offset = self._indexed
+            for line in tail:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    self._point(log, dates, titles, json.loads(line), offset, len(line))
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    logger.warning(f"Skipping unreadable line at byte {offset} of {self.path}.")
+                offset += len(line)
+            self._indexed = offset
+
+    def _title_order(self, log: BinaryIO) -> Callable[[Tuple[int, int, int]], Tuple[str, int]]:
+        return lambda entry: (_title_key(_read_record(log, entry)['title']), entry[0])
+
+    def _point(self, log: BinaryIO, dates: BinaryIO, titles: BinaryIO, record: Dict, offset: int, length: int):
+        """Points a record's date at its log line in both indexes, replacing the date's old line."""
+        ordinal = date.fromisoformat(record['date']).toordinal()
+        title_key = _title_key(record['title'])
+        entry = _INDEX_ENTRY.pack(ordinal, offset, length)
+        by_title = self._title_order(log)
+
+        base = _INDEX_HEADER.size
+        position = _search(dates, base, lambda e: e[0], ordinal)
+        if position < _count(dates, base) and _entry(dates, base, position)[0] == ordinal:
+            old = _entry(dates, base, position)
+            _delete(titles, 0, _search(titles, 0, by_title, by_title(old)))
+            dates.seek(base + position * _INDEX_ENTRY.size)
+            dates.write(entry)
+        else:
+            _insert(dates, base, position, entry)
+        _insert(titles, 0, _search(titles, 0, by_title, (title_key, ordinal)), entry)
+
+    # --- Public interface ---
+
+    def append(self, record: Dict) -> bool:
+        """
+        Adds a record to the end of the log, flushed to disk, and points its
+        date at it in the indexes. A record that is identical to the one
+        already held for its date is not written again.
+
+        Returns:
+            True if the record was written.
+        """
+        if self.get(date.fromisoformat(record['date'])) == record:
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset > self._indexed:
+                # A line cut short by a crash; end it so this record gets its own line.
+                f.write(b'\n')
+                offset += 1
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._changing() as (log, dates, titles):
+            self._point(log, dates, titles, record, offset, len(line))
+            self._indexed = offset + len(line)
+        return True
+
+    def _by_date(self, start: Callable[[BinaryIO], int], stop: Callable[[BinaryIO], int]) -> List[Dict]:
+        base = _INDEX_HEADER.size
+        with open(self.index_path, 'rb') as dates:
+            first, last = start(dates), stop(dates)
+            if first >= last:
+                return []
+            with open(self.path, 'rb') as log:
+                return [_read_record(log, _entry(dates, base, position)) for position in range(first, last)]
+
+    def _first_from(self, day: date) -> Callable[[BinaryIO], int]:
+        return lambda dates: _search(dates, _INDEX_HEADER.size, lambda e: e[0], day.toordinal())
+
+    def get(self, day: date) -> Optional[Dict]:
+        """Returns the record for a date, or None."""
+        records = self.between(day, day)
+        return records[0] if records else None
+
+    def between(self, first: date, last: date) -> List[Dict]:
+        """Returns the records from first to last (inclusive), oldest first."""
+        return self._by_date(self._first_from(first), self._first_from(last + timedelta(days=1)))
+
+    def latest(self, count: int, until: date) -> List[Dict]:
+        """Returns up to `count` records dated `until` or earlier, newest first."""
+        end = self._first_from(until + timedelta(days=1))
+        return self._by_date(lambda dates: max(0, end(dates) - count), end)[::-1]
+
+    def find_title(self, title: str) -> List[Dict]:
+        """
+        Returns the records whose title starts with `title`, ignoring case and
+        spacing, oldest first.
+        """
+        key = _title_key(title)
+        matches = []
+        with open(self.titles_path, 'rb') as titles, open(self.path, 'rb') as log:
+            position = _search(titles, 0, self._title_order(log), (key, 0))
+            while position < _count(titles, 0):
+                record = _read_record(log, _entry(titles, 0, position))
+                if not _title_key(record['title']).startswith(key):
+                    break
+                matches.append(record)
+                position += 1
+        return sorted(matches, key=lambda record: record['date'])
+
+    def __len__(self) -> int:
+        with open(self.index_path, 'rb') as dates:
+            return _count(dates, _INDEX_HEADER.size)
+
+
+class FeedSettings:
+    """The podcast feed's details. See the [Feed] section of config.ini."""
+
+    def __init__(self, title: str = 'The Valley of Vision', description: str = 'A daily Puritan prayer.',
+                 base_url: str = 'http://127.0.0.1:8080', max_items: int = 60, language: str = 'en'):
+        self.title = title
+        self.description = description
+        self.base_url = base_url.rstrip('/')
+        self.max_items = max_items
+        self.language = language
+
+    @classmethod
+    def from_config(cls, config) -> 'FeedSettings':
+        """Reads the [Feed] section of config.ini."""
+        if not config.has_section('Feed'):
+            return cls()
+        section = config['Feed']
+        return cls(
+            title=section.get('Title', 'The Valley of Vision'),
+            description=section.get('Description', 'A daily Puritan prayer.'),
+            base_url=section.get('BaseURL', 'http://127.0.0.1:8080'),
+            max_items=section.getint('MaxItems', 60),
+            language=section.get('Language', 'en'),
+        )
+
+
+def _duration_text(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def _feed_item(record: Dict, url_prefix: str) -> str:
+    published = datetime.combine(date.fromisoformat(record['date']), time()).astimezone()
+    title = ' '.join(record['title'].split())
+    return (
+        "    <item>\n"
+        f"      <title>{escape(title)}</title>\n"
+        f"      <enclosure url={quoteattr(url_prefix + record['file'])} length=\"{record['bytes']}\" type=\"audio/mpeg\"/>\n"
+        f"      <guid isPermaLink=\"false\">{record['date']}-{record['sha256'][:16]}</guid>\n"
+        f"      <pubDate>{format_datetime(published)}</pubDate>\n"
+        f"      <itunes:duration>{_duration_text(record['duration'])}</itunes:duration>\n"
+        "    </item>\n"
+    )
+
+
+def render_feed(archive: Archive, settings: FeedSettings, today: date, url_prefix: str) -> str:
+    """
+    Returns the RSS podcast feed of the newest settings.max_items days up to
+    today. Days rendered ahead of time are left out until their date.
+    """
+    items = ''.join(_feed_item(record, url_prefix) for record in archive.latest(settings.max_items, today))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">\n'
+        "  <channel>\n"
+        f"    <title>{escape(settings.title)}</title>\n"
+        f"    <link>{escape(settings.base_url)}/</link>\n"
+        f"    <description>{escape(settings.description)}</description>\n"
+        f"    <language>{escape(settings.language)}</language>\n"
+        f"{items}"
+        "  </channel>\n"
+        "</rss>\n"
+    )
+
+
+def update_feed(feed_path: Path, archive: Archive, settings: FeedSettings, today: date, url_prefix: str) -> bool:
+    """
+    Rewrites the feed from the archive's newest records. Only those records
+    are read (a binary search into the archive), never the output folder, so
+    the cost does not grow with the archive. The file is left alone if
+    nothing in it would change.
+
+    Returns:
+        True if the feed was written.
+    """
+    feed = render_feed(archive, settings, today, url_prefix)
+    try:
+        if feed_path.read_text(encoding='utf-8') == feed:
+            return False
+    except OSError:
+        pass
+    atomic_write_text(feed_path, feed)
+    return True
@@ -0,0 +1,109 @@
+import os
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+import metrics
+from file_utils import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+# Where synthesized segments are kept when no other location is configured.
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / "cache" / "audio"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+
+class AudioCache:
+    """
+    A disk cache of synthesized audio segments, with least-recently-used
+    eviction once the cache grows past max_bytes.
+
+    Each segment is stored in a file named after the hash of everything that
+    determines its sound (text, backend, voice and model), so the fixed intro,
+    the closing and any prayer heard in an earlier cycle are only ever paid
+    for once. A file's modification time records when it was last used.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str, backend: str, voice: Optional[str], model: Optional[str]) -> str:
+        """Returns the cache key for a segment."""
+        hasher = hashlib.sha256()
+        for part in (backend, voice or '', model or '', text):
+            hasher.update(part.encode('utf-8'))
+            hasher.update(b'\0')
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached audio for a key, or None on a miss."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            # Mark the segment as recently used.
+            os.utime(path)
+        except OSError:
+            metrics.increment('audio_cache_misses')
+            return None
+        metrics.increment('audio_cache_hits')
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Stores audio under a key, evicting the least recently used segments if needed."""
+        path = self._path(key)
+        with self._lock:
+            total = self._current_total()
+            if path.exists():
+                total -= path.stat().st_size
+            atomic_write_bytes(path, data)
+            self._total_bytes = total + len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _current_total(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*.mp3'))
+        return self._total_bytes
+
+    def _evict(self):
+        """Deletes the least recently used segments until the cache fits."""
+        entries = []
+        for path in self.cache_dir.glob('*.mp3'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                logger.debug(f"Evicted {path.name} from the audio cache.")
+            except OSError:
+                pass
+        self._total_bytes = total
+
+
+_default_cache: Optional[AudioCache] = None
+
+
+def get_default_cache() -> AudioCache:
+    """Returns the process-wide cache in the default location."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AudioCache(DEFAULT_CACHE_DIR)
+    return _default_cache
@@ -0,0 +1,361 @@
+import os
+import re
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import daily_manifest
+from archive import FEED_NAME
+from file_utils import sha256_fd
+from tenants import Tenant
+
+logger = logging.getLogger(__name__)
+
+# Only generated prayer files can be requested, which also rules out any
+# attempt to reach other files with "../" in the path.
+AUDIO_FILE_PATTERN = re.compile(r"prayer_\d{4}-\d{2}-\d{2}\.mp3")
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+# A connection with no new request for this long is closed.
+KEEP_ALIVE_SECONDS = 15
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {
+    200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request',
+    404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable',
+}
+
+
+class Request:
+    def __init__(self, method: str, path: str, version: str, headers: Dict[str, str]):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+    """Reads the request line and headers, or returns None when the client is done."""
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ValueError("Malformed request line")
+    method, target, version = parts
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("Too many headers")
+    return method, target, version, headers
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Reads one request's head from the connection, or returns None when the client is done."""
+    # One deadline covers the whole head, so a client trickling header lines can't hold the connection.
+    head = await asyncio.wait_for(_read_head(reader), KEEP_ALIVE_SECONDS)
+    if head is None:
+        return None
+    method, target, version, headers = head
+
+    # GET and HEAD requests have no body, but skip one if a client sends it.
+    length = int(headers.get('content-length', 0) or 0)
+    if length:
+        await reader.readexactly(length)
+    return Request(method.upper(), unquote(urlsplit(target).path), version, headers)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a Range header into an inclusive (start, end) byte range.
+
+    Returns None to serve the whole file (no header, or several ranges,
+    which servers may ignore).
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(header)
+    if not first:
+        # "bytes=-500" means the last 500 bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+class AudioServer:
+    """
+    A small HTTP server for the generated prayer audio, built on asyncio so
+    that one process holds many listeners' connections at once.
+
+    Routes, where "<tenant>/" is left out for the first (or only) tenant:
+        GET /<tenant>/prayer_YYYY-MM-DD.mp3  The audio, with Range support.
+        GET /<tenant>/today.json              Today's title, text and audio file.
+        GET /<tenant>/feed.xml                The podcast feed.
+
+    Audio responses carry an ETag made from the file's SHA-256, so players
+    that already have the file get a 304. File contents are sent with
+    sendfile(), straight from the page cache to the socket. Each file is
+    hashed once per version, however many listeners ask at the same time.
+    """
+
+    def __init__(self, tenants: List[Tenant], prayers=None, host: str = '127.0.0.1', port: int = 8080):
+        self.tenants = {tenant.name: tenant for tenant in tenants}
+        self.default_tenant = tenants[0]
+        self.prayers = prayers
+        self.host = host
+        self.port = port
+        self._etags: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+        self._hashing: Dict[Tuple[Path, Tuple[int, int]], asyncio.Future] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving prayer audio on http://{self.host}:{self.port}/")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- Connections ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    await self._send_error(writer, 400, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self._handle_request(request, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        keep_alive = request.keep_alive
+        if request.method not in ('GET', 'HEAD'):
+            await self._send_error(writer, 405, keep_alive, {'Allow': 'GET, HEAD'})
+            return keep_alive
+
+        tenant, name = self._route(request.path)
+        if tenant is None:
+            await self._send_error(writer, 404, keep_alive)
+        elif name == 'today.json':
+            await self._send_today(request, writer, tenant, keep_alive)
+        elif name == FEED_NAME:
+            await self._send_feed(request, writer, tenant, keep_alive)
+        elif AUDIO_FILE_PATTERN.fullmatch(name):
+            await self._send_audio(request, writer, tenant.output_dir / name, keep_alive)
+        else:
+            await self._send_error(writer, 404, keep_alive)
+        return keep_alive
+
+    def _route(self, path: str) -> Tuple[Optional[Tenant], str]:
+        parts = [part for part in path.split('/') if part]
+        if len(parts) == 1:
+            return self.default_tenant, parts[0]
+        if len(parts) == 2 and parts[0] in self.tenants:
+            return self.tenants[parts[0]], parts[1]
+        return None, ''
+
+    # --- Responses ---
+
+    async def _send_head(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str], keep_alive: bool):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+        headers = {
+            'Date': format_datetime(datetime.now(timezone.utc), usegmt=True),
+            'Server': 'valley-of-vision',
+            'Connection': 'keep-alive' if keep_alive else 'close',
+            **headers,
+        }
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send_bytes(self, request: Request, writer: asyncio.StreamWriter, status: int, body: bytes,
+                          content_type: str, keep_alive: bool, headers: Optional[Dict[str, str]] = None):
+        await self._send_head(writer, status, {
+            'Content-Type': content_type,
+            'Content-Length': str(len(body)),
+            **(headers or {}),
+        }, keep_alive)
+        if request is None or request.method != 'HEAD':
+            writer.write(body)
+            await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool,
+                          headers: Optional[Dict[str, str]] = None):
+        body = json.dumps({'error': STATUS_TEXT[status]}).encode('utf-8')
+        await self._send_bytes(None, writer, status, body, 'application/json', keep_alive, headers)
+
+    async def _etag(self, path: Path, file, stat) -> str:
+        """
+        Returns the ETag of the open file, hashing each version of a file
+        only once however many requests ask for it at the same time.
+        """
+        version = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._etags.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        key = (path, version)
+        owner = key not in self._hashing
+        if owner:
+            # Hash a duplicate of the descriptor, so the hash can finish even
+            # if this request's connection closes its file first.
+            fd = os.dup(file.fileno())
+
+            def hash_and_close() -> str:
+                try:
+                    return sha256_fd(fd)
+                finally:
+                    os.close(fd)
+
+            self._hashing[key] = asyncio.get_running_loop().run_in_executor(None, hash_and_close)
+        try:
+            digest = await asyncio.shield(self._hashing[key])
+        finally:
+            # Only the request that started the hash removes it, so the ones
+            # still waiting do not start it again.
+            if owner:
+                self._hashing.pop(key, None)
+        etag = f'"{digest[:32]}"'
+        self._etags[path] = (version, etag)
+        return etag
+
+    async def _send_audio(self, request: Request, writer: asyncio.StreamWriter, path: Path, keep_alive: bool):
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            await self._send_error(writer, 404, keep_alive)
+            return
+
+        with file:
+            # Everything is taken from the open file, not the path: if a new
+            # version is moved into place meanwhile, the headers still
+            # describe the bytes that are sent.
+            stat = os.fstat(file.fileno())
+            size = stat.st_size
+            etag = await self._etag(path, file, stat)
+            headers = {
+                'Accept-Ranges': 'bytes',
+                'ETag': etag,
+                'Last-Modified': format_datetime(datetime.fromtimestamp(stat.st_mtime, timezone.utc), usegmt=True),
+                # A day's file can be re-rendered, so players should check back.
+                'Cache-Control': 'public, max-age=300',
+            }
+
+            if self._not_modified(request, etag, stat.st_mtime):
+                await self._send_head(writer, 304, headers, keep_alive)
+                return
+
+            try:
+                byte_range = parse_range(request.headers.get('range'), size)
+            except ValueError:
+                await self._send_error(writer, 416, keep_alive, {'Content-Range': f"bytes */{size}"})
+                return
+
+            if byte_range is None:
+                status, start, length = 200, 0, size
+            else:
+                start, end = byte_range
+                status, length = 206, end - start + 1
+                headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+
+            await self._send_head(writer, status, {
+                'Content-Type': 'audio/mpeg',
+                'Content-Length': str(length),
+                **headers,
+            }, keep_alive)
+            if request.method != 'HEAD' and length:
+                # Uses os.sendfile() where the platform supports it.
+                await asyncio.get_running_loop().sendfile(writer.transport, file, start, length)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def _send_today(self, request: Request, writer: asyncio.StreamWriter, tenant: Tenant, keep_alive: bool):
+        today = datetime.now().date()
+        entry = daily_manifest.get_day(daily_manifest.load_manifest(tenant.manifest_file), today)
+        if entry is None:
+            await self._send_error(writer, 404, keep_alive)
+            return
+
+        prayer = self.prayers.get(entry['title']) if self.prayers is not None else None
+        prefix = '' if tenant is self.default_tenant else f"/{tenant.name}"
+        body = json.dumps({
+            'date': today.isoformat(),
+            'title': entry['title'],
+            'body': prayer['body'] if prayer is not None else None,
+            'audio': f"{prefix}/{entry['file']}",
+        }, ensure_ascii=False).encode('utf-8')
+        await self._send_bytes(request, writer, 200, body, 'application/json; charset=utf-8', keep_alive,
+                               {'Cache-Control': 'no-cache'})
+
+    async def _send_feed(self, request: Request, writer: asyncio.StreamWriter, tenant: Tenant, keep_alive: bool):
+        try:
+            body = (tenant.output_dir / FEED_NAME).read_bytes()
+        except OSError:
+            await self._send_error(writer, 404, keep_alive)
+            return
+        await self._send_bytes(request, writer, 200, body, 'application/rss+xml; charset=utf-8', keep_alive,
+                               {'Cache-Control': 'no-cache'})
@@ -0,0 +1,97 @@
+import json
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from file_utils import atomic_write_json
+
+# The daily manifest records which prayer belongs to which date and where its
+# audio file is. It looks like this:
+#
+#   {
+#     "last_selected": "2024-05-01",
+#     "days": {"2024-05-02": {"title": "THE TRINITY", "file": "prayer_2024-05-02.mp3"}}
+#   }
+#
+# "last_selected" is the most recent date for which the prayer cycle has
+# been advanced, and "selected_title" the prayer it gave, so a rerun on the
+# same day reuses it. Entries after it were rendered ahead of time. An entry whose
+# audio has been post-processed also has "processed": true.
+
+
+def load_manifest(manifest_path: Path) -> Dict:
+    """Loads the daily manifest, or returns an empty one if it is missing or corrupt."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get('days'), dict):
+            return manifest
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {'last_selected': None, 'days': {}}
+
+
+def save_manifest(manifest_path: Path, manifest: Dict):
+    """Atomically writes the daily manifest, with the days in date order."""
+    manifest['days'] = dict(sorted(manifest['days'].items()))
+    atomic_write_json(manifest_path, manifest, indent=2)
+
+
+def get_day(manifest: Dict, day: date) -> Optional[Dict]:
+    """Returns the manifest entry for a date, or None."""
+    return manifest['days'].get(day.isoformat())
+
+
+def record_day(manifest: Dict, day: date, title: str, audio_path: Path):
+    """Records the prayer and audio file for a date."""
+    manifest['days'][day.isoformat()] = {'title': title, 'file': audio_path.name}
+
+
+def mark_processed(manifest: Dict, day: date):
+    """Notes that the audio file for a date has been post-processed."""
+    entry = manifest['days'].get(day.isoformat())
+    if entry is not None:
+        entry['processed'] = True
+
+
+def unprocessed_days(manifest: Dict) -> List[date]:
+    """Returns the dates whose audio has not been post-processed yet, in order."""
+    return [date.fromisoformat(day) for day, entry in sorted(manifest['days'].items())
+            if not entry.get('processed')]
+
+
+def mark_selected(manifest: Dict, day: date, title: Optional[str] = None):
+    """Notes that the prayer cycle has been advanced for this date, and which prayer it gave."""
+    manifest['last_selected'] = day.isoformat()
+    manifest['selected_title'] = title
+
+
+def selected_title(manifest: Dict, day: date) -> Optional[str]:
+    """Returns the prayer already taken from the cycle for this date, or None."""
+    if manifest.get('last_selected') == day.isoformat():
+        return manifest.get('selected_title')
+    return None
+
+
+def is_day_done(manifest: Dict, day: date, output_dir: Path) -> bool:
+    """
+    Tells whether a date's prayer has been taken from the cycle and its
+    audio file is in place. A day whose synthesis failed is not done.
+    """
+    last_selected = manifest.get('last_selected')
+    if not last_selected or last_selected < day.isoformat():
+        return False
+    entry = get_day(manifest, day)
+    return entry is not None and (output_dir / entry['file']).exists()
+
+
+def next_unselected_day(manifest: Dict, today: date) -> date:
+    """
+    Returns the first date whose prayer has not been taken from the cycle yet.
+    This is the date that the next prayer in the cycle belongs to.
+    """
+    if manifest.get('last_selected'):
+        last_selected = date.fromisoformat(manifest['last_selected'])
+        if last_selected >= today:
+            return last_selected + timedelta(days=1)
+    return today
@@ -0,0 +1,24 @@
+import shutil
+import subprocess
+from typing import List
+
+
+class FfmpegError(Exception):
+    """Raised when ffmpeg is missing or fails."""
+
+
+def run_ffmpeg(ffmpeg: str, args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    Runs ffmpeg (the executable name or path in `ffmpeg`) quietly with the
+    given arguments. Extra keyword arguments go to subprocess.run().
+
+    Raises:
+        FfmpegError: If ffmpeg cannot be found or exits with an error.
+    """
+    executable = shutil.which(ffmpeg)
+    if executable is None:
+        raise FfmpegError(f"'{ffmpeg}' was not found; it is needed to decode and encode audio.")
+    result = subprocess.run([executable, '-hide_banner', '-loglevel', 'error', *args], stderr=subprocess.PIPE, **kwargs)
+    if result.returncode != 0:
+        raise FfmpegError(result.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited with {result.returncode}")
+    return result
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+from typing import IO, Any, Iterator, Optional
+
+
+def sha256_file(path: Path, block_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file, reading it in blocks."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def sha256_fd(fd: int, block_size: int = 1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of an open file, reading it with pread()
+    so the file's own position is left alone. The hash is of the file the
+    descriptor refers to, even if its path has since been replaced.
+    """
+    hasher = hashlib.sha256()
+    offset = 0
+    while True:
+        block = os.pread(fd, block_size, offset)
+        if not block:
+            break
+        hasher.update(block)
+        offset += len(block)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def atomic_writer(path: Path, mode: str = 'wb', encoding: Optional[str] = None) -> Iterator[IO]:
+    """
+    Opens a file for writing so that readers only ever see the old or the new
+    contents, never a half-written file.
+
+    The data goes to a temporary file in the same directory, is flushed to
+    disk when the block ends, and is then moved over the destination with
+    os.replace(). If the block raises, the destination is left untouched.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        # Never leave stray temporary files behind on failure.
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Atomically writes bytes to a file. See atomic_writer()."""
+    with atomic_writer(path) as f:
+        f.write(data)
+
+
+def atomic_copy(source: Path, destination: Path, block_size: int = 1 << 20):
+    """Atomically copies a file, in blocks. See atomic_writer()."""
+    with open(source, 'rb') as src, atomic_writer(destination) as dst:
+        for block in iter(lambda: src.read(block_size), b''):
+            dst.write(block)
+
+
+def atomic_write_text(path: Path, text: str):
+    """Atomically writes a UTF-8 text file. See atomic_writer()."""
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: Path, data: Any, indent: Optional[int] = None):
+    """Atomically writes a JSON file. See atomic_writer()."""
+    atomic_write_text(path, json.dumps(data, indent=indent, ensure_ascii=False))
@@ -1,5 +1,49 @@
+import io
+import asyncio
 from pathlib import Path
-from gtts import gTTS
+from typing import Optional
+
+from audio_cache import get_default_cache
+from tts_engine import TTSEngine, TTSError, run_sync
+
+
+class GTTSEngine(TTSEngine):
+    """
+    Converts text to speech with Google Translate's TTS service, via gTTS.
+
+    gTTS makes blocking requests, so each chunk is fetched with its public
+    write_to_fp() in a worker thread. The chunks of a prayer are still
+    fetched concurrently, up to max_concurrency at a time, and joined in
+    order. There is no choice of voice.
+    """
+    name = 'gtts'
+
+    def __init__(self, voice: Optional[str] = None, lang: str = 'en', tld: str = 'co.uk', **options):
+        super().__init__(voice, **options)
+        self.lang = lang
+        self.tld = tld
+        # Stands in for a model name in the audio cache key.
+        self.model = f"{lang}.{tld}"
+
+    def _fetch(self, text: str) -> bytes:
+        from gtts import gTTS, gTTSError
+
+        buffer = io.BytesIO()
+        try:
+            gTTS(text=text, lang=self.lang, tld=self.tld, slow=False, timeout=self.timeout).write_to_fp(buffer)
+        except gTTSError as e:
+            raise TTSError(f"gTTS request failed: {e}") from e
+        if not buffer.getvalue():
+            raise TTSError("gTTS returned no audio.")
+        return buffer.getvalue()
+
+    async def _synthesize(self, text: str, voice: Optional[str]) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, self._fetch, text)
+
+
+# One engine (and so one connection pool) shared by every call in this process.
+_engine: Optional[GTTSEngine] = None
+
 
 def text_to_speech(text_to_speak: str, output_filepath: Path) -> bool:
     """
@@ -12,22 +56,10 @@ def text_to_speech(text_to_speak: str, output_filepath: Path) -> bool:
     Returns:
         True if the audio file was created successfully, False otherwise.
     """
-    try:
-        output_filepath.parent.mkdir(parents=True, exist_ok=True)
-
-        print(f"Generating speech for text... Saving to {output_filepath}")
-
-        tts = gTTS(text=text_to_speak, lang='en', tld='co.uk', slow=False)
-
-        # Save the generated audio to the specified file.
-        tts.save(output_filepath)
-        
-        print("Speech generation successful.")
-        return True
-
-    except Exception as e:
-        print(f"An error occurred during text-to-speech conversion: {e}")
-        return False
+    global _engine
+    if _engine is None:
+        _engine = GTTSEngine(verify_ssl=False, cache=get_default_cache())
+    return run_sync(_engine.synthesize_to_file(text_to_speak, output_filepath))
 
 
 if __name__ == '__main__':
@@ -1,10 +1,78 @@
+import copy
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
-def setup_logger(log_file_path: Path):
+# The background thread that writes the log records, once logging is set up.
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, for tools that read structured logs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue with their message filled in and any traceback
+    turned into text (both can only be done in the logging thread), but kept
+    apart from the message so each formatter can lay them out its own way.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # Writes out anything still queued before stopping.
+        _listener.stop()
+        _listener = None
+
+
+def setup_logger(log_file_path: Path, rotation: str = 'size', max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 7, json_format: bool = False):
     """
     Configures a centralized logger to output to both console and a file.
+
+    Logging calls only put the record on a queue; a background thread does
+    the actual writing, so the pipeline never waits on the disk or terminal.
+    The log file keeps its history across runs and is rotated instead of
+    being overwritten.
+
+    Args:
+        log_file_path: The log file.
+        rotation: 'size' to rotate when the file reaches max_bytes, or
+            'daily' to start a new file every midnight.
+        max_bytes: The size at which the file is rotated, with rotation='size'.
+        backup_count: How many rotated files to keep.
+        json_format: Write the file as JSON lines instead of plain text.
     """
     # Get the root logger
     logger = logging.getLogger()
@@ -12,21 +80,50 @@ def setup_logger(log_file_path: Path):
 
     # --- Create File Handler with UTF-8 encoding ---
     # This ensures emojis and other special characters are handled correctly.
-    file_handler = logging.FileHandler(log_file_path, mode='w', encoding='utf-8')
-    file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    
+    log_file_path.parent.mkdir(parents=True, exist_ok=True)
+    if rotation == 'daily':
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file_path, when='midnight', backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    if json_format:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
     # --- Create Console Handler ---
     console_handler = logging.StreamHandler(sys.stdout)
     console_formatter = logging.Formatter('%(message)s') # Keep console output clean
     console_handler.setFormatter(console_formatter)
 
     # Clear existing handlers to prevent duplicate logs
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    _stop_listener()
+    for handler in logger.handlers:
+        handler.close()
+    logger.handlers.clear()
 
-    # Add both handlers to the root logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # The root logger only queues records; the listener thread writes them.
+    global _listener
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(_QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
 
     return logger
+
+
+def setup_logger_from_config(config, project_root: Path):
+    """Sets up logging as described by [Paths] LogFile and the [Logging] section of config.ini."""
+    section = config['Logging'] if config.has_section('Logging') else {}
+    return setup_logger(
+        project_root / config['Paths']['LogFile'],
+        rotation=section.get('Rotation', 'size'),
+        max_bytes=int(float(section.get('MaxMB', 5)) * 1024 * 1024),
+        backup_count=int(section.get('BackupCount', 7)),
+        json_format=section.get('Format', 'text').strip().lower() == 'json',
+    )
+
+
+# Make sure queued records are written out before the process exits.
+atexit.register(_stop_listener)
@@ -1,115 +1,680 @@
-import json
 import logging
+import argparse
 import configparser
 from pathlib import Path
-from datetime import datetime
-import sys
-import os
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional
 
 # Import our new modules and existing ones
-from logger_setup import setup_logger
-from pdf_parser import extract_text_from_pdf
-from prayer_selector import parse_prayers, select_prayer_from_cycle
-from tts_synthesizer import text_to_speech
+import daily_manifest
+import metrics
+from file_utils import atomic_copy
+from logger_setup import setup_logger_from_config
+from parse_cache import load_prayer_store
+from prayer_selector import find_prayer, preview_cycle, select_prayer_from_cycle
+from tenants import RenderJob, Tenant, group_jobs, load_tenants
+# The TTS modules (and asyncio, httpx and the backend SDKs behind them) are
+# imported only once audio actually has to be generated, and PyMuPDF only
+# when the PDF has to be re-parsed, so warm and pre-rendered days start fast.
 
-def run_daily_prayer_generation():
-    """
-    Orchestrates the entire process, now driven by logging and configuration.
-    """
-    # --- Setup Configuration and Logging ---
-    # Corrected path logic to be self-contained and robust
-    project_root = Path(__file__).resolve().parents[2]
+# Corrected path logic to be self-contained and robust
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _load_config() -> configparser.ConfigParser:
+    """Reads config.ini from the project root."""
     config = configparser.ConfigParser()
-    config.read(project_root / 'config.ini')
+    config.read(PROJECT_ROOT / 'config.ini')
+    return config
+
 
+def _load_prayers(config: configparser.ConfigParser):
+    """
+    Opens the prayer store. The parse cache is only rebuilt when the PDF or
+    the parser has changed, and then only the changed pages are extracted again.
+    """
     paths = config['Paths']
-    tts_config = config['TTS']
+    return load_prayer_store(
+        PROJECT_ROOT / paths['PdfFile'],
+        PROJECT_ROOT / paths['ProcessedPrayersFile'],
+        PROJECT_ROOT / paths['PrayerStoreFile'],
+        PROJECT_ROOT / paths['ParseManifestFile'],
+        PROJECT_ROOT / paths['PageCacheDir'],
+        workers=config.getint('Parser', 'Workers', fallback=1),
+        search_index_path=PROJECT_ROOT / paths['SearchIndexFile'] if paths.get('SearchIndexFile') else None,
+    )
+
+
+def _close_prayers(prayers):
+    """Closes a prayer store opened by _load_prayers(), which keeps the prayer file mapped until then."""
+    if hasattr(prayers, 'close'):
+        prayers.close()
+
+
+def _create_engine(config: configparser.ConfigParser):
+    """Creates the configured TTS backend chain, with the audio segment cache unless it is turned off."""
+    from audio_cache import AudioCache
+    from tts_failover import create_engine_from_config
+
+    cache = None
+    max_megabytes = config.getfloat('Cache', 'AudioCacheMaxMB', fallback=0)
+    if max_megabytes > 0:
+        cache = AudioCache(PROJECT_ROOT / config['Cache']['AudioCacheDir'], int(max_megabytes * 1024 * 1024))
+    return create_engine_from_config(config, PROJECT_ROOT, cache=cache)
+
+
+def _audio_path(output_dir: Path, day: date) -> Path:
+    return output_dir / f"prayer_{day.strftime('%Y-%m-%d')}.mp3"
+
+
+# The standard words spoken before each prayer. Tenants can set their own.
+DEFAULT_INTRO = (
+    "...Good morning....... as we pray, please sit in silence for a moment, seeking to be attentive to the presence of God..."
+    " the one in whom we live, move and have our being...... "
+    "....Father, just as the sun rises in the morning, may our spirits also rise to you this day..."
+)
+
+
+def format_speech_text(prayer, intro: Optional[str] = None) -> str:
+    """Builds the full text to be spoken for a prayer, with the intro and closing."""
+    intro = intro or DEFAULT_INTRO
+    prayer_text = f"Today's prayer is titled: {prayer['title']}. \n\n {prayer['body']}..... \n\n All this we ask in the name of Jesus Christ, our Lord and Savior.... AMEN."
+    return f"{intro}\n\n{prayer_text}"
+
+
+def _label(tenant: Tenant, tenants: List[Tenant]) -> str:
+    """A prefix for log lines, naming the tenant when there is more than one."""
+    return f"[{tenant.name}] " if len(tenants) > 1 else ''
+
+
+def _render_jobs(config: configparser.ConfigParser, jobs: List[RenderJob],
+                 on_finished: Callable[[RenderJob, bool], None], engine=None):
+    """
+    Synthesizes the audio for every job in one pass over a single pooled TTS
+    engine. Jobs with the same text and voice (for example, tenants who share
+    an intro and landed on the same prayer) are synthesized once, and the
+    file is copied to the others. on_finished is called for each job as soon
+    as its file is ready or has failed.
+
+    A long-lived caller can pass its own engine, which is then left open.
+    """
+    import asyncio
+    from tts_engine import run_sync
+
+    groups = group_jobs(jobs)
+    owns_engine = engine is None
+    if owns_engine:
+        engine = _create_engine(config)
+
+    async def render(group: List[RenderJob]):
+        first = group[0]
+        success = await engine.synthesize_to_file(first.text, first.audio_path, first.tenant.voice)
+        if success:
+            for job in group[1:]:
+                atomic_copy(first.audio_path, job.audio_path)
+        return group, success
+
+    async def render_all():
+        try:
+            for finished in asyncio.as_completed([render(group) for group in groups]):
+                group, success = await finished
+                for job in group:
+                    on_finished(job, success)
+        finally:
+            # Closing the engine also saves the backends' latency history.
+            if owns_engine:
+                await engine.aclose()
+            elif hasattr(engine, 'latency'):
+                engine.latency.save()
+
+    if len(groups) < len(jobs):
+        logging.getLogger(__name__).info(
+            f"{len(jobs)} audio files need only {len(groups)} syntheses; the rest are shared.")
+    run_sync(render_all())
+
+
+def _postprocess_jobs(config: configparser.ConfigParser, jobs: List[RenderJob], manifests: dict):
+    """
+    Trims, re-paces and loudness-normalizes the freshly synthesized files in
+    one batch, if [PostProcess] Enabled is on, and marks them in the
+    tenants' daily manifests.
+    """
+    if not jobs or not config.getboolean('PostProcess', 'Enabled', fallback=False):
+        return
+    from audio_postprocess import PostProcessSettings, process_files
 
-    # Initialize the logger
-    logger = setup_logger(project_root / paths['LogFile'])
+    # Jobs that shared one synthesis are still separate files.
+    with metrics.span('postprocess'):
+        results = process_files([job.audio_path for job in jobs], PostProcessSettings.from_config(config))
+    for job in jobs:
+        if results.get(job.audio_path) is not None:
+            daily_manifest.mark_processed(manifests[job.tenant.name], job.day)
+    for tenant in {job.tenant.name: job.tenant for job in jobs}.values():
+        daily_manifest.save_manifest(tenant.manifest_file, manifests[tenant.name])
+
+
+def _encode_renditions(config: configparser.ConfigParser, jobs: List[RenderJob]):
+    """Encodes the [Renditions] of the freshly synthesized files, if Enabled is on."""
+    if not jobs or not config.getboolean('Renditions', 'Enabled', fallback=False):
+        return
+    from renditions import RenditionSettings, encode_renditions
+
+    settings = RenditionSettings.from_config(config)
+    by_tenant = {}
+    for job in jobs:
+        by_tenant.setdefault(job.tenant.name, (job.tenant, []))[1].append(job.audio_path)
+    with metrics.span('encode'):
+        for tenant, audio_paths in by_tenant.values():
+            encode_renditions(audio_paths, tenant.output_dir / settings.directory, settings)
+
+
+def _publish(config: configparser.ConfigParser, tenants: List[Tenant], published: list, today: date):
+    """
+    Appends each tenant's file for the day to the tenant's archive, and
+    refreshes the tenant's podcast feed from it.
+    """
+    from archive import ARCHIVE_NAME, FEED_NAME, Archive, FeedSettings, make_record, update_feed
+
+    settings = FeedSettings.from_config(config)
+    for tenant, day, prayer, audio_path in published:
+        archive = Archive(tenant.output_dir / ARCHIVE_NAME)
+        archive.append(make_record(day, prayer, audio_path))
+        update_feed(tenant.output_dir / FEED_NAME, archive, settings, today, _feed_url_prefix(settings, tenant, tenants))
+
+
+def _republish(config: configparser.ConfigParser, tenants: List[Tenant], changed: list, today: date):
+    """
+    Brings the archive records of files rewritten after they were published
+    (by --postprocess, or by hand) up to date, so their hash, duration and
+    size match the file again, and refreshes the feeds. Days not in the
+    archive are left out.
+    """
+    from archive import ARCHIVE_NAME, FEED_NAME, Archive, FeedSettings, refresh_record, update_feed
+
+    settings = FeedSettings.from_config(config)
+    archives = {}
+    for tenant, day, audio_path in changed:
+        if tenant.name not in archives:
+            archives[tenant.name] = (tenant, Archive(tenant.output_dir / ARCHIVE_NAME))
+        record = archives[tenant.name][1].get(day)
+        if record is not None:
+            archives[tenant.name][1].append(refresh_record(record, audio_path))
+    for tenant, archive in archives.values():
+        update_feed(tenant.output_dir / FEED_NAME, archive, settings, today, _feed_url_prefix(settings, tenant, tenants))
+
+
+def _feed_url_prefix(settings, tenant: Tenant, tenants: List[Tenant]) -> str:
+    # The same URLs the audio server uses: the first tenant's files are at the root.
+    return f"{settings.base_url}/" if tenant is tenants[0] else f"{settings.base_url}/{tenant.name}/"
+
+
+def run_daily_prayer_generation(config: Optional[configparser.ConfigParser] = None, prayers=None, engine=None):
+    """
+    Orchestrates the entire process, now driven by logging and configuration.
+    Every tenant in config.ini gets its prayer for the day in the same run.
+
+    The scheduler passes in its already loaded config, prayers and TTS
+    engine; a one-shot run loads everything itself.
+    """
+    # --- Setup Configuration and Logging ---
+    project_root = PROJECT_ROOT
+    if config is None:
+        config = _load_config()
+        # Initialize the logger
+        logger = setup_logger_from_config(config, project_root)
+    else:
+        logger = logging.getLogger()
     
     logger.info("Starting the daily prayer generation process...")
 
-    # --- Define File Paths from Config ---
-    pdf_path = project_root / paths['PdfFile']
-    processed_prayers_path = project_root / paths['ProcessedPrayersFile']
-    output_dir = project_root / paths['OutputDir']
+    tenants = load_tenants(config, project_root)
+    today = datetime.now().date()
 
     # --- Step 1: Load or Parse Prayers ---
-    prayers = []
-    if processed_prayers_path.exists():
-        logger.info(f"[1/4] Loading prayers from cached file: {paths['ProcessedPrayersFile']}...")
-        try:
-            with open(processed_prayers_path, 'r', encoding='utf-8') as f:
-                prayers = json.load(f)
-            # --- ADDED CHECK FOR EMPTY FILE ---
-            if not prayers:
-                 logger.warning("Cached prayer file is empty. Reparsing from PDF.")
-        except json.JSONDecodeError:
-            logger.warning("Could not decode JSON from cached file. Reparsing from PDF.")
-            prayers = [] # Ensure prayers list is empty to trigger reparsing
-
-    # If prayers list is empty (either because file didn't exist or was invalid), parse the PDF.
-    if not prayers:
-        logger.info(f"Parsing prayers from PDF: {paths['PdfFile']}...")
-        full_text = extract_text_from_pdf(pdf_path)
-        if not full_text:
-            logger.error("Stopping process: Failed to extract text from PDF.")
-            return
-        
-        prayers = parse_prayers(full_text)
-        if prayers:
-            processed_prayers_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(processed_prayers_path, 'w', encoding='utf-8') as f:
-                json.dump(prayers, f, indent=2)
-            logger.info(f"Saved {len(prayers)} prayers to cache.")
+    logger.info("[1/4] Loading prayers...")
+    if prayers is not None:
+        _generate_day(config, logger, tenants, today, prayers, engine)
+        return
+
+    with metrics.span('load'):
+        prayers = _load_prayers(config)
+    try:
+        _generate_day(config, logger, tenants, today, prayers, engine)
+    finally:
+        _close_prayers(prayers)
 
+
+def _generate_day(config: configparser.ConfigParser, logger: logging.Logger, tenants, today: date, prayers, engine):
+    """Selects, formats and renders today's prayer for every tenant."""
     if not prayers:
         logger.error("Stopping process: No prayers available.")
         return
 
-    # --- Step 2: Select a Prayer ---
-    logger.info("\n[2/4] Selecting a prayer for the day...")
-    selected_prayer = select_prayer_from_cycle(prayers)
-    if not selected_prayer:
-        logger.error("Stopping process: Could not select a prayer.")
+    # --- Steps 2 and 3: Select and Format each Tenant's Prayer ---
+    jobs = []
+    manifests = {}
+    selected = {}
+    # The (tenant, day, prayer, audio file) of every file ready for today.
+    published = []
+    for tenant in tenants:
+        label = _label(tenant, tenants)
+        logger.info(f"\n[2/4] {label}Selecting a prayer for the day...")
+        manifest = manifests[tenant.name] = daily_manifest.load_manifest(tenant.manifest_file)
+        # A rerun after a failed synthesis keeps the prayer the first run took
+        # from the cycle, instead of skipping ahead to the next one.
+        already_selected = daily_manifest.selected_title(manifest, today)
+        selected_prayer = find_prayer(prayers, already_selected) if already_selected else None
+        if selected_prayer is None:
+            with metrics.span('select', tenant=tenant.name):
+                selected_prayer = select_prayer_from_cycle(prayers, tenant.cycle_state_file)
+            if not selected_prayer:
+                logger.error(f"{label}Stopping process: Could not select a prayer.")
+                continue
+            daily_manifest.mark_selected(manifest, today, selected_prayer['title'])
+            daily_manifest.save_manifest(tenant.manifest_file, manifest)
+        logger.info(f"{label}Selected Prayer: '{selected_prayer['title']}'")
+        selected[tenant.name] = selected_prayer
+
+        # If the audio was rendered ahead of time with --prerender, this tenant is done.
+        audio_output_path = _audio_path(tenant.output_dir, today)
+        prerendered = daily_manifest.get_day(manifest, today)
+        if prerendered and prerendered['title'] == selected_prayer['title'] and audio_output_path.exists():
+            logger.info("\n----------------------------------------------------")
+            logger.info(f"{label}Today's prayer audio was pre-rendered.")
+            logger.info(f"   Find your file at: {audio_output_path}")
+            logger.info("----------------------------------------------------")
+            published.append((tenant, today, selected_prayer, audio_output_path))
+            continue
+
+        logger.info(f"\n[3/4] {label}Formatting the text for speech...")
+        with metrics.span('format', tenant=tenant.name):
+            text_for_speech = format_speech_text(selected_prayer, tenant.intro)
+        logger.info("Text formatted successfully.")
+        jobs.append(RenderJob(tenant, today, selected_prayer['title'], text_for_speech, audio_output_path))
+
+    if not jobs:
+        _publish(config, tenants, published, today)
         return
-    logger.info(f"Selected Prayer: '{selected_prayer['title']}'")
-
-    # --- Step 3: Format the Speech Text ---
-    logger.info("\n[3/4] Formatting the text for speech...")
-    intro = (
-        "...Good morning....... as we pray, please sit in silence for a moment, seeking to be attentive to the presence of God..."
-        " the one in whom we live, move and have our being...... "
-        "....Father, just as the sun rises in the morning, may our spirits also rise to you this day..."
-    )
-    prayer_text = f"Today's prayer is titled: {selected_prayer['title']}. \n\n {selected_prayer['body']}..... \n\n All this we ask in the name of Jesus Christ, our Lord and Savior.... AMEN."
-    text_for_speech = f"{intro}\n\n{prayer_text}"
-    logger.info("Text formatted successfully.")
-    
+
     # --- Step 4: Generate Audio ---
     logger.info("\n[4/4] Generating audio file...")
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    output_filename = f"prayer_{today_str}.mp3"
-    audio_output_path = output_dir / output_filename
-    
-    success = text_to_speech(
-        text_for_speech, 
-        audio_output_path, 
-        voice=tts_config['Voice']
-        #,        timeout=int(tts_config['Timeout'])
+
+    generated = []
+
+    def finished(job: RenderJob, success: bool):
+        label = _label(job.tenant, tenants)
+        if success:
+            generated.append(job)
+            published.append((job.tenant, job.day, selected[job.tenant.name], job.audio_path))
+            manifest = manifests[job.tenant.name]
+            daily_manifest.record_day(manifest, job.day, job.title, job.audio_path)
+            daily_manifest.save_manifest(job.tenant.manifest_file, manifest)
+            logger.info("\n----------------------------------------------------")
+            logger.info(f"{label}Daily prayer audio generated successfully!")
+            logger.info(f"   Find your file at: {job.audio_path}")
+            logger.info("----------------------------------------------------")
+        else:
+            logger.error("\n----------------------------------------------------")
+            logger.error(f"{label}Failed to generate the audio file.")
+            logger.error("This could be due to a network timeout or an API issue.")
+            logger.error("----------------------------------------------------")
+
+    with metrics.span('synthesize'):
+        _render_jobs(config, jobs, finished, engine)
+    _postprocess_jobs(config, generated, manifests)
+    _encode_renditions(config, generated)
+    _publish(config, tenants, published, today)
+
+
+def is_day_done(config: configparser.ConfigParser, day: date) -> bool:
+    """Tells whether every tenant has its prayer and audio file for a date."""
+    return all(daily_manifest.is_day_done(daily_manifest.load_manifest(tenant.manifest_file), day, tenant.output_dir)
+               for tenant in load_tenants(config, PROJECT_ROOT))
+
+
+def run_scheduler():
+    """
+    Stays resident and runs the daily generation on the [Schedule] in
+    config.ini, instead of being started fresh by cron each day.
+
+    The prayer store, the TTS engine (with its pooled connections) and the
+    loaded .env stay in memory between days, so each day costs little more
+    than the synthesis itself. config.ini is reloaded when it changes, and
+    the store is reopened only when the parse cache is rebuilt.
+    """
+    from scheduler import DailySchedule, run_daily
+    from parse_cache import is_cache_valid
+    from tts_engine import run_sync
+
+    config = _load_config()
+    setup_logger_from_config(config, PROJECT_ROOT)
+    prayers = None
+    engine = None
+
+    def close_warm_state():
+        nonlocal prayers, engine
+        if engine is not None:
+            run_sync(engine.aclose())
+            engine = None
+        _close_prayers(prayers)
+        prayers = None
+
+    def reload_config():
+        nonlocal config
+        close_warm_state()
+        config = _load_config()
+        # The log file, its rotation and format may have changed too.
+        setup_logger_from_config(config, PROJECT_ROOT)
+
+    def prayer_cache_is_current() -> bool:
+        paths = config['Paths']
+        return is_cache_valid(PROJECT_ROOT / paths['PdfFile'], PROJECT_ROOT / paths['PrayerStoreFile'],
+                              PROJECT_ROOT / paths['ParseManifestFile'])
+
+    def daily_job():
+        nonlocal prayers, engine
+        metrics.reset()
+        try:
+            if prayers is None or not prayer_cache_is_current():
+                _close_prayers(prayers)
+                with metrics.span('load'):
+                    prayers = _load_prayers(config)
+            if engine is None:
+                engine = _create_engine(config)
+            run_daily_prayer_generation(config, prayers, engine)
+        finally:
+            _export_metrics('daily')
+
+    try:
+        run_daily(daily_job, lambda day: is_day_done(config, day), lambda: DailySchedule.from_config(config),
+                  on_config_change=reload_config, config_path=PROJECT_ROOT / 'config.ini')
+    finally:
+        close_warm_state()
+
+
+def serve_audio():
+    """
+    Serves the generated audio, and today's prayer as JSON, over HTTP on the
+    [Server] host and port in config.ini, until interrupted.
+    """
+    import asyncio
+    from audio_server import AudioServer
+
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    prayers = _load_prayers(config)
+    server = AudioServer(
+        load_tenants(config, PROJECT_ROOT),
+        prayers,
+        host=config.get('Server', 'Host', fallback='127.0.0.1'),
+        port=config.getint('Server', 'Port', fallback=8080),
     )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Server stopped.")
+
+
+def search_prayers(query: str, limit: int = 10):
+    """Logs the prayers that best match a search query, best first."""
+    from search_index import SearchIndex, snippet, update_search_index
+
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    prayers = _load_prayers(config)
+    if not prayers:
+        logger.error("Stopping process: No prayers available.")
+        return
 
-    if success:
-        logger.info("\n----------------------------------------------------")
-        logger.info("Daily prayer audio generated successfully!")
-        logger.info(f"   Find your file at: {audio_output_path}")
-        logger.info("----------------------------------------------------")
+    index_file = config['Paths'].get('SearchIndexFile')
+    if index_file:
+        index = SearchIndex.load(PROJECT_ROOT / index_file) or update_search_index(PROJECT_ROOT / index_file, prayers)
     else:
-        logger.error("\n----------------------------------------------------")
-        logger.error("Failed to generate the audio file.")
-        logger.error("This could be due to a network timeout or an API issue.")
-        logger.error("----------------------------------------------------")
+        index = SearchIndex()
+        index.update(prayers)
+
+    results = index.search(query, limit)
+    if not results:
+        logger.info(f"No prayers match: {query}")
+    for score, position, title in results:
+        body = prayers.record_at(position)['body'] if hasattr(prayers, 'record_at') else prayers[position]['body']
+        logger.info(f"{score:6.2f}  {' '.join(title.split())}")
+        logger.info(f"        {snippet(body, query)}")
+
+
+def preview_upcoming_prayers(days: int):
+    """Logs the prayers the next `days` daily runs will select, without advancing the cycle."""
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    tenants = load_tenants(config, PROJECT_ROOT)
+
+    with metrics.span('load'):
+        prayers = _load_prayers(config)
+    try:
+        if not prayers:
+            logger.error("Stopping process: No prayers available.")
+            return
+
+        today = datetime.now().date()
+        for tenant in tenants:
+            upcoming = preview_cycle(prayers, days, tenant.cycle_state_file)
+            for offset, prayer in enumerate(upcoming):
+                logger.info(f"{_label(tenant, tenants)}{today + timedelta(days=offset)}  {prayer['title']}")
+    finally:
+        _close_prayers(prayers)
+
+
+def prerender_upcoming_prayers(days: int):
+    """
+    Synthesizes the audio for the next `days` days ahead of time for every
+    tenant, in one pass over a single pooled TTS engine, and records each
+    file in the tenant's daily manifest. [TTS] MaxConcurrency bounds how many
+    requests are in flight at once.
+
+    The cycles themselves are not advanced; each morning's run still selects
+    the prayers as usual and then simply finds their audio already on disk.
+    """
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    tenants = load_tenants(config, PROJECT_ROOT)
+
+    with metrics.span('load'):
+        prayers = _load_prayers(config)
+    # The store is only needed until every job has its text.
+    try:
+        if not prayers:
+            logger.error("Stopping process: No prayers available.")
+            return
+
+        jobs = []
+        manifests = {}
+        for tenant in tenants:
+            manifest = manifests[tenant.name] = daily_manifest.load_manifest(tenant.manifest_file)
+            first_day = daily_manifest.next_unselected_day(manifest, datetime.now().date())
+            upcoming = preview_cycle(prayers, days, tenant.cycle_state_file)
+
+            for offset, prayer in enumerate(upcoming):
+                day = first_day + timedelta(days=offset)
+                audio_path = _audio_path(tenant.output_dir, day)
+                entry = daily_manifest.get_day(manifest, day)
+                if entry and entry['title'] == prayer['title'] and audio_path.exists():
+                    continue
+                jobs.append(RenderJob(tenant, day, prayer['title'], format_speech_text(prayer, tenant.intro),
+                                      audio_path))
+    finally:
+        _close_prayers(prayers)
+
+    logger.info(f"Pre-rendering {len(jobs)} files for the next {days} days "
+                f"({len(tenants)} tenant{'s' if len(tenants) != 1 else ''})...")
+    failures = 0
+    generated = []
+
+    def finished(job: RenderJob, success: bool):
+        nonlocal failures
+        label = _label(job.tenant, tenants)
+        if success:
+            generated.append(job)
+            # Save after every file, so an interrupted run keeps its progress.
+            manifest = manifests[job.tenant.name]
+            daily_manifest.record_day(manifest, job.day, job.title, job.audio_path)
+            daily_manifest.save_manifest(job.tenant.manifest_file, manifest)
+            logger.info(f"{label}{job.day}  {job.title}  ->  {job.audio_path.name}")
+        else:
+            failures += 1
+            logger.error(f"{label}{job.day}  {job.title}  ->  failed")
+
+    with metrics.span('synthesize'):
+        _render_jobs(config, jobs, finished)
+    _postprocess_jobs(config, generated, manifests)
+    _encode_renditions(config, generated)
+    logger.info(f"Pre-rendering finished: {len(jobs) - failures} generated, {failures} failed.")
+
+
+def postprocess_output():
+    """
+    Post-processes, in one batch, every file in the tenants' daily manifests
+    that has not been post-processed yet, such as audio rendered before
+    [PostProcess] was turned on. The settings in [PostProcess] are used
+    even when Enabled is off.
+    """
+    from audio_postprocess import PostProcessSettings, process_files
+
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    tenants = load_tenants(config, PROJECT_ROOT)
+
+    pending = []
+    manifests = {}
+    for tenant in tenants:
+        manifest = manifests[tenant.name] = daily_manifest.load_manifest(tenant.manifest_file)
+        for day in daily_manifest.unprocessed_days(manifest):
+            audio_path = _audio_path(tenant.output_dir, day)
+            if audio_path.exists():
+                pending.append((tenant, day, audio_path))
+
+    logger.info(f"Post-processing {len(pending)} files...")
+    with metrics.span('postprocess'):
+        results = process_files([audio_path for _, _, audio_path in pending], PostProcessSettings.from_config(config))
+    processed = []
+    for tenant, day, audio_path in pending:
+        if results.get(audio_path) is not None:
+            daily_manifest.mark_processed(manifests[tenant.name], day)
+            processed.append((tenant, day, audio_path))
+    for tenant in tenants:
+        daily_manifest.save_manifest(tenant.manifest_file, manifests[tenant.name])
+    _republish(config, tenants, processed, datetime.now().date())
+    failures = sum(1 for loudness in results.values() if loudness is None)
+    logger.info(f"Post-processing finished: {len(results) - failures} processed, {failures} failed.")
+
+
+def encode_all_renditions():
+    """
+    Encodes the [Renditions] of every file in the tenants' daily manifests,
+    for example to backfill them after turning renditions on. Files whose
+    renditions are up to date (by content hash) are skipped, and the encodes
+    are spread over every core.
+    """
+    from renditions import RenditionSettings, encode_renditions
+
+    config = _load_config()
+    logger = setup_logger_from_config(config, PROJECT_ROOT)
+    settings = RenditionSettings.from_config(config)
+
+    tenants = load_tenants(config, PROJECT_ROOT)
+    encoded = failures = 0
+    checked = []
+    for tenant in tenants:
+        manifest = daily_manifest.load_manifest(tenant.manifest_file)
+        days = [day for day in map(date.fromisoformat, manifest['days'])
+                if _audio_path(tenant.output_dir, day).exists()]
+        audio_paths = [_audio_path(tenant.output_dir, day) for day in days]
+        with metrics.span('encode', tenant=tenant.name):
+            results = encode_renditions(audio_paths, tenant.output_dir / settings.directory, settings)
+        failures += sum(1 for result in results.values() if result is None)
+        encoded += sum(1 for result in results.values() if result is not None)
+        checked.extend((tenant, day, audio_path) for day, audio_path in zip(days, audio_paths))
+    logger.info(f"Renditions finished: {encoded} files up to date, {failures} failed.")
+    # The renditions leave the published files alone, but a file changed since
+    # it was published (edited, or post-processed by hand) is caught here.
+    _republish(config, tenants, checked, datetime.now().date())
+
+
+def _export_metrics(command: str):
+    """Saves this run's timings and counters to the files named in [Metrics]."""
+    config = _load_config()
+    if not config.has_section('Metrics'):
+        return
+    jsonl_file = config['Metrics'].get('JsonlFile')
+    prometheus_file = config['Metrics'].get('PrometheusFile')
+    metrics.export(
+        PROJECT_ROOT / jsonl_file if jsonl_file else None,
+        PROJECT_ROOT / prometheus_file if prometheus_file else None,
+        command=command,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the daily Valley of Vision prayer audio.")
+    parser.add_argument('--preview', type=int, metavar='DAYS',
+                        help="List the prayers selected for the next DAYS days without generating anything.")
+    parser.add_argument('--prerender', type=int, metavar='DAYS',
+                        help="Synthesize the audio for the next DAYS days ahead of time.")
+    parser.add_argument('--postprocess', action='store_true',
+                        help="Trim, re-pace and loudness-normalize every generated file not done yet.")
+    parser.add_argument('--encode', action='store_true',
+                        help="Encode the [Renditions] (bitrates and HLS playlists) of every generated file.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Stay running and generate each day's audio on the [Schedule] in config.ini.")
+    parser.add_argument('--serve', action='store_true',
+                        help="Serve the generated audio over HTTP on the [Server] address in config.ini.")
+    parser.add_argument('--search', metavar='QUERY',
+                        help='Find the prayers about something. Put exact phrases in double quotes.')
+    args = parser.parse_args()
+    if args.preview is not None and args.preview < 1:
+        parser.error("--preview needs at least 1 day.")
+    if args.prerender is not None and args.prerender < 1:
+        parser.error("--prerender needs at least 1 day.")
+
+    if args.search:
+        search_prayers(args.search)
+        return
+
+    if args.serve:
+        serve_audio()
+        return
+
+    if args.daemon:
+        try:
+            run_scheduler()
+        except KeyboardInterrupt:
+            logging.getLogger().info("Scheduler stopped.")
+        return
+
+    if args.prerender is not None:
+        command = 'prerender'
+    elif args.postprocess:
+        command = 'postprocess'
+    elif args.encode:
+        command = 'encode'
+    elif args.preview is not None:
+        command = 'preview'
+    else:
+        command = 'daily'
+
+    try:
+        if args.prerender is not None:
+            prerender_upcoming_prayers(args.prerender)
+        elif args.postprocess:
+            postprocess_output()
+        elif args.encode:
+            encode_all_renditions()
+        elif args.preview is not None:
+            preview_upcoming_prayers(args.preview)
+        else:
+            run_daily_prayer_generation()
+    finally:
+        _export_metrics(command)
+
 
 if __name__ == '__main__':
-    run_daily_prayer_generation()
+    main()
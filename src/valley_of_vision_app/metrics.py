@@ -0,0 +1,181 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from file_utils import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# Every Prometheus metric name starts with this.
+PROMETHEUS_PREFIX = 'valley_of_vision'
+SUMMARY_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# A metric is identified by its name and its labels, e.g.
+# ('tts_api_bytes', (('backend', 'openai'),)).
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, str]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Metrics:
+    """
+    Collects what happened during one run of the app: how long each stage
+    took (spans), how often things happened (counters, such as cache hits or
+    bytes received from a TTS service) and individual timings (observations,
+    such as each TTS request).
+
+    Everything is kept in memory and thread-safe; export_jsonl() and
+    write_prometheus() save it at the end of the run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.spans: List[dict] = []
+        self.counters: Dict[MetricKey, float] = {}
+        self.observations: Dict[MetricKey, List[float]] = {}
+
+    @contextmanager
+    def span(self, name: str, **labels: str) -> Iterator[None]:
+        """Times the block and records it as a stage of the run, even if it raises."""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.spans.append({'name': name, 'seconds': round(seconds, 6), 'ok': ok, **labels})
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = _key(name, labels)
+        with self._lock:
+            self.observations.setdefault(key, []).append(value)
+
+    def snapshot(self, **run_info) -> dict:
+        """Returns everything collected so far as plain JSON-ready data."""
+        def flat(key: MetricKey) -> str:
+            name, labels = key
+            return name + ''.join(f"[{k}={v}]" for k, v in labels)
+
+        with self._lock:
+            return {
+                'timestamp': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                **run_info,
+                'spans': list(self.spans),
+                'counters': {flat(key): value for key, value in self.counters.items()},
+                'observations': {flat(key): [round(v, 6) for v in values]
+                                 for key, values in self.observations.items()},
+            }
+
+    def export_jsonl(self, path: Path, **run_info):
+        """Appends this run as one line of a JSON-lines file, to compare runs over time."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot(**run_info), ensure_ascii=False) + '\n')
+
+    def prometheus_text(self) -> str:
+        """Formats the run in the Prometheus text exposition format."""
+        def labels_text(labels) -> str:
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+        lines = []
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            observations = {key: sorted(values) for key, values in self.observations.items()}
+
+        stage = f"{PROMETHEUS_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {stage} Time spent in each stage of the last run.")
+        lines.append(f"# TYPE {stage} gauge")
+        totals: Dict[str, float] = {}
+        for span in spans:
+            totals[span['name']] = totals.get(span['name'], 0.0) + span['seconds']
+        for name, seconds in totals.items():
+            lines.append(f'{stage}{{stage="{name}"}} {seconds:.6f}')
+
+        for name in sorted({key[0] for key in counters}):
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{metric}{labels_text(labels)} {value:g}")
+
+        for name in sorted({key[0] for key in observations}):
+            metric = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for (key_name, labels), values in sorted(observations.items()):
+                if key_name != name:
+                    continue
+                for q in SUMMARY_QUANTILES:
+                    lines.append(f"{metric}{labels_text(labels + (('quantile', str(q)),))} "
+                                 f"{_quantile(values, q):.6f}")
+                lines.append(f"{metric}_sum{labels_text(labels)} {sum(values):.6f}")
+                lines.append(f"{metric}_count{labels_text(labels)} {len(values)}")
+
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {self.started:.0f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: Path):
+        """
+        Writes a Prometheus textfile (for node_exporter's textfile collector).
+        It is replaced atomically so the collector never reads half a file.
+        """
+        atomic_write_text(path, self.prometheus_text())
+
+
+# The metrics of the current run, shared by every module.
+metrics = Metrics()
+
+
+def reset() -> Metrics:
+    """Starts a fresh set of metrics, e.g. for each run of a long-lived process."""
+    global metrics
+    metrics = Metrics()
+    return metrics
+
+
+def span(name: str, **labels: str):
+    """Times a block of code as a stage of the current run. See Metrics.span()."""
+    return metrics.span(name, **labels)
+
+
+def increment(name: str, value: float = 1, **labels: str):
+    """Adds to a counter of the current run."""
+    metrics.increment(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: str):
+    """Records one measurement, such as a request's latency, in the current run."""
+    metrics.observe(name, value, **labels)
+
+
+def export(jsonl_path: Optional[Path] = None, prometheus_path: Optional[Path] = None, **run_info):
+    """Saves the current run's metrics to whichever of the two files are given."""
+    try:
+        if jsonl_path is not None:
+            metrics.export_jsonl(jsonl_path, **run_info)
+        if prometheus_path is not None:
+            metrics.write_prometheus(prometheus_path)
+    except OSError as e:
+        # Metrics are never worth failing a run over.
+        logger.warning(f"Could not save metrics: {e}")
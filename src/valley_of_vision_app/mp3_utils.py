@@ -0,0 +1,115 @@
+from typing import Iterable, Optional, Tuple
+
+# Bitrates (kbit/s) by index, for MPEG-1 Layer III and MPEG-2/2.5 Layer III.
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+# Sample rates (Hz) by index, for MPEG-1, MPEG-2 and MPEG-2.5.
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+_ID3V1_SIZE = 128
+_INFO_TAGS = (b'Xing', b'Info', b'VBRI')
+
+
+def _id3v2_size(data: bytes) -> int:
+    """Returns the size of an ID3v2 tag at the start of the data, or 0."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    # The tag size is stored as four 7-bit "syncsafe" bytes.
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    has_footer = data[5] & 0x10
+    return 10 + size + (10 if has_footer else 0)
+
+
+def _frame_info(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    Returns (length in bytes, samples, sample rate) of the MPEG Layer III
+    frame starting with this 4-byte header, or None if it is not a valid
+    frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    layer = (header[1] >> 1) & 0x03  # 1 = Layer III
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrates = _BITRATES_V1 if version == 3 else _BITRATES_V2
+    bitrate = bitrates[bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples_factor = 144 if version == 3 else 72
+    samples = 1152 if version == 3 else 576
+    return samples_factor * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def frame_length(header: bytes) -> Optional[int]:
+    """
+    Returns the length in bytes of the MPEG Layer III frame starting with
+    this 4-byte header, or None if it is not a valid frame header.
+    """
+    info = _frame_info(header)
+    return None if info is None else info[0]
+
+
+def _is_info_frame(frame: bytes) -> bool:
+    """
+    Checks for a Xing/Info/VBRI frame. Encoders put one at the start of a
+    file to describe the whole file's length, so it is wrong in a joined file.
+    """
+    return any(tag in frame[4:40] for tag in _INFO_TAGS)
+
+
+def audio_frames(data: bytes) -> bytes:
+    """
+    Returns just the MPEG audio frames of an MP3 file: any ID3v2 tag at the
+    start, ID3v1 tag at the end and leading Xing/Info frame are removed.
+    """
+    start = _id3v2_size(data)
+    end = len(data)
+    if end - start >= _ID3V1_SIZE and data[end - _ID3V1_SIZE:end - _ID3V1_SIZE + 3] == b'TAG':
+        end -= _ID3V1_SIZE
+
+    # Skip any junk before the first frame header.
+    while start < end - 4 and frame_length(data[start:start + 4]) is None:
+        start += 1
+
+    length = frame_length(data[start:start + 4])
+    if length and _is_info_frame(data[start:start + length]):
+        start += length
+    return data[start:end]
+
+
+def concat_mp3(segments: Iterable[bytes]) -> bytes:
+    """
+    Joins MP3 segments into one MP3 without re-encoding.
+
+    MPEG audio frames are self-contained, so the frames of each segment can
+    simply follow one another. Per-file metadata (ID3 tags and the Xing/Info
+    frame, which would make players think the whole file is as long as the
+    first segment) is dropped, so there are no stray gaps or wrong durations
+    at the joins.
+    """
+    return b''.join(audio_frames(segment) for segment in segments)
+
+
+def mp3_duration(data: bytes) -> float:
+    """
+    Returns the playing time of an MP3 file in seconds, by adding up the
+    samples in each of its frames. This is exact for constant and variable
+    bitrate files alike, and needs no decoder.
+    """
+    frames = audio_frames(data)
+    position = 0
+    seconds = 0.0
+    while position + 4 <= len(frames):
+        info = _frame_info(frames[position:position + 4])
+        if info is None:
+            # Resynchronize after junk between frames.
+            position += 1
+            continue
+        length, samples, sample_rate = info
+        seconds += samples / sample_rate
+        position += length
+    return seconds
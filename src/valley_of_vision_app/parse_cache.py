@@ -0,0 +1,230 @@
+import json
+import logging
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import metrics
+from file_utils import sha256_file, atomic_writer, atomic_write_json, atomic_write_text
+from prayer_selector import PARSER_VERSION, TITLE_PATTERN, iter_prayers
+from prayer_store import FORMAT_VERSION as STORE_FORMAT_VERSION, PrayerStore, PrayerStoreWriter
+from search_index import update_search_index
+
+logger = logging.getLogger(__name__)
+
+# Bump this if the layout of the manifest itself changes.
+MANIFEST_VERSION = 1
+
+
+class _NoPrayersFound(Exception):
+    """Raised to abandon a rebuild that found nothing worth caching."""
+
+
+def get_parser_version() -> str:
+    """
+    Identifies the parser that produced a cached result.
+
+    It combines the hand-maintained PARSER_VERSION with a hash of the title
+    regular expression, so editing the regex invalidates the cache even if
+    nobody remembers to bump the version number.
+    """
+    pattern_hash = hashlib.sha256(TITLE_PATTERN.pattern.encode('utf-8')).hexdigest()[:12]
+    return f"{PARSER_VERSION}-{pattern_hash}"
+
+
+def _load_json(path: Path):
+    """Loads a JSON file, returning None if it is missing, empty or corrupt."""
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def _pdf_matches_manifest(pdf_path: Path, manifest: Dict, manifest_path: Path) -> bool:
+    """
+    Checks whether the PDF is the one the manifest was built from.
+
+    The size and modification time are compared first, which costs a single
+    stat() call. Only when they differ do we hash the whole file. If the
+    content turns out to be unchanged (the file was only touched or copied),
+    the manifest is given the new size and time, so the next start takes the
+    fast path again instead of hashing the PDF every time.
+    """
+    stat = pdf_path.stat()
+    if stat.st_size == manifest.get('pdf_size') and stat.st_mtime_ns == manifest.get('pdf_mtime_ns'):
+        return True
+    if sha256_file(pdf_path) != manifest.get('pdf_digest'):
+        return False
+    manifest['pdf_size'] = stat.st_size
+    manifest['pdf_mtime_ns'] = stat.st_mtime_ns
+    try:
+        atomic_write_json(manifest_path, manifest, indent=2)
+    except OSError as e:
+        logger.warning(f"Could not update the parse manifest: {e}")
+    return True
+
+
+def is_cache_valid(pdf_path: Path, store_path: Path, manifest_path: Path) -> bool:
+    """
+    Checks whether the cached prayer store is still valid for this PDF and parser.
+
+    This is the warm-start path: it only reads the small manifest and stats
+    the store, and never opens the PDF with PyMuPDF.
+    """
+    manifest = _load_json(manifest_path)
+    if not isinstance(manifest, dict) or manifest.get('manifest_version') != MANIFEST_VERSION:
+        return False
+    if manifest.get('parser_version') != get_parser_version():
+        logger.info("Parser has changed since the cache was built.")
+        return False
+    if not pdf_path.is_file() or not _pdf_matches_manifest(pdf_path, manifest, manifest_path):
+        logger.info("PDF has changed since the cache was built.")
+        return False
+    if manifest.get('store_version') != STORE_FORMAT_VERSION:
+        return False
+    if not store_path.is_file() or store_path.stat().st_size != manifest.get('store_size'):
+        return False
+    return bool(manifest.get('prayer_count'))
+
+
+def _iter_page_texts(pdf_path: Path, page_digests: List[str], page_cache_dir: Path, workers: int) -> Iterator[str]:
+    """
+    Yields the text of every page in order, re-extracting only the pages whose
+    digest is not already in the content-addressed page cache.
+    """
+    from pdf_parser import iter_pages_parallel, iter_selected_pages
+
+    def cached_page(page_number: int) -> Path:
+        return page_cache_dir / f"{page_digests[page_number]}.txt"
+
+    missing = [n for n in range(len(page_digests)) if not cached_page(n).is_file()]
+    logger.info(f"Page cache: {len(page_digests) - len(missing)} pages reused, {len(missing)} to extract.")
+    metrics.increment('page_cache_hits', len(page_digests) - len(missing))
+    metrics.increment('page_cache_misses', len(missing))
+
+    if missing and len(missing) == len(page_digests) and workers != 1:
+        # A cold parse: spread the whole book across the process pool.
+        for page_number, text in enumerate(iter_pages_parallel(pdf_path, workers=workers or None)):
+            atomic_write_text(cached_page(page_number), text)
+            yield text
+        return
+
+    extracted = iter_selected_pages(pdf_path, missing) if missing else iter(())
+    missing_pages = set(missing)
+    for page_number in range(len(page_digests)):
+        if page_number in missing_pages:
+            _, text = next(extracted)
+            atomic_write_text(cached_page(page_number), text)
+        else:
+            text = cached_page(page_number).read_text(encoding='utf-8')
+        yield text
+
+
+def _prune_page_cache(page_cache_dir: Path, page_digests: List[str]):
+    """Deletes cached pages that no longer belong to the current PDF."""
+    keep = {f"{digest}.txt" for digest in page_digests}
+    for cached_page in page_cache_dir.glob('*.txt'):
+        if cached_page.name not in keep:
+            cached_page.unlink()
+
+
+def rebuild_prayer_cache(pdf_path: Path, prayers_path: Path, store_path: Path, manifest_path: Path,
+                         page_cache_dir: Path, workers: int = 1) -> int:
+    """
+    Re-parses the prayers from the PDF, reusing every page whose content has
+    not changed, and writes a fresh prayers file, prayer store and manifest.
+
+    Args:
+        pdf_path: The source PDF.
+        prayers_path: Where the parsed prayers are saved as readable JSON.
+        store_path: Where the binary prayer store is written.
+        manifest_path: Where the cache manifest is written.
+        page_cache_dir: Directory of extracted page texts, named by page digest.
+        workers: Processes to use for a full extraction (0 means every core).
+
+    Returns:
+        The number of prayers found, or 0 if nothing could be parsed.
+    """
+    from pdf_parser import get_page_digests
+
+    if not pdf_path.is_file():
+        logger.error(f"PDF not found at {pdf_path}")
+        return 0
+
+    # Prayers are written out as they are found, so only one prayer (plus
+    # the title index) is ever held in memory. If the PDF turns out to hold
+    # no prayers at all, or cannot be read, both writers are abandoned and
+    # the old files stay.
+    try:
+        page_digests = get_page_digests(pdf_path)
+        pages = _iter_page_texts(pdf_path, page_digests, page_cache_dir, workers)
+        with atomic_writer(prayers_path, 'w', encoding='utf-8') as json_file, \
+                PrayerStoreWriter(store_path) as store_writer:
+            json_file.write('[')
+            for title, body, page_span in iter_prayers(pages):
+                entry = json.dumps({'title': title, 'body': body}, indent=2, ensure_ascii=False)
+                json_file.write(',\n  ' if store_writer.count else '\n  ')
+                json_file.write(entry.replace('\n', '\n  '))
+                store_writer.add(title, body, page_span)
+            if not store_writer.count:
+                raise _NoPrayersFound()
+            json_file.write('\n]')
+    except _NoPrayersFound:
+        return 0
+    except (RuntimeError, ValueError, OSError) as e:
+        # PyMuPDF raises RuntimeError subclasses (FileDataError and friends)
+        # for corrupt or unreadable files, including from worker processes.
+        logger.error(f"Could not read the PDF {pdf_path.name}: {e}")
+        return 0
+
+    stat = pdf_path.stat()
+    atomic_write_json(manifest_path, {
+        'manifest_version': MANIFEST_VERSION,
+        'parser_version': get_parser_version(),
+        'pdf_digest': sha256_file(pdf_path),
+        'pdf_size': stat.st_size,
+        'pdf_mtime_ns': stat.st_mtime_ns,
+        'page_digests': page_digests,
+        'prayer_count': store_writer.count,
+        'store_version': STORE_FORMAT_VERSION,
+        'store_size': store_path.stat().st_size,
+    }, indent=2)
+    _prune_page_cache(page_cache_dir, page_digests)
+    return store_writer.count
+
+
+def load_prayer_store(pdf_path: Path, prayers_path: Path, store_path: Path, manifest_path: Path,
+                      page_cache_dir: Path, workers: int = 1,
+                      search_index_path: Optional[Path] = None) -> Optional[PrayerStore]:
+    """
+    Opens the cached prayer store when it is valid, and otherwise rebuilds
+    the cache incrementally from the PDF first. With a search_index_path,
+    the search index is kept in step: it is updated (only for the prayers
+    that changed) whenever the cache is rebuilt, or built if it is missing.
+
+    Returns:
+        An open PrayerStore, or None if no prayers could be parsed.
+    """
+    if is_cache_valid(pdf_path, store_path, manifest_path):
+        store = PrayerStore(store_path)
+        metrics.increment('prayer_cache_hits')
+        logger.info(f"Loaded {len(store)} prayers from cache.")
+        if search_index_path is not None and not search_index_path.exists():
+            update_search_index(search_index_path, store)
+        return store
+
+    metrics.increment('prayer_cache_misses')
+    logger.info(f"Parsing prayers from PDF: {pdf_path.name}...")
+    with metrics.span('parse'):
+        prayer_count = rebuild_prayer_cache(pdf_path, prayers_path, store_path, manifest_path, page_cache_dir, workers)
+    if not prayer_count:
+        return None
+    logger.info(f"Saved {prayer_count} prayers to cache.")
+    store = PrayerStore(store_path)
+    if search_index_path is not None:
+        with metrics.span('index'):
+            update_search_index(search_index_path, store)
+    return store
@@ -1,17 +1,138 @@
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 # We use the 'pathlib' library for handling file paths. It's a modern,
 # object-oriented way to work with the filesystem that works across
 # Windows, macOS, and Linux without issues.
 from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 
 # We import the 'fitz' library, which is the core of PyMuPDF.
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(pdf_path: Path) -> str:
+# How many pages each worker process extracts per task. Small shards keep
+# every core busy and mean only a handful of pages are ever held in memory.
+PAGES_PER_SHARD = 16
+
+
+def get_page_count(pdf_path: Path) -> int:
+    """Returns the number of pages in the PDF, without extracting any text."""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def iter_pages(pdf_path: Path, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """
+    Yields the text of each page in the PDF, one page at a time.
+
+    Args:
+        pdf_path: A Path object pointing to the PDF file.
+        start: The index of the first page to extract (0-based).
+        stop: The index one past the last page to extract. Defaults to the end.
+
+    Yields:
+        The text of each page, in order.
+    """
+    if not pdf_path.is_file():
+        print(f"Error: File not found at {pdf_path}")
+        return
+
+    # Only the current page's text is alive at any moment, so memory use
+    # does not grow with the size of the book.
+    with fitz.open(pdf_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_number in range(start, stop):
+            yield doc[page_number].get_text()
+
+
+def iter_selected_pages(pdf_path: Path, page_numbers: List[int]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) for just the requested pages, opening the
+    document once. Used to re-extract only the pages that have changed.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            yield page_number, doc[page_number].get_text()
+
+
+def get_page_digests(pdf_path: Path) -> List[str]:
+    """
+    Returns a SHA-256 digest for every page in the PDF.
+
+    The digest covers the page's object definition and its content streams,
+    which is far cheaper than extracting the text, so it can be used to find
+    out which pages changed between two versions of the PDF.
+    """
+    digests = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            hasher = hashlib.sha256()
+            hasher.update(doc.xref_object(page.xref, compressed=True).encode('utf-8'))
+            hasher.update(page.read_contents())
+            digests.append(hasher.hexdigest())
+    return digests
+
+
+def _extract_page_range(task: Tuple[str, int, int]) -> List[str]:
+    """
+    Worker function for the process pool. Each worker opens its own copy of
+    the document, because PyMuPDF documents cannot be shared across processes.
+    """
+    pdf_path, start, stop = task
+    return list(iter_pages(Path(pdf_path), start, stop))
+
+
+def iter_pages_parallel(pdf_path: Path, workers: Optional[int] = None,
+                        pages_per_shard: int = PAGES_PER_SHARD) -> Iterator[str]:
+    """
+    Yields the text of each page in the PDF, extracting shards of pages in a
+    pool of worker processes and reassembling them in page order.
+
+    Args:
+        pdf_path: A Path object pointing to the PDF file.
+        workers: The number of worker processes. Defaults to the number of CPU cores.
+        pages_per_shard: How many consecutive pages each task extracts.
+
+    Yields:
+        The text of each page, in order.
+    """
+    if not pdf_path.is_file():
+        print(f"Error: File not found at {pdf_path}")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    page_count = get_page_count(pdf_path)
+    if workers == 1 or page_count <= pages_per_shard:
+        # Not worth starting a pool; read the pages in this process instead.
+        yield from iter_pages(pdf_path)
+        return
+
+    shards = (
+        (str(pdf_path), start, min(start + pages_per_shard, page_count))
+        for start in range(0, page_count, pages_per_shard)
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # We keep only a small window of shards in flight, so finished pages
+        # are handed on as soon as they are next in order instead of piling up.
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(_extract_page_range, shard))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def extract_text_from_pdf(pdf_path: Path, workers: int = 1) -> str:
     """
     Extracts all text content from a given PDF file.
 
     Args:
         pdf_path: A Path object pointing to the PDF file.
+        workers: The number of processes to extract pages with. Use 1 to read
+            the pages in this process, or 0 to use every CPU core.
 
     Returns:
         A single string containing all the extracted text from the PDF.
@@ -24,19 +145,14 @@ def extract_text_from_pdf(pdf_path: Path) -> str:
         return ""
 
     try:
-        # We open the PDF file using fitz.open(). The 'with' statement ensures
-        # that the file is properly closed even if errors occur.
-        with fitz.open(pdf_path) as doc:
-            full_text = []
-            # We loop through each page in the document.
-            for page in doc:
-                # For each page, we extract the text using page.getText().
-                # The text is then appended to our list.
-                full_text.append(page.get_text())
-            
-            # Finally, we join all the text pieces from each page into one
-            # single string, with each page's content separated by a newline.
-            return "\n".join(full_text)
+        if workers == 1:
+            pages = iter_pages(pdf_path)
+        else:
+            pages = iter_pages_parallel(pdf_path, workers=workers or None)
+
+        # Finally, we join all the text pieces from each page into one
+        # single string, with each page's content separated by a newline.
+        return "\n".join(pages)
     except Exception as e:
         # If any error occurs during the process (e.g., the file is corrupt),
         # we catch the exception, print an error message, and return an empty string.
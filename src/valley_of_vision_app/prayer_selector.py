@@ -1,11 +1,119 @@
 import re
 import json
 import random
-import configparser
+import hashlib
+import logging
 from pathlib import Path
-from typing import List, Dict, Optional
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from file_utils import atomic_write_json
+from prayer_store import PrayerRecord, PrayerStore, titles_digest
+
+logger = logging.getLogger(__name__)
+
+# This regular expression finds titles (all-caps phrases between newlines).
+TITLE_PATTERN = re.compile(r"\n\n([A-Z'’\s]{5,})\n", re.MULTILINE)
+
+# Bump this whenever the way prayers are split out of the text changes, so
+# that cached parse results made by an older parser are thrown away.
+PARSER_VERSION = 1
+
+# Characters that can appear inside a title match. Every match of
+# TITLE_PATTERN, including its surrounding newlines, is made only of these.
+_TITLE_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ'’")
+
+
+def _is_title_char(char: str) -> bool:
+    # str.isspace() agrees with what the regex engine treats as \s.
+    return char in _TITLE_CHARS or char.isspace()
+
+
+def _settled_end(buffer: str) -> int:
+    """
+    Returns the position up to which title matches in the buffer are final.
+
+    A title match is one unbroken run of title characters, so only a run that
+    reaches the end of the buffer can still grow when more text arrives.
+    Everything before that trailing run can be scanned safely.
+    """
+    position = len(buffer)
+    while position > 0 and _is_title_char(buffer[position - 1]):
+        position -= 1
+    return position
+
+
+def iter_prayers(pages: Iterable[str]) -> Iterator[Tuple[str, str, Tuple[int, int]]]:
+    """
+    Splits the book into prayers in a single pass over its pages.
+
+    The pages are treated as if they were joined with newlines, exactly as
+    extract_text_from_pdf() joins them, so titles that straddle a page break
+    are still found. Only the prayer currently being read is kept in memory.
+
+    Args:
+        pages: The text of each page, in order (for example from iter_pages()).
+
+    Yields:
+        (title, body, page_span) for each prayer, where page_span is the
+        (first, last) 0-based page numbers the prayer appears on.
+    """
+    buffer = ''
+    buffer_offset = 0  # Absolute position in the joined text of buffer[0].
+    scan_from = 0  # Where the next title search starts, within the buffer.
+    page_starts: List[int] = []
+    title = None
+    title_page = 0
+    body_start = 0
+
+    def page_of(position: int) -> int:
+        return max(bisect_right(page_starts, position) - 1, 0)
+
+    def finish_prayer(body_end: int) -> Tuple[str, str, Tuple[int, int]]:
+        raw_body = buffer[body_start:body_end]
+        body = raw_body.strip()
+        if body:
+            last_char = buffer_offset + body_start + len(raw_body.rstrip()) - 1
+            last_page = page_of(last_char)
+        else:
+            last_page = title_page
+        return title, body, (title_page, last_page)
+
+    for page_number, page_text in enumerate(pages):
+        if page_number > 0:
+            buffer += "\n"
+        page_starts.append(buffer_offset + len(buffer))
+        buffer += page_text
+
+        settled = _settled_end(buffer)
+        for match in TITLE_PATTERN.finditer(buffer, scan_from, settled):
+            if title is not None:
+                yield finish_prayer(match.start())
+            title = match.group(1).strip()
+            title_page = page_of(buffer_offset + match.start(1))
+            body_start = match.end()
+        scan_from = max(scan_from, settled)
+
+        # Drop the text we are finished with: everything before the current
+        # body, or, before the first title, everything already scanned.
+        cut = body_start if title is not None else scan_from
+        buffer = buffer[cut:]
+        buffer_offset += cut
+        scan_from -= cut
+        body_start -= cut
+
+    # The end of the text settles the final run of title characters.
+    for match in TITLE_PATTERN.finditer(buffer, scan_from):
+        if title is not None:
+            yield finish_prayer(match.start())
+        title = match.group(1).strip()
+        title_page = page_of(buffer_offset + match.start(1))
+        body_start = match.end()
+
+    if title is not None:
+        yield finish_prayer(len(buffer))
+
 
-# --- ADDED BACK THE MISSING FUNCTION ---
 def parse_prayers(full_text: str) -> List[Dict]:
     """
     Parses the full text of the book to extract individual prayers.
@@ -20,77 +128,156 @@ def parse_prayers(full_text: str) -> List[Dict]:
         A list of dictionaries, where each dictionary represents a prayer
         and has 'title' and 'body' keys.
     """
-    # This regular expression finds titles (all-caps phrases between newlines).
-    pattern = re.compile(r"\n\n([A-Z'’\s]{5,})\n", re.MULTILINE)
-
-    # We use re.split() to break the text apart wherever a title is found.
-    parts = pattern.split(full_text)
-
-    prayers = []
-    # We start at index 1 (skipping intro text) and jump by 2 each time.
-    for i in range(1, len(parts), 2):
-        title = parts[i].strip()
-        if i + 1 < len(parts):
-            body = parts[i+1].strip()
-            prayers.append({'title': title, 'body': body})
-
-    return prayers
-# --- END OF ADDED FUNCTION ---
-
-
-def _get_prayer_log_path(project_root: Path) -> Path:
-    """Helper function to define the path for our prayer log."""
-    # Corrected path to find config.ini in the project root
-    config_path = project_root / 'config.ini'
-    if config_path.exists():
-        config = configparser.ConfigParser()
-        config.read(config_path)
-        return project_root / config['Paths']['PrayerLogFile']
-    # Fallback to default if config file is not found
-    return project_root / "data" / "processed" / "prayer_log.json"
-
-def _load_used_prayers(log_path: Path) -> List[str]:
-    """Loads the list of used prayer titles from the log file."""
-    if not log_path.exists():
-        return []
+    return [{'title': title, 'body': body} for title, body, _ in iter_prayers([full_text])]
+
+
+# The cycle is a keyed pseudo-random permutation of the prayers plus a cursor
+# into it. Only the key (seed and cycle number) and the cursor are stored, so
+# each selection reads and writes a few bytes no matter how big the book is.
+CYCLE_STATE_VERSION = 1
+_FEISTEL_ROUNDS = 4
+
+# Where the cycle state lives when the caller does not say.
+_DEFAULT_CYCLE_STATE_PATH = Path(__file__).resolve().parents[2] / "data" / "processed" / "prayer_cycle.json"
+
+
+def _cycle_key(seed: int, cycle: int) -> bytes:
+    """Derives the permutation key for one pass through the book."""
+    return hashlib.sha256(f"{seed}:{cycle}".encode('ascii')).digest()
+
+
+def _permuted_position(index: int, size: int, key: bytes) -> int:
+    """
+    Maps index (0 <= index < size) to its place in a keyed shuffle of
+    range(size), in constant time and without building the shuffled list.
+
+    A small Feistel network is a permutation of a power-of-four range that
+    covers size. Outputs that land outside range(size) are fed back in
+    ("cycle walking") until one lands inside, which keeps it a permutation.
+    """
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half_bits) - 1
+    value = index
+    while True:
+        left, right = value >> half_bits, value & mask
+        for round_number in range(_FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(f"{round_number}:{right}".encode('ascii'), key=key, digest_size=8).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'little') & mask)
+        value = (left << half_bits) | right
+        if value < size:
+            return value
+
+
+def _titles_of(all_prayers: Union[PrayerStore, List[Dict]], digest: Optional[str] = None) -> Tuple[int, str]:
+    """
+    Returns the number of prayers and a digest of their titles.
+
+    A store computes its digest when it is opened. A list is digested on
+    every call (reading every title) unless the caller passes its digest in.
+    """
+    if digest is not None:
+        return len(all_prayers), digest
+    if isinstance(all_prayers, PrayerStore):
+        return len(all_prayers), all_prayers.titles_digest
+    return len(all_prayers), titles_digest(p['title'] for p in all_prayers)
+
+
+def _load_cycle_state(state_path: Path, size: int, digest: str) -> Tuple[Dict, bool]:
+    """
+    Loads the cycle state, starting a fresh cycle with a new random seed if
+    the file is missing, corrupt, or was made for a different set of prayers.
+
+    Returns:
+        The state, and whether it is a fresh one that has not been saved yet.
+    """
     try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return [] # Return empty list if log file is corrupted or empty
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get('version') == CYCLE_STATE_VERSION and state.get('size') == size
+                and state.get('titles_digest') == digest):
+            return state, False
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    return ({
+        'version': CYCLE_STATE_VERSION,
+        'seed': random.SystemRandom().getrandbits(63),
+        'cycle': 0,
+        'cursor': 0,
+        'size': size,
+        'titles_digest': digest,
+    }, True)
 
-def _save_used_prayers(log_path: Path, used_titles: List[str]):
-    """Saves the list of used prayer titles to the log file."""
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(log_path, 'w', encoding='utf-8') as f:
-        json.dump(used_titles, f, indent=2)
 
-def select_prayer_from_cycle(all_prayers: List[Dict]) -> Optional[Dict]:
+def _position_after(state: Dict, steps: int) -> Tuple[int, int]:
+    """Returns (cycle, book position) of the prayer `steps` selections ahead."""
+    cycle, index = divmod(state['cursor'] + steps, state['size'])
+    cycle += state['cycle']
+    return cycle, _permuted_position(index, state['size'], _cycle_key(state['seed'], cycle))
+
+
+def _prayer_at(all_prayers: Union[PrayerStore, List[Dict]], position: int) -> Union[PrayerRecord, Dict]:
+    if isinstance(all_prayers, PrayerStore):
+        return all_prayers.record_at(position)
+    return all_prayers[position]
+
+
+def find_prayer(all_prayers: Union[PrayerStore, List[Dict]], title: str) -> Optional[Union[PrayerRecord, Dict]]:
+    """Returns the (first) prayer with the given title, or None."""
+    if isinstance(all_prayers, PrayerStore):
+        return all_prayers.get(title)
+    return next((prayer for prayer in all_prayers if prayer['title'] == title), None)
+
+
+def select_prayer_from_cycle(all_prayers: Union[PrayerStore, List[Dict]], state_path: Optional[Path] = None,
+                             digest: Optional[str] = None) -> Optional[Union[PrayerRecord, Dict]]:
     """
     Selects a prayer, ensuring no repeats until all prayers have been used once.
+
+    Args:
+        all_prayers: An open PrayerStore, in which case only the selected
+            prayer's body is ever read from disk, or a list of prayer dictionaries.
+        state_path: The cycle state file. Defaults to data/processed/prayer_cycle.json.
+        digest: The titles_digest() of a list of prayers, if the caller
+            already has it; otherwise every title is read to compute it.
+
+    Returns:
+        The selected prayer, or None if there are no prayers.
     """
     if not all_prayers:
         return None
 
-    # Define paths and load the log of used prayer titles
-    project_root = Path(__file__).resolve().parents[2]
-    log_path = _get_prayer_log_path(project_root)
-    used_titles = _load_used_prayers(log_path)
+    state_path = state_path or _DEFAULT_CYCLE_STATE_PATH
+    state, _ = _load_cycle_state(state_path, *_titles_of(all_prayers, digest))
+
+    _, position = _position_after(state, 0)
+    state['cursor'] += 1
+    if state['cursor'] == state['size']:
+        logger.info("Cycle complete. The next prayer starts a new, reshuffled cycle.")
+        state['cycle'] += 1
+        state['cursor'] = 0
+    atomic_write_json(state_path, state)
+
+    return _prayer_at(all_prayers, position)
 
-    all_titles = [p['title'] for p in all_prayers]
-    available_titles = [title for title in all_titles if title not in used_titles]
 
-    if not available_titles:
-        print("Cycle complete. Resetting the prayer list and starting anew.")
-        used_titles = []
-        available_titles = all_titles
-    
-    selected_title = random.choice(available_titles)
-    used_titles.append(selected_title)
-    _save_used_prayers(log_path, used_titles)
+def preview_cycle(all_prayers: Union[PrayerStore, List[Dict]], days: int, state_path: Optional[Path] = None,
+                  digest: Optional[str] = None) -> List[Union[PrayerRecord, Dict]]:
+    """
+    Returns the prayers that the next `days` calls to select_prayer_from_cycle()
+    will pick, in order, without advancing the cycle.
+
+    The preview runs on into the following cycles if needed; their order is
+    fixed by the same seed, so the preview always matches what is selected.
+    `digest` is as for select_prayer_from_cycle().
+    """
+    if not all_prayers or days <= 0:
+        return []
 
-    for prayer in all_prayers:
-        if prayer['title'] == selected_title:
-            return prayer
+    state_path = state_path or _DEFAULT_CYCLE_STATE_PATH
+    state, is_new = _load_cycle_state(state_path, *_titles_of(all_prayers, digest))
+    if is_new:
+        # Save the freshly drawn seed, so the preview stays true.
+        atomic_write_json(state_path, state)
 
-    return None
+    return [_prayer_at(all_prayers, _position_after(state, step)[1]) for step in range(days)]
@@ -0,0 +1,219 @@
+import io
+import mmap
+import hashlib
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_utils import atomic_writer
+
+# On-disk layout of the prayer store:
+#
+#   header   magic, format version, record count, index offset, index length
+#   bodies   every prayer body as UTF-8, back to back
+#   index    one entry per prayer: title length, title, body offset,
+#            body length, first page, last page
+#
+# The index sits at the end so it can be read in one go without touching
+# the bodies. Bodies are only read (through a memory map) when asked for.
+MAGIC = b'VOVS'
+FORMAT_VERSION = 2
+_HEADER = struct.Struct('<4sHHIQQ')
+_ENTRY = struct.Struct('<QIii')
+_TITLE_LENGTH = struct.Struct('<H')
+
+
+def titles_digest(titles: Iterable[str]) -> str:
+    """Returns a digest identifying an ordered list of titles."""
+    hasher = hashlib.sha256()
+    for title in titles:
+        hasher.update(title.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+class PrayerRecord:
+    """
+    A single prayer from the store. The title is always available; the body
+    is decoded from the memory-mapped file the first time it is accessed.
+
+    Records can be indexed like the dictionaries the rest of the app uses,
+    so record['title'] and record['body'] both work. page_span holds the
+    (first, last) 0-based pages of the PDF the prayer was found on.
+    """
+    __slots__ = ('title', 'page_span', '_store', '_offset', '_length', '_body')
+
+    def __init__(self, title: str, page_span: Tuple[int, int], store: 'PrayerStore', offset: int, length: int):
+        self.title = title
+        self.page_span = page_span
+        self._store = store
+        self._offset = offset
+        self._length = length
+        self._body = None
+
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            self._body = self._store._read_body(self._offset, self._length)
+        return self._body
+
+    def __getitem__(self, key: str) -> str:
+        if key == 'title':
+            return self.title
+        if key == 'body':
+            return self.body
+        raise KeyError(key)
+
+    def to_dict(self) -> Dict:
+        return {'title': self.title, 'body': self.body}
+
+    def __repr__(self) -> str:
+        return f"PrayerRecord(title={self.title!r})"
+
+
+class PrayerStore:
+    """
+    Read-only access to a prayer store file, with an O(1) lookup by title.
+
+    Opening a store reads only the header and the title index. Use it as a
+    context manager, or call close() when done, to release the memory map.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._entries, self._index = self._read_index()
+            self.titles_digest = titles_digest(self.titles())
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self) -> Tuple[List[Tuple[str, int, int, Tuple[int, int]]], Dict[str, int]]:
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{self.path} is too small to be a prayer store.")
+        magic, version, _, count, index_offset, index_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} is not a version {FORMAT_VERSION} prayer store.")
+
+        if index_offset + index_length > len(self._map):
+            raise ValueError(f"{self.path} is truncated.")
+
+        index_bytes = self._map[index_offset:index_offset + index_length]
+        entries = []
+        index = {}
+        position = 0
+        for _ in range(count):
+            try:
+                (title_length,) = _TITLE_LENGTH.unpack_from(index_bytes, position)
+                position += _TITLE_LENGTH.size
+                title = index_bytes[position:position + title_length].decode('utf-8')
+                position += title_length
+                offset, length, first_page, last_page = _ENTRY.unpack_from(index_bytes, position)
+                position += _ENTRY.size
+            except (struct.error, UnicodeDecodeError) as e:
+                raise ValueError(f"{self.path} has a damaged title index.") from e
+            if offset + length > index_offset:
+                raise ValueError(f"{self.path} has a damaged title index.")
+            # Some titles appear more than once in the book. Like the old
+            # list scan, a lookup by title returns the first of them.
+            index.setdefault(title, len(entries))
+            entries.append((title, offset, length, (first_page, last_page)))
+        return entries, index
+
+    def _read_body(self, offset: int, length: int) -> str:
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def _record(self, position: int) -> PrayerRecord:
+        title, offset, length, page_span = self._entries[position]
+        return PrayerRecord(title, page_span, self, offset, length)
+
+    def titles(self) -> List[str]:
+        """Returns every prayer title, in book order."""
+        return [entry[0] for entry in self._entries]
+
+    def record_at(self, position: int) -> PrayerRecord:
+        """Returns the prayer at the given position in book order."""
+        return self._record(position)
+
+    def get(self, title: str) -> Optional[PrayerRecord]:
+        """Returns the prayer with the given title, or None if there is none."""
+        position = self._index.get(title)
+        return None if position is None else self._record(position)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[PrayerRecord]:
+        for position in range(len(self._entries)):
+            yield self._record(position)
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> 'PrayerStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PrayerStoreWriter:
+    """
+    Writes a prayer store one prayer at a time, so the whole book never has
+    to be held in memory. Only the small title index is kept until close().
+
+    The file is replaced atomically when the writer is closed, so a store
+    that is open elsewhere keeps reading the old contents through its own
+    memory map. Use it as a context manager.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._writer = atomic_writer(path)
+        self._file = self._writer.__enter__()
+        self._file.write(b'\0' * _HEADER.size)
+        self._offset = _HEADER.size
+        self._index = io.BytesIO()
+        self.count = 0
+
+    def add(self, title: str, body: str, page_span: Tuple[int, int] = (-1, -1)):
+        encoded_title = title.encode('utf-8')
+        encoded_body = body.encode('utf-8')
+        self._file.write(encoded_body)
+        self._index.write(_TITLE_LENGTH.pack(len(encoded_title)))
+        self._index.write(encoded_title)
+        self._index.write(_ENTRY.pack(self._offset, len(encoded_body), *page_span))
+        self._offset += len(encoded_body)
+        self.count += 1
+
+    def close(self):
+        index = self._index.getvalue()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.count, self._offset, len(index)))
+        self._writer.__exit__(None, None, None)
+
+    def __enter__(self) -> 'PrayerStoreWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Abandon the temporary file and keep the previous store.
+            self._writer.__exit__(exc_type, exc_value, traceback)
+
+
+def write_prayer_store(path: Path, prayers: Iterable[Dict]):
+    """Writes {'title', 'body'} prayers (optionally with 'page_span') to a prayer store file."""
+    with PrayerStoreWriter(path) as writer:
+        for prayer in prayers:
+            writer.add(prayer['title'], prayer['body'], tuple(prayer.get('page_span', (-1, -1))))
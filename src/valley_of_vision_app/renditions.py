@@ -0,0 +1,243 @@
+import os
+import json
+import shutil
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from ffmpeg_utils import run_ffmpeg
+from file_utils import atomic_write_json, atomic_write_text, atomic_writer, sha256_file
+
+logger = logging.getLogger(__name__)
+
+# Each generated prayer_YYYY-MM-DD.mp3 can be re-encoded at several bitrates,
+# so listeners on slow connections need not download the full file. Each
+# bitrate also gets an HLS playlist of short segments for streaming players.
+# The renditions of a day live in their own folder:
+#
+#   renditions/prayer_2024-05-02/
+#     manifest.json       what was encoded, from which source (by SHA-256)
+#     master.m3u8         HLS master playlist listing every bitrate
+#     64k.mp3             the whole prayer at 64 kbit/s
+#     64k/index.m3u8      its HLS playlist, and the segments it lists,
+#     64k/segment_1f2e3d4c_000.ts   tagged anew by each encode
+#
+# A rendition is only encoded again when the source file's hash, or the
+# segment length, has changed since it was made.
+
+MANIFEST_NAME = 'manifest.json'
+MASTER_PLAYLIST_NAME = 'master.m3u8'
+# The HLS codec string for MPEG-1/2 Layer III audio.
+MP3_CODEC = 'mp4a.40.34'
+
+
+class RenditionSettings:
+    """Which renditions to make. See the [Renditions] section of config.ini."""
+
+    def __init__(self, bitrates: Tuple[str, ...] = ('32k', '64k', '128k'), segment_seconds: int = 6,
+                 workers: int = 0, directory: str = 'renditions', ffmpeg: str = 'ffmpeg'):
+        self.bitrates = bitrates
+        self.segment_seconds = segment_seconds
+        # 0 uses every CPU core.
+        self.workers = workers or os.cpu_count() or 1
+        self.directory = directory
+        self.ffmpeg = ffmpeg
+
+    @classmethod
+    def from_config(cls, config) -> 'RenditionSettings':
+        """Reads the [Renditions] section of config.ini."""
+        if not config.has_section('Renditions'):
+            return cls()
+        section = config['Renditions']
+        bitrates = tuple(b.strip() for b in section.get('Bitrates', '32k, 64k, 128k').split(',') if b.strip())
+        return cls(
+            bitrates=bitrates,
+            segment_seconds=section.getint('SegmentSeconds', 6),
+            workers=section.getint('Workers', 0),
+            directory=section.get('Dir', 'renditions'),
+            ffmpeg=section.get('Ffmpeg', 'ffmpeg'),
+        )
+
+
+def bits_per_second(bitrate: str) -> int:
+    """Converts a bitrate such as '64k' to bits per second."""
+    bitrate = bitrate.strip().lower()
+    if bitrate.endswith('k'):
+        return int(float(bitrate[:-1]) * 1000)
+    return int(bitrate)
+
+
+def master_playlist(renditions: List[Dict]) -> str:
+    """Returns an HLS master playlist listing each rendition's playlist, lowest bitrate first."""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rendition in sorted(renditions, key=lambda r: bits_per_second(r['bitrate'])):
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bits_per_second(rendition["bitrate"])},CODECS="{MP3_CODEC}"')
+        lines.append(rendition['playlist'])
+    return '\n'.join(lines) + '\n'
+
+
+def load_day_manifest(day_dir: Path) -> Dict:
+    """Loads a day's rendition manifest, or returns an empty one if it is missing or corrupt."""
+    try:
+        with open(day_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get('renditions'), dict):
+            return manifest
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {'source': None, 'source_sha256': None, 'segment_seconds': None, 'renditions': {}}
+
+
+def _is_current(manifest: Dict, bitrate: str, day_dir: Path) -> bool:
+    rendition = manifest['renditions'].get(bitrate)
+    return (rendition is not None and (day_dir / rendition['file']).exists()
+            and (day_dir / rendition['playlist']).exists())
+
+
+def plan_day(source: Path, day_dir: Path, settings: RenditionSettings) -> Tuple[str, Dict, List[str]]:
+    """
+    Works out what a source file still needs.
+
+    Returns:
+        The source's SHA-256, its day manifest with any out-of-date
+        renditions removed, and the bitrates that have to be encoded.
+    """
+    source_hash = sha256_file(source)
+    manifest = load_day_manifest(day_dir)
+    if manifest['source_sha256'] != source_hash or manifest['segment_seconds'] != settings.segment_seconds:
+        manifest = {'source': source.name, 'source_sha256': source_hash,
+                    'segment_seconds': settings.segment_seconds, 'renditions': {}}
+    manifest['renditions'] = {bitrate: rendition for bitrate, rendition in manifest['renditions'].items()
+                              if bitrate in settings.bitrates}
+    missing = [bitrate for bitrate in settings.bitrates if not _is_current(manifest, bitrate, day_dir)]
+    return source_hash, manifest, missing
+
+
+def remove_dropped_renditions(day_dir: Path, settings: RenditionSettings) -> List[str]:
+    """
+    Deletes the files of every bitrate in a day's folder that is no longer
+    in settings.bitrates, so taking a bitrate out of config.ini frees its space.
+
+    Returns:
+        The bitrates removed.
+    """
+    if not day_dir.is_dir():
+        return []
+    removed = []
+    for path in day_dir.iterdir():
+        if path.is_file() and path.suffix == '.mp3' and path.stem not in settings.bitrates:
+            path.unlink()
+            removed.append(path.stem)
+        elif path.is_dir() and not path.name.startswith('.') and path.name not in settings.bitrates:
+            shutil.rmtree(path)
+            removed.append(path.name)
+    return sorted(set(removed), key=bits_per_second)
+
+
+def encode_rendition(source: str, day_dir: str, bitrate: str, segment_seconds: int, ffmpeg: str) -> Dict:
+    """
+    Encodes one source file at one bitrate, as an MP3 and as an HLS playlist
+    with its segments. Runs in a worker process.
+
+    Each encode names its segments with a fresh tag, next to the old ones,
+    and its playlist then atomically replaces the old playlist. Only after
+    that are the old segments deleted, so the playlist is never missing and
+    never lists a segment that is not there.
+    """
+    source_path, day_path = Path(source), Path(day_dir)
+    mp3_path = day_path / f"{bitrate}.mp3"
+    with atomic_writer(mp3_path) as f:
+        run_ffmpeg(ffmpeg, ['-i', str(source_path), '-vn', '-codec:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', '-'],
+                   stdout=f)
+
+    hls_dir = day_path / bitrate
+    hls_dir.mkdir(parents=True, exist_ok=True)
+    tag = os.urandom(4).hex()
+    new_playlist = hls_dir / f".index-{tag}.m3u8"
+    try:
+        run_ffmpeg(ffmpeg, ['-i', str(mp3_path), '-codec:a', 'copy', '-f', 'hls',
+                            '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+                            '-hls_segment_filename', str(hls_dir / f'segment_{tag}_%03d.ts'),
+                            str(new_playlist)])
+        os.replace(new_playlist, hls_dir / 'index.m3u8')
+    except BaseException:
+        for segment in hls_dir.glob(f'segment_{tag}_*.ts'):
+            segment.unlink()
+        raise
+    finally:
+        new_playlist.unlink(missing_ok=True)
+    for segment in hls_dir.glob('segment_*.ts'):
+        if not segment.name.startswith(f'segment_{tag}_'):
+            segment.unlink()
+
+    return {
+        'bitrate': bitrate,
+        'file': mp3_path.name,
+        'bytes': mp3_path.stat().st_size,
+        'sha256': sha256_file(mp3_path),
+        'playlist': f"{bitrate}/index.m3u8",
+        'segments': len(list(hls_dir.glob(f'segment_{tag}_*.ts'))),
+    }
+
+
+def _save_day(day_dir: Path, manifest: Dict):
+    manifest['renditions'] = dict(sorted(manifest['renditions'].items(), key=lambda item: bits_per_second(item[0])))
+    manifest['master_playlist'] = MASTER_PLAYLIST_NAME
+    atomic_write_text(day_dir / MASTER_PLAYLIST_NAME, master_playlist(list(manifest['renditions'].values())))
+    atomic_write_json(day_dir / MANIFEST_NAME, manifest, indent=2)
+
+
+def encode_renditions(sources: List[Path], renditions_dir: Path, settings: RenditionSettings) -> Dict[Path, Optional[Dict]]:
+    """
+    Makes every configured rendition of each source file that is missing or
+    out of date, spreading the encodes (one per file and bitrate) over a
+    pool of settings.workers processes. Each day's manifest and master
+    playlist are written once all its renditions are done.
+
+    Returns:
+        Each source's day manifest, or None if any of its renditions failed.
+    """
+    plans = {}
+    tasks = []
+    # Days whose manifest and master playlist still list a dropped bitrate.
+    dropped = set()
+    for source in sources:
+        day_dir = renditions_dir / source.stem
+        _, manifest, missing = plan_day(source, day_dir, settings)
+        plans[source] = (day_dir, manifest)
+        removed = remove_dropped_renditions(day_dir, settings)
+        if removed:
+            logger.info(f"Removed the {', '.join(removed)} renditions of {source.name}.")
+            dropped.add(source)
+        tasks.extend((source, bitrate) for bitrate in missing)
+        metrics.increment('renditions_skipped', len(settings.bitrates) - len(missing))
+
+    failed = set()
+    if tasks:
+        logger.info(f"Encoding {len(tasks)} renditions of {len({source for source, _ in tasks})} files...")
+        with ProcessPoolExecutor(max_workers=min(settings.workers, len(tasks))) as pool:
+            futures = {pool.submit(encode_rendition, str(source), str(plans[source][0]), bitrate,
+                                   settings.segment_seconds, settings.ffmpeg): (source, bitrate)
+                       for source, bitrate in tasks}
+            for future in as_completed(futures):
+                source, bitrate = futures[future]
+                try:
+                    plans[source][1]['renditions'][bitrate] = future.result()
+                    metrics.increment('renditions_encoded')
+                except Exception as e:
+                    # Anything from a worker, a broken pool included, fails just this rendition;
+                    # the day's audio has already been published.
+                    logger.error(f"Could not encode {source.name} at {bitrate}: {e}")
+                    metrics.increment('rendition_errors')
+                    failed.add(source)
+
+    results = {}
+    encoded = {source for source, _ in tasks} | dropped
+    for source, (day_dir, manifest) in plans.items():
+        # Save even after a failure, so the renditions that did finish are kept.
+        if source in encoded and manifest['renditions']:
+            _save_day(day_dir, manifest)
+        results[source] = None if source in failed else manifest
+    return results
@@ -0,0 +1,134 @@
+import time
+import random
+import logging
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# The longest the scheduler sleeps at once, so it notices config changes and
+# clock jumps (e.g. after the machine wakes from sleep) reasonably quickly.
+MAX_SLEEP_SECONDS = 60
+# How long to wait before trying again after the job raised an error.
+RETRY_SECONDS = 15 * 60
+
+
+class DailySchedule:
+    """
+    When the daily job should run: at `run_at` each day, plus a random delay
+    of up to `jitter` seconds. The delay is fixed for a given date, so it
+    does not change when the config is reloaded during the day.
+
+    With catch_up on, a run that was missed (the process was not running or
+    the machine was asleep at the time) happens as soon as possible that
+    same day. With it off, a missed day is skipped. Either way, days that
+    passed entirely while the process was down are not made up afterwards.
+    """
+
+    def __init__(self, run_at: str = '05:00', jitter: float = 0, catch_up: bool = True):
+        self.run_at = datetime.strptime(run_at.strip(), '%H:%M').time()
+        self.jitter = max(0.0, jitter)
+        self.catch_up = catch_up
+
+    @classmethod
+    def from_config(cls, config) -> 'DailySchedule':
+        """Reads the [Schedule] section of config.ini."""
+        section = config['Schedule'] if config.has_section('Schedule') else {}
+        return cls(
+            run_at=section.get('Time', '05:00'),
+            jitter=float(section.get('JitterSeconds', 0)),
+            catch_up=str(section.get('CatchUp', 'true')).lower() in ('1', 'true', 'yes', 'on'),
+        )
+
+    def due_time(self, day: date) -> datetime:
+        """Returns when the job is due on a given day."""
+        delay = random.Random(day.toordinal()).uniform(0, self.jitter)
+        return datetime.combine(day, self.run_at) + timedelta(seconds=delay)
+
+    def should_run(self, now: datetime, done_today: bool, started_at: datetime) -> bool:
+        """Decides whether the job should run right now."""
+        due = self.due_time(now.date())
+        if done_today or now < due:
+            return False
+        # Without catch-up, only run if the process was already up when the job fell due.
+        return self.catch_up or started_at <= due
+
+    def seconds_until_next_check(self, now: datetime) -> float:
+        """Returns how long to sleep before looking at the schedule again."""
+        due = self.due_time(now.date())
+        if now >= due:
+            due = self.due_time(now.date() + timedelta(days=1))
+        return max(1.0, min(MAX_SLEEP_SECONDS, (due - now).total_seconds()))
+
+
+class ConfigWatcher:
+    """Notices when a config file has been changed on disk."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._signature = self._read_signature()
+
+    def _read_signature(self):
+        try:
+            stat = self.path.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        """Returns True once for every change since the last call."""
+        signature = self._read_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+
+def run_daily(job: Callable[[], None], is_done: Callable[[date], bool], schedule: Callable[[], DailySchedule],
+              on_config_change: Optional[Callable[[], None]] = None, config_path: Optional[Path] = None,
+              now: Callable[[], datetime] = datetime.now, sleep: Callable[[float], None] = time.sleep,
+              max_runs: Optional[int] = None):
+    """
+    Runs `job` once a day, following the schedule, until interrupted.
+
+    Args:
+        job: The daily work. If it raises or leaves the day unfinished, it
+            is tried again after RETRY_SECONDS.
+        is_done: Tells whether the work for a date has already been done, so
+            a restart on the same day does not run it twice.
+        schedule: Returns the current schedule; called again after a reload.
+        on_config_change: Called when config_path changes on disk.
+        config_path: The file to watch for changes.
+        now, sleep: The clock, replaceable in tests.
+        max_runs: Stop after this many runs (for tests); None runs forever.
+    """
+    watcher = ConfigWatcher(config_path) if config_path else None
+    started_at = now()
+    current = schedule()
+    runs = 0
+    logger.info(f"Scheduler started. Daily run at {current.run_at.strftime('%H:%M')}"
+                f" (+ up to {current.jitter:.0f}s), catch-up {'on' if current.catch_up else 'off'}.")
+
+    while max_runs is None or runs < max_runs:
+        if watcher and watcher.changed():
+            logger.info("config.ini changed; reloading.")
+            if on_config_change:
+                on_config_change()
+            current = schedule()
+
+        moment = now()
+        if current.should_run(moment, is_done(moment.date()), started_at):
+            logger.info(f"Running the daily job for {moment.date()}...")
+            runs += 1
+            try:
+                job()
+            except Exception:
+                logger.exception("The daily job failed.")
+            if not is_done(moment.date()):
+                logger.warning(f"The daily job did not finish; trying again in {RETRY_SECONDS // 60} minutes.")
+                if max_runs is None or runs < max_runs:
+                    sleep(RETRY_SECONDS)
+            continue
+
+        sleep(current.seconds_until_next_check(moment))
@@ -0,0 +1,233 @@
+import re
+import json
+import math
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from file_utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Words are runs of letters and digits, with inner apostrophes ("thou'rt").
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+# A query is made of "quoted phrases" and single words.
+_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# The usual BM25 constants: k1 limits how much repeating a word helps, and
+# b how much long prayers are penalised.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into lowercase words."""
+    return _TOKEN_PATTERN.findall(text.lower().replace('’', "'"))
+
+
+def document_key(title: str, body: str) -> str:
+    """A key for one prayer's exact content, so unchanged prayers are recognised after a re-parse."""
+    return hashlib.blake2b(f"{title}\0{body}".encode('utf-8'), digest_size=8).hexdigest()
+
+
+def parse_query(query: str) -> Tuple[List[str], List[List[str]]]:
+    """Splits a query into its single words and its phrases (each a list of words)."""
+    words, phrases = [], []
+    for phrase, word in _QUERY_PATTERN.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+            else:
+                words.extend(tokens)
+        else:
+            words.extend(tokenize(word))
+    return words, phrases
+
+
+class SearchIndex:
+    """
+    A positional inverted index over the prayers, ranked with BM25.
+
+    For every word it records which prayers contain it and at which word
+    positions (the title counts as the first words of the prayer), which is
+    what phrase queries need. Prayers are keyed by a hash of their content,
+    so after a re-parse only the prayers that actually changed are
+    re-indexed, and results point at their current position in the store.
+    """
+
+    def __init__(self):
+        # word -> {document key -> [positions]}
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        # document key -> {'index': position in the store, 'title': ..., 'length': words}
+        self.documents: Dict[str, Dict] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, key: str, index: int, title: str, body: str):
+        tokens = tokenize(title) + tokenize(body)
+        for position, token in enumerate(tokens):
+            self.postings.setdefault(token, {}).setdefault(key, []).append(position)
+        self.documents[key] = {'index': index, 'title': title, 'length': len(tokens)}
+        self._total_length += len(tokens)
+
+    def remove(self, keys: Iterable[str]):
+        keys = set(keys) & self.documents.keys()
+        if not keys:
+            return
+        for token in list(self.postings):
+            documents = self.postings[token]
+            for key in keys & documents.keys():
+                del documents[key]
+            if not documents:
+                del self.postings[token]
+        for key in keys:
+            self._total_length -= self.documents.pop(key)['length']
+
+    def update(self, prayers) -> Tuple[int, int]:
+        """
+        Brings the index up to date with the prayers (a PrayerStore or a list
+        of prayer dictionaries), re-indexing only what changed.
+
+        Returns:
+            How many prayers were added and removed.
+        """
+        current = {}
+        for index, prayer in enumerate(prayers):
+            key = document_key(prayer['title'], prayer['body'])
+            if key in current:
+                # An exact duplicate; the first copy is enough.
+                continue
+            current[key] = (index, prayer)
+
+        removed = [key for key in self.documents if key not in current]
+        self.remove(removed)
+        added = 0
+        for key, (index, prayer) in current.items():
+            if key in self.documents:
+                self.documents[key]['index'] = index
+            else:
+                self.add(key, index, prayer['title'], prayer['body'])
+                added += 1
+        return added, len(removed)
+
+    def _phrase_positions(self, key: str, phrase: List[str]) -> int:
+        """Counts the occurrences of a phrase in one prayer."""
+        lists = [self.postings.get(token, {}).get(key) for token in phrase]
+        if not all(lists):
+            return 0
+        following = [set(positions) for positions in lists[1:]]
+        return sum(1 for start in lists[0]
+                   if all(start + offset + 1 in positions for offset, positions in enumerate(following)))
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, int, str]]:
+        """
+        Finds the prayers that best match a query.
+
+        Single words are ranked with BM25; any prayer containing at least one
+        of them can match. Every "quoted phrase" must appear word for word,
+        and its words count towards the score.
+
+        Returns:
+            Up to `limit` (score, store position, title) tuples, best first.
+        """
+        words, phrases = parse_query(query)
+        if not words and not phrases:
+            return []
+        document_count = len(self.documents)
+        average_length = self._total_length / document_count if document_count else 0
+
+        candidates = None
+        for phrase in phrases:
+            # Start from the rarest word of the phrase, then check positions.
+            rarest = min(phrase, key=lambda token: len(self.postings.get(token, {})))
+            matches = {key for key in self.postings.get(rarest, {}) if self._phrase_positions(key, phrase)}
+            candidates = matches if candidates is None else candidates & matches
+        if candidates is not None and not candidates:
+            return []
+
+        scores: Dict[str, float] = {}
+        for token in set(words).union(*phrases):
+            documents = self.postings.get(token)
+            if not documents:
+                continue
+            idf = math.log(1 + (document_count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for key, positions in documents.items():
+                if candidates is not None and key not in candidates:
+                    continue
+                frequency = len(positions)
+                length = self.documents[key]['length']
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], self.documents[item[0]]['index']))[:limit]
+        return [(score, self.documents[key]['index'], self.documents[key]['title']) for key, score in best]
+
+    # --- Saving and loading ---
+
+    def save(self, path: Path):
+        atomic_write_json(path, {
+            'version': INDEX_VERSION,
+            'documents': self.documents,
+            'postings': self.postings,
+        })
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['SearchIndex']:
+        """Loads a saved index, or returns None if it is missing, unreadable or from another version."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            return None
+        index = cls()
+        index.documents = data['documents']
+        index.postings = data['postings']
+        index._total_length = sum(document['length'] for document in index.documents.values())
+        return index
+
+
+def update_search_index(index_path: Path, prayers) -> SearchIndex:
+    """Updates the saved index to match the prayers, re-indexing only changed prayers."""
+    index = SearchIndex.load(index_path) or SearchIndex()
+    places = {key: document['index'] for key, document in index.documents.items()}
+    added, removed = index.update(prayers)
+    # Prayers that only moved in the store need their new places saved too.
+    moved = sum(1 for key, document in index.documents.items()
+                if places.get(key, document['index']) != document['index'])
+    if added or removed or moved or not index_path.exists():
+        index.save(index_path)
+        logger.info(f"Search index updated: {added} prayers indexed, {removed} removed, {moved} moved.")
+    return index
+
+
+def snippet(body: str, query: str, width: int = 100) -> str:
+    """
+    Returns a short piece of the body around the first place it matches the
+    query: its first quoted phrase if there is one (even across a line
+    break), and otherwise its first single word.
+    """
+    words, phrases = parse_query(query)
+    # The same words, in the same places, that the index saw.
+    matches = list(_TOKEN_PATTERN.finditer(body.lower().replace('’', "'")))
+    tokens = [match.group() for match in matches]
+
+    def first(sequence: List[str]) -> Optional[int]:
+        for position in range(len(tokens) - len(sequence) + 1):
+            if tokens[position:position + len(sequence)] == sequence:
+                return matches[position].start()
+        return None
+
+    starts = [start for start in map(first, phrases) if start is not None]
+    if not starts:
+        starts = [start for start in (first([word]) for word in words) if start is not None]
+    start = max(0, min(starts) - width // 4) if starts else 0
+    text = ' '.join(body[start:start + width].split())
+    return ('…' if start else '') + text + ('…' if start + width < len(body) else '')
@@ -0,0 +1,87 @@
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Each group of listeners ("tenant") has its own place in the prayer cycle,
+# its own voice and intro, and its own folder of audio files and manifest.
+# Tenants are declared in config.ini as [Tenant.<name>] sections:
+#
+#   [Tenant.youth]
+#   Voice = nova
+#   Intro = Good morning, friends...
+#
+# Anything left out gets a default under the tenant's name. With no tenant
+# sections at all, a single "default" tenant uses the files in [Paths], so a
+# one-group setup works exactly as before.
+
+DEFAULT_TENANT = 'default'
+DEFAULT_CYCLE_DIR = 'data/processed/cycles'
+
+
+class Tenant:
+    """One group of listeners and where its state and audio live."""
+
+    def __init__(self, name: str, cycle_state_file: Path, output_dir: Path, manifest_file: Path,
+                 voice: Optional[str] = None, intro: Optional[str] = None):
+        self.name = name
+        self.cycle_state_file = cycle_state_file
+        self.output_dir = output_dir
+        self.manifest_file = manifest_file
+        # The voice for the primary TTS backend; None uses the backend's own.
+        self.voice = voice
+        # The words spoken before the prayer; None uses the standard intro.
+        self.intro = intro
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.name!r})"
+
+
+def load_tenants(config, project_root: Path) -> List[Tenant]:
+    """Returns the tenants declared in config.ini, in the order they appear."""
+    paths = config['Paths']
+    sections = [section for section in config.sections() if section.startswith('Tenant.')]
+    if not sections:
+        return [Tenant(
+            DEFAULT_TENANT,
+            cycle_state_file=project_root / paths['CycleStateFile'],
+            output_dir=project_root / paths['OutputDir'],
+            manifest_file=project_root / paths['DailyManifestFile'],
+        )]
+
+    tenants = []
+    for section_name in sections:
+        section = config[section_name]
+        name = section_name[len('Tenant.'):]
+        output_dir = section.get('OutputDir', f"{paths['OutputDir']}/{name}")
+        tenants.append(Tenant(
+            name,
+            cycle_state_file=project_root / section.get('CycleStateFile', f"{DEFAULT_CYCLE_DIR}/{name}.json"),
+            output_dir=project_root / output_dir,
+            manifest_file=project_root / section.get('DailyManifestFile', f"{output_dir}/manifest.json"),
+            voice=section.get('Voice') or None,
+            intro=section.get('Intro') or None,
+        ))
+    return tenants
+
+
+class RenderJob:
+    """One audio file to produce: a tenant's prayer for a day."""
+
+    def __init__(self, tenant: Tenant, day: date, title: str, text: str, audio_path: Path):
+        self.tenant = tenant
+        self.day = day
+        self.title = title
+        self.text = text
+        self.audio_path = audio_path
+
+
+def group_jobs(jobs: List[RenderJob]) -> List[List[RenderJob]]:
+    """
+    Groups the jobs that would produce identical audio (the same text in the
+    same voice), so each group is synthesized once and copied to the rest.
+    Groups keep the order of their first job.
+    """
+    groups: Dict[Tuple[str, str], List[RenderJob]] = {}
+    for job in jobs:
+        groups.setdefault((job.text, job.tenant.voice or ''), []).append(job)
+    return list(groups.values())
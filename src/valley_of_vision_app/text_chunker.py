@@ -0,0 +1,89 @@
+import re
+from typing import List
+
+# Most TTS services cap the length of one request (OpenAI allows 4096
+# characters). Shorter chunks also let a long prayer be synthesized in
+# parallel, so the default is well under that cap.
+DEFAULT_MAX_CHARS = 1000
+
+# Paragraphs are separated by a blank line.
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# A sentence ends with . ! ? or an ellipsis (… or a run of dots), optionally
+# followed by closing quotes or brackets, and then whitespace.
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"'’”)\]]*\s+")
+
+# Places to break a sentence that is too long on its own, best first.
+_CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+")
+_WORD_BREAK = re.compile(r"\s+")
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """Splits a paragraph into sentences, keeping each sentence's punctuation."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(paragraph):
+        sentence = paragraph[start:match.start()].strip() + paragraph[match.start():match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    rest = paragraph[start:].strip()
+    if rest:
+        sentences.append(rest)
+    return sentences
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Breaks a sentence longer than max_chars at clause, then word, boundaries."""
+    for pattern in (_CLAUSE_BREAK, _WORD_BREAK):
+        pieces = pattern.split(sentence)
+        if len(pieces) > 1:
+            return _pack(pieces, max_chars)
+    # A single "word" longer than the limit: cut it, as a last resort.
+    return [sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars)]
+
+
+def _pack(pieces: List[str], max_chars: int) -> List[str]:
+    """Greedily joins pieces with spaces into chunks of at most max_chars."""
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if len(piece) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.extend(_split_long(piece, max_chars))
+        elif not current:
+            current = piece
+        elif len(current) + 1 + len(piece) <= max_chars:
+            current = f"{current} {piece}"
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> List[str]:
+    """
+    Splits text for speech into chunks that can be synthesized separately.
+
+    Chunks end at sentence or ellipsis boundaries and never span a paragraph
+    break, so fixed paragraphs such as the intro always become the same
+    chunks. Sentences are packed together up to max_chars; a sentence longer
+    than that is broken at commas, or failing that, between words.
+
+    Args:
+        text: The full text to be spoken.
+        max_chars: The longest chunk to produce.
+
+    Returns:
+        The chunks, in reading order.
+    """
+    chunks = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        sentences = split_sentences(paragraph)
+        if sentences:
+            chunks.extend(_pack(sentences, max_chars))
+    return chunks
@@ -0,0 +1,427 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import metrics
+from audio_cache import AudioCache
+from file_utils import atomic_write_bytes, atomic_writer
+from mp3_utils import audio_frames, concat_mp3
+from text_chunker import DEFAULT_MAX_CHARS, chunk_text
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# The backends that can be listed in [TTS] Backends in config.ini, as
+# (module, class) pairs. Modules are imported only when their backend is used.
+BACKENDS: Dict[str, tuple] = {
+    'openai': ('tts_synthesizer', 'OpenAITTSEngine'),
+    'ttsopenai': ('ttsopenai_synthesizer', 'TTSOpenAIEngine'),
+    'gtts': ('gtts_synthesizer', 'GTTSEngine'),
+}
+
+# The package each backend needs at synthesis time. Backend modules import
+# them lazily, so their absence only shows when the first request is made.
+BACKEND_PACKAGES: Dict[str, str] = {
+    'openai': 'openai',
+    'ttsopenai': 'httpx',
+    'gtts': 'gtts',
+}
+
+
+# While a call is being timed (see timed_call()), holds the moment its first
+# request got past the concurrency and rate limits.
+_first_request_at: ContextVar[Optional[List[float]]] = ContextVar('first_request_at', default=None)
+
+
+class TTSError(Exception):
+    """Raised when a text-to-speech backend fails to produce audio."""
+
+
+_dotenv_loaded = False
+
+
+def get_api_key(name: str = "OPENAI_API_KEY") -> str:
+    """
+    Returns an API key from the environment, loading the project's .env file
+    the first time it is needed.
+
+    Raises:
+        TTSError: If the key is not set.
+    """
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        dotenv_path = Path(__file__).resolve().parents[2] / '.env'
+        if dotenv_path.is_file():
+            load_dotenv(dotenv_path=dotenv_path)
+        _dotenv_loaded = True
+
+    api_key = os.getenv(name)
+    if not api_key:
+        raise TTSError(f"{name} was not found in your environment or .env file.")
+    return api_key
+
+
+class RateLimiter:
+    """
+    A token bucket that lets at most `rate` requests start per second, with
+    bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TTSEngine:
+    """
+    Base class for the asynchronous text-to-speech backends.
+
+    Every engine owns one pooled httpx.AsyncClient, so repeated and
+    parallel requests reuse connections. At most `max_concurrency` requests
+    run at once, and `rate_limit` (requests per second, 0 for none) spaces
+    them out.
+
+    Long texts are split into sentence-aligned chunks of at most
+    `max_chunk_chars`, which are synthesized concurrently and joined. With
+    a `cache`, each chunk is looked up there first and only misses reach
+    the service; identical chunks requested at the same time share one
+    request.
+
+    Files are written chunk by chunk: each chunk's audio is streamed from
+    the service into its own part file, and the parts are then joined into
+    a temporary file that is fsynced and renamed over the output. A crash
+    never leaves a truncated MP3 behind, and a rerun reuses the parts that
+    finished.
+
+    With a `request_timeout`, each request to the service is given that many
+    seconds once it has its turn; time spent queued behind other requests
+    does not count against it.
+
+    Subclasses implement _stream(), which yields the audio for one text as it
+    arrives, or _synthesize(), which returns it all at once.
+
+    An engine belongs to the event loop it is first used on. Use run_sync()
+    to drive a shared engine from ordinary synchronous code.
+    """
+    name = 'tts'
+    default_voice: Optional[str] = None
+    model: Optional[str] = None
+
+    def __init__(self, voice: Optional[str] = None, max_concurrency: int = 4, rate_limit: float = 0.0,
+                 timeout: float = 180.0, verify_ssl: bool = True, max_chunk_chars: int = DEFAULT_MAX_CHARS,
+                 cache: Optional[AudioCache] = None, request_timeout: Optional[float] = None):
+        self.voice = voice or self.default_voice
+        self.cache = cache
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.max_concurrency = max_concurrency
+        self.max_chunk_chars = max_chunk_chars
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.verify_ssl = verify_ssl
+        self._rate_limiter = RateLimiter(rate_limit, burst=max_concurrency) if rate_limit > 0 else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client = None
+
+    @property
+    def client(self):
+        """The engine's shared, pooled HTTP client, created on first use."""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                verify=self.verify_ssl,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+        return self._client
+
+    async def _synthesize(self, text: str, voice: Optional[str]) -> bytes:
+        return b''.join([block async for block in self._stream(text, voice)])
+
+    async def _stream(self, text: str, voice: Optional[str]) -> AsyncIterator[bytes]:
+        yield await self._synthesize(text, voice)
+
+    def _cache_key(self, text: str, voice: Optional[str]) -> str:
+        return AudioCache.make_key(text, self.name, voice, self.model)
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> bytes:
+        """
+        Returns the MP3 audio for a piece of text.
+
+        Raises:
+            TTSError: Or any network error, if the backend fails.
+        """
+        voice = voice or self.voice
+        if self.cache is None:
+            return await self._request(text, voice)
+
+        key = self._cache_key(text, voice)
+        audio = self.cache.get(key)
+        if audio is not None:
+            return audio
+
+        async def request_and_cache() -> bytes:
+            audio = await self._request(text, voice)
+            self.cache.put(key, audio)
+            return audio
+
+        return await self._once(key, request_and_cache)
+
+    async def _once(self, key: str, make: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Runs make(), unless the segment with this key is already being made; then waits for that."""
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            audio = await make()
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            # The owner was cancelled (a failover timeout, or a hedge that
+            # lost), not the jobs waiting on it. Fail them with an ordinary
+            # error, so each can retry or fail over on its own.
+            future.set_exception(TTSError("The shared request for this segment was cancelled."))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the error as seen, in case nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    async def _request(self, text: str, voice: Optional[str]) -> bytes:
+        """Sends one request to the backend, within the concurrency and rate limits."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire()
+            _note_request_start()
+            with self._measured() as measure:
+                audio = await asyncio.wait_for(self._synthesize(text, voice), self.request_timeout)
+                measure(len(audio))
+            return audio
+
+    @contextmanager
+    def _measured(self) -> Iterator[Callable[[int], None]]:
+        """Records a request's latency, the bytes it received, and whether it failed."""
+        start = time.perf_counter()
+        received = 0
+
+        def measure(byte_count: int):
+            nonlocal received
+            received += byte_count
+
+        try:
+            yield measure
+        except Exception:
+            metrics.increment('tts_request_errors', backend=self.name)
+            raise
+        finally:
+            metrics.increment('tts_api_bytes', received, backend=self.name)
+        metrics.increment('tts_requests', backend=self.name)
+        metrics.observe('tts_request_seconds', time.perf_counter() - start, backend=self.name)
+
+    async def _request_to_file(self, text: str, voice: Optional[str], path: Path):
+        """Like _request(), but streams the audio into a file as it arrives."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire()
+            _note_request_start()
+            with self._measured() as measure, atomic_writer(path) as f:
+                async def stream():
+                    async for block in self._stream(text, voice):
+                        f.write(block)
+                        measure(len(block))
+
+                await asyncio.wait_for(stream(), self.request_timeout)
+
+    async def synthesize_many(self, texts: List[str], voice: Optional[str] = None) -> List[bytes]:
+        """Synthesizes several texts concurrently, returning the audio in the same order."""
+        return list(await asyncio.gather(*(self.synthesize(text, voice) for text in texts)))
+
+    async def synthesize_long(self, text: str, voice: Optional[str] = None) -> bytes:
+        """
+        Returns the MP3 audio for a text of any length. The text is split into
+        chunks, the chunks are synthesized in parallel, and their MP3 frames
+        are joined in order without re-encoding.
+        """
+        chunks = chunk_text(text, self.max_chunk_chars)
+        if not chunks:
+            raise TTSError("There is no text to synthesize.")
+        if len(chunks) == 1:
+            return await self.synthesize(chunks[0], voice)
+        return concat_mp3(await self.synthesize_many(chunks, voice))
+
+    async def _render_part(self, text: str, voice: Optional[str], part_path: Path):
+        """Makes sure a chunk's audio is in part_path, from an earlier run, the cache or the service."""
+        if part_path.exists():
+            return
+        if self.cache is None:
+            await self._request_to_file(text, voice, part_path)
+            return
+
+        key = self._cache_key(text, voice)
+        audio = self.cache.get(key)
+        if audio is None:
+            async def stream_and_cache() -> bytes:
+                await self._request_to_file(text, voice, part_path)
+                audio = part_path.read_bytes()
+                self.cache.put(key, audio)
+                return audio
+
+            audio = await self._once(key, stream_and_cache)
+        if not part_path.exists():
+            atomic_write_bytes(part_path, audio)
+
+    async def render_to_file(self, text: str, output_filepath: Path, voice: Optional[str] = None):
+        """
+        Synthesizes text of any length into output_filepath.
+
+        Each chunk is streamed into a part file in "<output>.parts", named
+        after the chunk's cache key so a rerun can tell which parts are done.
+        The parts are then joined one at a time into a temporary file that
+        replaces the output atomically, and removed.
+
+        Raises:
+            TTSError: Or any network error, if the backend fails.
+        """
+        voice = voice or self.voice
+        chunks = chunk_text(text, self.max_chunk_chars)
+        if not chunks:
+            raise TTSError("There is no text to synthesize.")
+
+        parts_dir = output_filepath.with_name(output_filepath.name + '.parts')
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        part_paths = [parts_dir / f"{index:04d}-{self._cache_key(chunk, voice)[:16]}.mp3"
+                      for index, chunk in enumerate(chunks)]
+        await asyncio.gather(*(self._render_part(chunk, voice, part_path)
+                               for chunk, part_path in zip(chunks, part_paths)))
+
+        with atomic_writer(output_filepath) as f:
+            for part_path in part_paths:
+                data = part_path.read_bytes()
+                f.write(audio_frames(data) if len(part_paths) > 1 else data)
+        for part_path in part_paths:
+            part_path.unlink()
+        try:
+            parts_dir.rmdir()
+        except OSError:
+            # Another engine is still using the directory; it removes it last.
+            pass
+
+    async def synthesize_to_file(self, text: str, output_filepath: Path, voice: Optional[str] = None) -> bool:
+        """
+        Synthesizes text of any length and saves it to output_filepath.
+
+        Returns:
+            True if the audio file was created successfully, False otherwise.
+        """
+        try:
+            voice_note = f" voice '{voice or self.voice}'" if voice or self.voice else ''
+            logger.info(f"Generating speech with {self.name}{voice_note}... Saving to {output_filepath}")
+            await self.render_to_file(text, output_filepath, voice)
+            logger.info("Speech generation successful.")
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred during text-to-speech conversion: {e}")
+            return False
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> 'TTSEngine':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def _note_request_start():
+    started = _first_request_at.get()
+    if started is not None and not started:
+        started.append(time.monotonic())
+
+
+async def timed_call(call: Awaitable[T]) -> Tuple[T, Optional[float]]:
+    """
+    Awaits a call to an engine and measures it from the moment its first
+    request got its turn, leaving out time spent queued behind other calls.
+
+    Returns:
+        The call's result, and its duration in seconds (None if it made no
+        request, for example because every chunk was cached).
+    """
+    started: List[float] = []
+    token = _first_request_at.set(started)
+    try:
+        result = await call
+    finally:
+        _first_request_at.reset(token)
+    return result, (time.monotonic() - started[0]) if started else None
+
+
+def create_engine(backend: str, **options: Any) -> TTSEngine:
+    """
+    Creates the engine for a backend named in BACKENDS, importing only that
+    backend's module.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    module_name, class_name = BACKENDS[backend]
+    engine_class = getattr(importlib.import_module(module_name), class_name)
+    return engine_class(**options)
+
+
+# --- Running engines from synchronous code ---
+# All synchronous callers share one event loop running in a background
+# thread, so the engines (and their connection pools) they use live on as
+# long as the process does, and calls from several threads run concurrently.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='tts-engine-loop', daemon=True).start()
+    return _loop
+
+
+def run_sync(coroutine: Awaitable[T]) -> T:
+    """Runs a coroutine on the shared background event loop and waits for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
@@ -0,0 +1,247 @@
+import json
+import random
+import shutil
+import asyncio
+import logging
+import importlib.util
+from collections import deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from audio_cache import AudioCache
+from file_utils import atomic_write_json
+from text_chunker import DEFAULT_MAX_CHARS
+from tts_engine import BACKEND_PACKAGES, TTSEngine, TTSError, create_engine, timed_call
+
+logger = logging.getLogger(__name__)
+
+# How many recent latencies are kept per backend, and how many are needed
+# before the 95th percentile is trusted enough to hedge on.
+LATENCY_HISTORY = 100
+MIN_LATENCY_SAMPLES = 5
+
+
+class LatencyTracker:
+    """
+    Remembers recent successful synthesis times per backend and per kind of
+    call, optionally in a small JSON file so that one-shot runs learn from
+    the runs before them. A whole prayer (render_to_file, synthesize_long)
+    takes far longer than one chunk (synthesize), so each kind has its own
+    history and its own p95.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._samples: Dict[Tuple[str, str], deque] = {}
+        if path is not None and path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for backend, kinds in json.load(f).items():
+                        if not isinstance(kinds, dict):
+                            # Written before calls were told apart; its timings are mixed.
+                            continue
+                        for kind, samples in kinds.items():
+                            self._history(backend, kind).extend(float(s) for s in samples)
+            except (OSError, ValueError, AttributeError, TypeError):
+                logger.warning(f"Ignoring unreadable latency history at {path}")
+
+    def _history(self, backend: str, kind: str) -> deque:
+        return self._samples.setdefault((backend, kind), deque(maxlen=LATENCY_HISTORY))
+
+    def record(self, backend: str, seconds: float, kind: str = 'synthesize'):
+        self._history(backend, kind).append(seconds)
+
+    def p95(self, backend: str, kind: str = 'synthesize') -> Optional[float]:
+        """Returns the backend's 95th percentile latency for a kind of call, or None if there is too little history."""
+        samples = sorted(self._samples.get((backend, kind), ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def save(self):
+        if self.path is not None:
+            history: Dict[str, Dict[str, List[float]]] = {}
+            for (backend, kind), samples in self._samples.items():
+                history.setdefault(backend, {})[kind] = list(samples)
+            atomic_write_json(self.path, history)
+
+
+class Backend:
+    """
+    One link in the failover chain: an engine and how patiently to use it.
+    The timeout applies to each request the engine sends, from when the
+    request gets its turn, so a call queued behind others does not time out.
+    """
+
+    def __init__(self, engine: TTSEngine, timeout: float = 180.0, retries: int = 0, backoff: float = 1.0):
+        self.engine = engine
+        self.timeout = timeout
+        engine.request_timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    @property
+    def name(self) -> str:
+        return self.engine.name
+
+
+class FailoverEngine(TTSEngine):
+    """
+    Tries a chain of backends in order until one produces the audio.
+
+    An attempt fails when one of its requests runs past the backend's
+    timeout (queueing for a turn does not count), and is retried up to
+    `retries` times, waiting backoff, 2 x backoff, 4 x backoff ... seconds
+    (plus a little jitter) in between, before moving on to the next backend.
+
+    With hedging on, if an attempt is still running after the backend's p95
+    latency, the next backend in the chain is started alongside it and
+    whichever finishes first wins; the other is cancelled. This bounds the
+    tail latency without doubling the cost of ordinary requests.
+
+    Whole texts always come from a single backend, so one prayer never mixes
+    voices. Chunking, caching and connection pooling happen in each backend.
+    """
+
+    def __init__(self, backends: List[Backend], hedge: bool = False,
+                 latency: Optional[LatencyTracker] = None):
+        if not backends:
+            raise ValueError("The failover chain needs at least one backend.")
+        super().__init__(max_concurrency=backends[0].engine.max_concurrency)
+        self.backends = backends
+        self.hedge = hedge
+        self.latency = latency or LatencyTracker()
+        self.name = ' -> '.join(backend.name for backend in backends)
+
+    async def _timed(self, backend: Backend, kind: str, call: Callable[[TTSEngine], Awaitable[Any]]) -> Any:
+        audio, seconds = await timed_call(call(backend.engine))
+        if seconds is not None:
+            self.latency.record(backend.name, seconds, kind)
+        return audio
+
+    async def _attempt(self, position: int, kind: str, call: Callable[[TTSEngine], Awaitable[Any]]) -> Any:
+        """Runs one attempt on a backend, hedging with the next backend if it is slow."""
+        backend = self.backends[position]
+        primary = asyncio.ensure_future(self._timed(backend, kind, call))
+        hedge_delay = self.latency.p95(backend.name, kind) if self.hedge else None
+        if hedge_delay is None or position + 1 >= len(self.backends):
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                hedge_backend = self.backends[position + 1]
+                logger.info(f"{backend.name} is slower than its p95 ({hedge_delay:.1f}s); "
+                            f"hedging with {hedge_backend.name}.")
+                metrics.increment('tts_hedges', backend=backend.name)
+                tasks.add(asyncio.ensure_future(self._timed(hedge_backend, kind, call)))
+
+            errors = []
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_chain(self, kind: str, call: Callable[[TTSEngine], Awaitable[Any]]) -> Any:
+        errors = []
+        for position, backend in enumerate(self.backends):
+            for attempt in range(backend.retries + 1):
+                if attempt:
+                    delay = backend.backoff * 2 ** (attempt - 1)
+                    await asyncio.sleep(delay + random.uniform(0, delay / 10))
+                try:
+                    return await self._attempt(position, kind, call)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    reason = 'timed out' if isinstance(e, asyncio.TimeoutError) else str(e)
+                    logger.warning(f"{backend.name} attempt {attempt + 1} failed: {reason}")
+                    metrics.increment('tts_backend_failures', backend=backend.name)
+                    errors.append(f"{backend.name}: {reason}")
+        raise TTSError("All TTS backends failed. " + "; ".join(errors))
+
+    def _voice_for(self, engine: TTSEngine, voice: Optional[str]) -> Optional[str]:
+        # Voice names only mean something to one service, so a requested voice
+        # goes to the primary backend; the fallbacks use their configured voices.
+        return voice if engine is self.backends[0].engine else None
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> bytes:
+        return await self._run_chain(
+            'synthesize', lambda engine: engine.synthesize(text, self._voice_for(engine, voice)))
+
+    async def synthesize_long(self, text: str, voice: Optional[str] = None) -> bytes:
+        return await self._run_chain(
+            'synthesize_long', lambda engine: engine.synthesize_long(text, self._voice_for(engine, voice)))
+
+    async def render_to_file(self, text: str, output_filepath: Path, voice: Optional[str] = None):
+        # Parts are named after each backend's own cache keys, so a retry on
+        # the same backend resumes its parts and other backends never use them.
+        await self._run_chain(
+            'render_to_file', lambda engine: engine.render_to_file(text, output_filepath, self._voice_for(engine, voice)))
+        # Clear out any parts left by backends that failed along the way.
+        shutil.rmtree(output_filepath.with_name(output_filepath.name + '.parts'), ignore_errors=True)
+
+    async def aclose(self):
+        self.latency.save()
+        for backend in self.backends:
+            await backend.engine.aclose()
+
+
+def create_engine_from_config(config, project_root: Path, cache: Optional[AudioCache] = None) -> FailoverEngine:
+    """
+    Creates the failover engine described by config.ini.
+
+    [TTS] Backends lists the chain, primary first. Each backend can have a
+    [TTS.<name>] section overriding Voice, Timeout, Retries and Backoff;
+    anything not set there falls back to [TTS].
+    """
+    tts_config = config['TTS']
+    names = [name.strip() for name in tts_config.get('Backends', 'openai').split(',') if name.strip()]
+
+    backends = []
+    for name in names:
+        section = config[f'TTS.{name}'] if config.has_section(f'TTS.{name}') else tts_config
+        package = BACKEND_PACKAGES.get(name)
+        if package is not None and importlib.util.find_spec(package) is None:
+            # The backend would import fine and only fail on its first request.
+            logger.warning(f"Skipping TTS backend '{name}': the '{package}' package is not installed.")
+            continue
+        try:
+            engine = create_engine(
+                name,
+                voice=section.get('Voice', fallback=None) or None,
+                max_concurrency=tts_config.getint('MaxConcurrency', 4),
+                rate_limit=tts_config.getfloat('RateLimit', 0.0),
+                timeout=section.getfloat('Timeout', tts_config.getfloat('Timeout', 180.0)),
+                verify_ssl=tts_config.getboolean('VerifySSL', True),
+                max_chunk_chars=tts_config.getint('ChunkChars', DEFAULT_MAX_CHARS),
+                cache=cache,
+            )
+        except ImportError as e:
+            # A backend whose package is not installed is left out of the chain.
+            logger.warning(f"Skipping TTS backend '{name}': {e}")
+            continue
+        backends.append(Backend(
+            engine,
+            timeout=section.getfloat('Timeout', tts_config.getfloat('Timeout', 180.0)),
+            retries=section.getint('Retries', tts_config.getint('Retries', 0)),
+            backoff=section.getfloat('Backoff', tts_config.getfloat('Backoff', 1.0)),
+        ))
+
+    if not backends:
+        raise TTSError("None of the TTS backends in config.ini could be loaded.")
+
+    latency_file = tts_config.get('LatencyFile')
+    return FailoverEngine(
+        backends,
+        hedge=tts_config.getboolean('Hedge', False),
+        latency=LatencyTracker(project_root / latency_file if latency_file else None),
+    )
@@ -1,8 +1,58 @@
 import os
-import httpx
 from pathlib import Path
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import AsyncIterator, Optional
+
+from audio_cache import get_default_cache
+from tts_engine import TTSEngine, get_api_key, run_sync
+
+
+class OpenAITTSEngine(TTSEngine):
+    """
+    Converts text to speech with OpenAI's standard TTS API.
+
+    The OpenAI client is created once and sends its requests through the
+    engine's pooled HTTP client. 'onyx' is a deep, professional voice.
+    """
+    name = 'openai'
+    default_voice = 'onyx'
+
+    def __init__(self, voice: Optional[str] = None, model: str = "tts-1-hd",
+                 base_url: Optional[str] = None, **options):
+        super().__init__(voice, **options)
+        self.model = model  # The high-definition model, for the best quality.
+        self.base_url = base_url
+        self._openai = None
+
+    def _get_openai_client(self):
+        if self._openai is None:
+            from openai import AsyncOpenAI
+            self._openai = AsyncOpenAI(
+                api_key=get_api_key("OPENAI_API_KEY"),
+                base_url=self.base_url or os.getenv("OPENAI_BASE_URL") or None,
+                http_client=self.client,
+                # Retries are handled above the engine, per backend.
+                max_retries=0,
+            )
+        return self._openai
+
+    async def _stream(self, text: str, voice: Optional[str]) -> AsyncIterator[bytes]:
+        # Stream the audio as it is generated instead of holding it all in memory.
+        async with self._get_openai_client().audio.speech.with_streaming_response.create(
+            model=self.model,
+            voice=voice,
+            input=text,
+        ) as response:
+            async for block in response.iter_bytes():
+                yield block
+
+    async def aclose(self):
+        self._openai = None
+        await super().aclose()
+
+
+# One engine (and so one connection pool) shared by every call in this process.
+_engine: Optional[OpenAITTSEngine] = None
+
 
 def text_to_speech(text_to_speak: str, output_filepath: Path, voice: str = "onyx") -> bool:
     """
@@ -16,52 +66,12 @@ def text_to_speech(text_to_speak: str, output_filepath: Path, voice: str = "onyx
     Returns:
         True if the audio file was created successfully, False otherwise.
     """
-    try:
-        # Explicitly find and load the .env file from the project root.
-        project_root = Path(__file__).resolve().parents[2]
-        dotenv_path = project_root / '.env'
-        
-        if not dotenv_path.is_file():
-            print(f"Error: .env file not found at {dotenv_path}")
-            return False
-
-        load_dotenv(dotenv_path=dotenv_path)
-
-        # Retrieve the API key from environment variables.
-        api_key = os.getenv("OPENAI_API_KEY")
-
-        if not api_key:
-            print("Error: OPENAI_API_KEY was not found in your .env file.")
-            return False
-        
+    global _engine
+    if _engine is None:
         # --- MODIFICATION FOR SSL ERROR ---
-        # Create a custom httpx client that disables SSL certificate verification.
-        http_client = httpx.Client(verify=False)
-        
-        # Initialize the OpenAI client. It will use the standard API endpoint but with our custom client.
-        client = OpenAI(api_key=api_key, http_client=http_client)
-        # --- END MODIFICATION ---
-
-        output_filepath.parent.mkdir(parents=True, exist_ok=True)
-
-        print(f"Generating speech with OpenAI voice '{voice}'... Saving to {output_filepath}")
-
-        # Make the API call to the TTS endpoint.
-        response = client.audio.speech.create(
-            model="tts-1-hd",  # Using the high-definition model for best quality
-            voice=voice,
-            input=text_to_speak
-        )
-
-        # Stream the audio content directly to the specified file.
-        response.stream_to_file(output_filepath)
-        
-        print("Speech generation successful.")
-        return True
-
-    except Exception as e:
-        print(f"An error occurred during text-to-speech conversion: {e}")
-        return False
+        # The shared HTTP client disables SSL certificate verification.
+        _engine = OpenAITTSEngine(verify_ssl=False, cache=get_default_cache())
+    return run_sync(_engine.synthesize_to_file(text_to_speak, output_filepath, voice))
 
 
 if __name__ == '__main__':
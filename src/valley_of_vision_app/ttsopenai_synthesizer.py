@@ -1,78 +1,73 @@
-import os
-import requests
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import AsyncIterator, Optional
 
-def text_to_speech(text_to_speak: str, output_filepath: Path, voice_id: str = "00001") -> bool:
-    """
-    Converts text to speech by sending a direct request to the ttsopenai.com API.
+from audio_cache import get_default_cache
+from tts_engine import TTSEngine, TTSError, get_api_key, run_sync
 
-    Args:
-        text_to_speak: The text content to be converted to speech.
-        output_filepath: The path where the generated audio file will be saved.
-        voice_id: The specific voice ID to use from the ttsopenai.com service.
 
-    Returns:
-        True if the audio file was created successfully, False otherwise.
+class TTSOpenAIEngine(TTSEngine):
     """
-    try:
-        # --- Load Environment Variables ---
-        project_root = Path(__file__).resolve().parents[2]
-        dotenv_path = project_root / '.env'
-        
-        if not dotenv_path.is_file():
-            print(f"Error: .env file not found at {dotenv_path}")
-            return False
-
-        load_dotenv(dotenv_path=dotenv_path)
-
-        api_key = os.getenv("OPENAI_API_KEY")
+    Converts text to speech by sending requests directly to the ttsopenai.com API.
+    Voices are the service's voice IDs, such as "00001".
+    """
+    name = 'ttsopenai'
+    default_voice = '00001'
+    model = "tts-1"
 
-        if not api_key:
-            print("Error: OPENAI_API_KEY was not found in your .env file.")
-            return False
+    # This URL is taken directly from the API documentation you found.
+    url = "https://api.ttsopenai.com/uapi/v1/text-to-speech"
 
-        # --- Construct the API Request ---
-        # This URL is taken directly from the API documentation you found.
-        url = "https://api.ttsopenai.com/uapi/v1/text-to-speech"
+    def __init__(self, voice: Optional[str] = None, url: Optional[str] = None, **options):
+        super().__init__(voice, **options)
+        if url:
+            self.url = url
 
+    async def _stream(self, text: str, voice: Optional[str]) -> AsyncIterator[bytes]:
         # The headers must match what the service expects.
         headers = {
             "Content-Type": "application/json",
-            "x-api-key": api_key
+            "x-api-key": get_api_key("OPENAI_API_KEY"),
         }
 
         # The data payload must also match the service's requirements.
         data = {
-            "model": "tts-1",
-            "voice_id": voice_id,
+            "model": self.model,
+            "voice_id": voice,
             "speed": 1,
-            "input": text_to_speak
+            "input": text,
         }
 
-        output_filepath.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Generating speech via {url}... Saving to {output_filepath}")
+        async with self.client.stream('POST', self.url, headers=headers, json=data) as response:
+            # Check if the request was successful. A status code of 200 means OK.
+            if response.status_code != 200:
+                await response.aread()
+                raise TTSError(f"Status code: {response.status_code}. Response: {response.text}")
+            # Pass the audio on as it arrives instead of holding it all in memory.
+            async for block in response.aiter_bytes():
+                yield block
+
+
+# One engine (and so one connection pool) shared by every call in this process.
+_engine: Optional[TTSOpenAIEngine] = None
 
-        # --- Make the POST request ---
+
+def text_to_speech(text_to_speak: str, output_filepath: Path, voice_id: str = "00001") -> bool:
+    """
+    Converts text to speech by sending a direct request to the ttsopenai.com API.
+
+    Args:
+        text_to_speak: The text content to be converted to speech.
+        output_filepath: The path where the generated audio file will be saved.
+        voice_id: The specific voice ID to use from the ttsopenai.com service.
+
+    Returns:
+        True if the audio file was created successfully, False otherwise.
+    """
+    global _engine
+    if _engine is None:
         # We set a timeout and disable SSL verification as a precaution.
-        response = requests.post(url, headers=headers, json=data, timeout=60, verify=False)
-
-        # Check if the request was successful. A status code of 200 means OK.
-        if response.status_code == 200:
-            # The audio data is in the response's content. We write it to a file.
-            with open(output_filepath, 'wb') as f:
-                f.write(response.content)
-            print("Speech generation successful.")
-            return True
-        else:
-            # If the status is not 200, print the error details from the server.
-            print(f"An error occurred. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-
-    except Exception as e:
-        print(f"An error occurred during text-to-speech conversion: {e}")
-        return False
+        _engine = TTSOpenAIEngine(timeout=60, verify_ssl=False, cache=get_default_cache())
+    return run_sync(_engine.synthesize_to_file(text_to_speak, output_filepath, voice_id))
 
 
 if __name__ == '__main__':
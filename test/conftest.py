@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The app's modules import each other as top-level modules (main.py is run
+# as a script), so make them importable the same way in the tests.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src' / 'valley_of_vision_app'))
@@ -0,0 +1,174 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from archive import Archive, FeedSettings, render_feed, update_feed
+
+
+def record(day: str, title: str, sha256: str = 'ab' * 32):
+    return {'date': day, 'title': title, 'prayer_id': '0' * 16, 'file': f"prayer_{day}.mp3",
+            'sha256': sha256, 'duration': 301.5, 'bytes': 1000}
+
+
+def test_lookups_by_date_and_title(tmp_path):
+    archive = Archive(tmp_path / 'archive.jsonl')
+    archive.append(record('2024-05-03', 'THE TRINITY'))
+    archive.append(record('2024-05-01', 'THE VALLEY OF VISION'))
+    archive.append(record('2024-05-02', 'THE  TRINITY'))
+
+    assert archive.get(date(2024, 5, 1))['title'] == 'THE VALLEY OF VISION'
+    assert archive.get(date(2024, 5, 4)) is None
+    assert [r['date'] for r in archive.between(date(2024, 5, 2), date(2024, 5, 9))] == ['2024-05-02', '2024-05-03']
+    assert [r['date'] for r in archive.latest(2, until=date(2024, 5, 2))] == ['2024-05-02', '2024-05-01']
+    assert [r['date'] for r in archive.find_title('the trinity')] == ['2024-05-02', '2024-05-03']
+    assert [r['date'] for r in archive.find_title('The Valley')] == ['2024-05-01']
+
+
+def test_log_is_append_only_and_reloads(tmp_path):
+    path = tmp_path / 'archive.jsonl'
+    archive = Archive(path)
+    assert archive.append(record('2024-05-01', 'THE TRINITY'))
+    assert not archive.append(record('2024-05-01', 'THE TRINITY'))
+    # Generating a day again supersedes its record for lookups.
+    assert archive.append(record('2024-05-01', 'GRACE', sha256='cd' * 32))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"date": "2024-05-0')
+
+    reloaded = Archive(path)
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 3
+    assert len(reloaded) == 1
+    assert reloaded.get(date(2024, 5, 1))['title'] == 'GRACE'
+    assert reloaded.find_title('THE TRINITY') == []
+
+
+def test_date_index_is_persisted_and_caught_up(tmp_path, caplog):
+    path = tmp_path / 'archive.jsonl'
+    archive = Archive(path)
+    first = date(2020, 1, 1)
+    for offset in range(400):
+        archive.append(record((first + timedelta(days=offset)).isoformat(), f"PRAYER {offset}"))
+    # A day pre-rendered out of order lands in date order.
+    archive.append(record('2019-12-31', 'EARLIER'))
+
+    # Opening the archive again does not read the log: garbage in an old line
+    # (of the same length) goes unnoticed until that day is asked for.
+    lines = path.read_bytes().split(b'\n')
+    lines[5] = b'x' * len(lines[5])
+    path.write_bytes(b'\n'.join(lines))
+    reopened = Archive(path)
+    assert 'Skipping' not in caplog.text
+    assert len(reopened) == 401
+    assert [r['title'] for r in reopened.latest(2, until=date(2021, 1, 1))] == ['PRAYER 366', 'PRAYER 365']
+    assert reopened.between(date(2019, 12, 31), date(2020, 1, 1))[0]['title'] == 'EARLIER'
+
+    # A line written to the log but not to the index (a crash in between) is indexed on the next open.
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record('2021-06-01', 'AFTER A CRASH')) + '\n')
+    assert Archive(path).get(date(2021, 6, 1))['title'] == 'AFTER A CRASH'
+
+    # Without its index, the archive rebuilds it from the log.
+    (tmp_path / 'archive.idx').unlink()
+    rebuilt = Archive(path)
+    assert 'Skipping unreadable line' in caplog.text
+    assert len(rebuilt) == 401
+    assert rebuilt.get(date(2020, 1, 6)) is None
+    assert rebuilt.find_title('after a')[0]['date'] == '2021-06-01'
+
+
+def test_title_lookup_reads_only_a_few_lines(tmp_path, monkeypatch):
+    import archive as archive_module
+
+    archive = Archive(tmp_path / 'archive.jsonl')
+    first = date(2020, 1, 1)
+    for offset in range(500):
+        archive.append(record((first + timedelta(days=offset)).isoformat(), f"PRAYER {offset:03d}"))
+    archive.append(record('2020-01-03', 'A REGENERATED DAY'))
+
+    reopened = Archive(tmp_path / 'archive.jsonl')
+    loads = []
+    real_loads = json.loads
+    monkeypatch.setattr(archive_module.json, 'loads', lambda data: loads.append(1) or real_loads(data))
+
+    found = reopened.find_title('prayer 25')
+    assert [r['title'] for r in found] == [f"PRAYER {n}" for n in range(250, 260)]
+    assert len(loads) < 40
+    assert [r['date'] for r in reopened.find_title('a regenerated')] == ['2020-01-03']
+    assert reopened.find_title('PRAYER 002') == []
+
+
+def test_interrupted_index_change_is_rebuilt(tmp_path, monkeypatch):
+    import archive as archive_module
+
+    path = tmp_path / 'archive.jsonl'
+    archive = Archive(path)
+    for day in ('2024-05-01', '2024-05-03', '2024-05-04'):
+        archive.append(record(day, f"PRAYER {day}"))
+
+    def crash(index, base, position, entry):
+        # Half of the shifted entries are written, then the process dies.
+        index.seek(base + position * 16)
+        index.write(entry)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(archive_module, '_insert', crash)
+    with pytest.raises(KeyboardInterrupt):
+        archive.append(record('2024-05-02', 'PRAYER 2024-05-02'))
+    monkeypatch.undo()
+
+    reopened = Archive(path)
+    assert [r['date'] for r in reopened.between(date(2024, 5, 1), date(2024, 5, 4))] == [
+        '2024-05-01', '2024-05-02', '2024-05-03', '2024-05-04']
+    assert reopened.find_title('prayer 2024-05-03')[0]['date'] == '2024-05-03'
+
+
+def test_feed_leaves_out_future_days(tmp_path):
+    archive = Archive(tmp_path / 'archive.jsonl')
+    for day in ('2024-05-01', '2024-05-02', '2024-05-03'):
+        archive.append(record(day, f"PRAYER & {day}"))
+    settings = FeedSettings(base_url='http://example.org/', max_items=10)
+
+    feed = render_feed(archive, settings, date(2024, 5, 2), 'http://example.org/')
+    assert feed.count('<item>') == 2
+    assert 'PRAYER &amp; 2024-05-02' in feed
+    assert 'url="http://example.org/prayer_2024-05-02.mp3" length="1000"' in feed
+    assert '<itunes:duration>0:05:02</itunes:duration>' in feed
+    assert '2024-05-03' not in feed
+
+    feed_path = tmp_path / 'feed.xml'
+    assert update_feed(feed_path, archive, settings, date(2024, 5, 2), 'http://example.org/')
+    assert not update_feed(feed_path, archive, settings, date(2024, 5, 2), 'http://example.org/')
+
+
+def test_postprocessing_refreshes_published_records(tmp_path, monkeypatch):
+    audio_postprocess = pytest.importorskip('audio_postprocess')
+    import daily_manifest
+    import main
+    from tenants import load_tenants
+
+    (tmp_path / 'config.ini').write_text("[Paths]\nCycleStateFile = cycle.json\nOutputDir = output\n"
+                                         "DailyManifestFile = output/manifest.json\nLogFile = app.log\n")
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+    config = main._load_config()
+    tenants = load_tenants(config, tmp_path)
+    day = date.today()
+    audio_path = tmp_path / 'output' / f'prayer_{day}.mp3'
+    audio_path.parent.mkdir()
+    audio_path.write_bytes(b'\xff\xfb\x90\x00' + b'\x00' * 413)
+    manifest = daily_manifest.load_manifest(tenants[0].manifest_file)
+    daily_manifest.record_day(manifest, day, 'THE TRINITY', audio_path)
+    daily_manifest.save_manifest(tenants[0].manifest_file, manifest)
+    main._publish(config, tenants, [(tenants[0], day, {'title': 'THE TRINITY', 'body': 'Amen.'}, audio_path)], day)
+
+    def process_files(paths, settings):
+        for path in paths:
+            path.write_bytes(path.read_bytes() * 2)
+        return {path: -16.0 for path in paths}
+
+    monkeypatch.setattr(audio_postprocess, 'process_files', process_files)
+    main.postprocess_output()
+
+    archive = Archive(tmp_path / 'output' / 'archive.jsonl')
+    assert archive.get(day)['bytes'] == 834
+    assert archive.get(day)['title'] == 'THE TRINITY'
+    assert 'length="834"' in (tmp_path / 'output' / 'feed.xml').read_text()
@@ -0,0 +1,26 @@
+import os
+
+from audio_cache import AudioCache
+
+
+def test_key_depends_on_every_input():
+    key = AudioCache.make_key("Amen.", 'openai', 'onyx', 'tts-1-hd')
+    assert key == AudioCache.make_key("Amen.", 'openai', 'onyx', 'tts-1-hd')
+    assert key != AudioCache.make_key("Amen.", 'openai', 'alloy', 'tts-1-hd')
+    assert key != AudioCache.make_key("Amen.", 'gtts', 'onyx', 'tts-1-hd')
+    assert key != AudioCache.make_key("Amen!", 'openai', 'onyx', 'tts-1-hd')
+
+
+def test_least_recently_used_segments_are_evicted(tmp_path):
+    cache = AudioCache(tmp_path, max_bytes=250)
+    cache.put('a', bytes(100))
+    cache.put('b', bytes(100))
+    os.utime(tmp_path / "a.mp3", ns=(10**9, 10**9))
+    os.utime(tmp_path / "b.mp3", ns=(2 * 10**9, 2 * 10**9))
+
+    # Reading 'a' makes it the most recently used, so 'b' is evicted instead.
+    assert cache.get('a') == bytes(100)
+    cache.put('c', bytes(100))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from audio_postprocess import (PostProcessSettings, integrated_loudness, normalize_loudness,
+                               shape_silence, silent_frames)
+
+RATE = 24000
+
+
+def tone(seconds: float, amplitude: float = 0.1, frequency: float = 440.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds: float):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def test_silent_frames():
+    frames = silent_frames(np.concatenate([silence(0.05), tone(0.05)]), RATE, -50)
+    assert frames.tolist() == [True] * 5 + [False] * 5
+
+
+def test_edges_are_trimmed_and_pauses_made_exact():
+    settings = PostProcessSettings(lead_ms=100, tail_ms=200, pause_ms=500, min_pause_ms=300)
+    audio = np.concatenate([silence(1.0), tone(1.0), silence(2.0), tone(1.0), silence(0.4), tone(1.0),
+                            silence(0.1), tone(1.0), silence(3.0)])
+    shaped = shape_silence(audio, RATE, settings)
+
+    # 0.1 s lead, four 1 s tones, the 2 s and 0.4 s pauses made 0.5 s,
+    # the 0.1 s pause left alone, 0.2 s tail.
+    assert len(shaped) == round((0.1 + 4.0 + 0.5 + 0.5 + 0.1 + 0.2) * RATE)
+    assert not shaped[:int(0.1 * RATE)].any()
+    assert shaped[int(0.1 * RATE)] == 0 and shaped[int(0.1 * RATE) + 1] != 0
+
+
+def test_all_silence_becomes_empty():
+    assert len(shape_silence(silence(1.0), RATE, PostProcessSettings())) == 0
+
+
+def test_loudness_of_full_scale_sine():
+    # BS.1770 reads a 0 dBFS 1 kHz sine as about -3 LUFS.
+    assert integrated_loudness(tone(3.0, amplitude=1.0, frequency=1000.0), RATE) == pytest.approx(-3.0, abs=0.3)
+    assert integrated_loudness(silence(3.0), RATE) == float('-inf')
+
+
+def test_normalize_reaches_target_without_clipping():
+    quiet = tone(3.0, amplitude=0.01, frequency=1000.0)
+    normalized, before = normalize_loudness(quiet, RATE, target_lufs=-16.0, peak_db=-1.0)
+    assert before < -30
+    assert integrated_loudness(normalized, RATE) == pytest.approx(-16.0, abs=0.1)
+
+    # A target this loud would clip, so the peak limit wins.
+    limited, _ = normalize_loudness(quiet, RATE, target_lufs=0.0, peak_db=-1.0)
+    assert np.max(np.abs(limited)) == pytest.approx(10 ** (-1 / 20), rel=1e-3)
@@ -0,0 +1,181 @@
+import asyncio
+import http.client
+import json
+import threading
+from datetime import datetime
+
+import pytest
+
+import daily_manifest
+from audio_server import AudioServer, parse_range
+from tenants import Tenant
+
+
+@pytest.fixture
+def server(tmp_path):
+    tenant = Tenant('default', tmp_path / 'cycle.json', tmp_path / 'output', tmp_path / 'output' / 'manifest.json')
+    today = datetime.now().date()
+    audio = bytes(range(256)) * 40
+    audio_path = tenant.output_dir / f"prayer_{today}.mp3"
+    audio_path.parent.mkdir()
+    audio_path.write_bytes(audio)
+    manifest = daily_manifest.load_manifest(tenant.manifest_file)
+    daily_manifest.record_day(manifest, today, 'THE VALLEY OF VISION', audio_path)
+    daily_manifest.save_manifest(tenant.manifest_file, manifest)
+    prayers = {'THE VALLEY OF VISION': {'title': 'THE VALLEY OF VISION', 'body': 'Lord, high and holy...'}}
+
+    loop = asyncio.new_event_loop()
+    audio_server = AudioServer([tenant], prayers, port=0)
+    loop.run_until_complete(audio_server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield audio_server, audio_path.name, audio
+
+    asyncio.run_coroutine_threadsafe(audio_server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range('bytes=0-9', 100) == (0, 9)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=-10', 100) == (90, 99)
+    assert parse_range('bytes=50-500', 100) == (50, 99)
+    assert parse_range('bytes=0-1,5-6', 100) is None
+    with pytest.raises(ValueError):
+        parse_range('bytes=100-', 100)
+
+
+def test_serves_audio_with_ranges_and_etags(server):
+    audio_server, name, audio = server
+    connection = http.client.HTTPConnection('127.0.0.1', audio_server.port, timeout=5)
+
+    # Every request below reuses the same kept-alive connection.
+    connection.request('GET', f'/{name}')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.read() == audio
+    assert response.getheader('Accept-Ranges') == 'bytes'
+    etag = response.getheader('ETag')
+
+    connection.request('GET', f'/{name}', headers={'Range': 'bytes=100-199'})
+    response = connection.getresponse()
+    assert response.status == 206
+    assert response.getheader('Content-Range') == f'bytes 100-199/{len(audio)}'
+    assert response.read() == audio[100:200]
+
+    connection.request('GET', f'/{name}', headers={'If-None-Match': etag})
+    response = connection.getresponse()
+    assert response.status == 304
+    assert response.read() == b''
+
+    connection.request('GET', f'/{name}', headers={'Range': f'bytes={len(audio)}-'})
+    response = connection.getresponse()
+    assert response.status == 416
+    response.read()
+
+    connection.request('HEAD', f'/{name}')
+    response = connection.getresponse()
+    assert response.getheader('Content-Length') == str(len(audio))
+    assert response.read() == b''
+
+    for path in ('/prayer_1999-01-01.mp3', '/../config.ini', '/manifest.json'):
+        connection.request('GET', path)
+        response = connection.getresponse()
+        assert response.status == 404
+        response.read()
+    connection.close()
+
+
+def test_today_json(server):
+    audio_server, name, _ = server
+    connection = http.client.HTTPConnection('127.0.0.1', audio_server.port, timeout=5)
+    connection.request('GET', '/today.json')
+    response = connection.getresponse()
+    assert response.status == 200
+    today = json.loads(response.read())
+    assert today['title'] == 'THE VALLEY OF VISION'
+    assert today['body'] == 'Lord, high and holy...'
+    assert today['audio'] == f'/{name}'
+    connection.close()
+
+
+def test_many_concurrent_listeners(server):
+    audio_server, name, audio = server
+
+    async def fetch_all():
+        async def fetch():
+            reader, writer = await asyncio.open_connection('127.0.0.1', audio_server.port)
+            writer.write(f'GET /{name} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'.encode())
+            data = await reader.read()
+            writer.close()
+            return data
+
+        return await asyncio.gather(*(fetch() for _ in range(200)))
+
+    responses = asyncio.run(fetch_all())
+    assert all(r.startswith(b'HTTP/1.1 200') and r.endswith(audio) for r in responses)
+
+
+def test_slow_headers_close_the_connection(server, monkeypatch):
+    audio_server, name, audio = server
+    monkeypatch.setattr('audio_server.KEEP_ALIVE_SECONDS', 0.3)
+
+    async def trickle():
+        reader, writer = await asyncio.open_connection('127.0.0.1', audio_server.port)
+        writer.write(f'GET /{name} HTTP/1.1\r\n'.encode())
+        try:
+            for n in range(20):
+                await asyncio.sleep(0.05)
+                writer.write(f'X-Header-{n}: value\r\n'.encode())
+                await writer.drain()
+            writer.write(b'\r\n')
+            await writer.drain()
+            return await asyncio.wait_for(reader.read(), 5)
+        except ConnectionError:
+            return b''
+        finally:
+            writer.close()
+
+    assert not asyncio.run(trickle()).startswith(b'HTTP/1.1 200')
+
+
+def test_feed_xml(server, tmp_path):
+    audio_server, _, _ = server
+    connection = http.client.HTTPConnection('127.0.0.1', audio_server.port, timeout=5)
+    connection.request('GET', '/feed.xml')
+    response = connection.getresponse()
+    assert response.status == 404
+    response.read()
+
+    (tmp_path / 'output' / 'feed.xml').write_text('<rss/>', encoding='utf-8')
+    connection.request('GET', '/feed.xml')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader('Content-Type').startswith('application/rss+xml')
+    assert response.read() == b'<rss/>'
+
+
+def test_etag_is_of_the_open_file_even_if_replaced(tmp_path):
+    import hashlib
+    import os
+
+    path = tmp_path / 'prayer_2024-05-02.mp3'
+    path.write_bytes(b'old audio')
+    audio_server = AudioServer([Tenant('default', tmp_path, tmp_path, tmp_path / 'manifest.json')])
+
+    async def etags():
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            # A new version lands while the old one is being served.
+            (tmp_path / 'new.mp3').write_bytes(b'new audio, longer')
+            os.replace(tmp_path / 'new.mp3', path)
+            results = await asyncio.gather(*(audio_server._etag(path, file, stat) for _ in range(5)))
+        return results, audio_server._hashing
+
+    results, hashing = asyncio.run(etags())
+    assert set(results) == {f'"{hashlib.sha256(b"old audio").hexdigest()[:32]}"'}
+    assert hashing == {}
@@ -0,0 +1,94 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import daily_manifest
+from daily_manifest import load_manifest, next_unselected_day, save_manifest
+
+TODAY = date(2024, 5, 2)
+
+
+def test_missing_or_corrupt_manifest_is_empty(tmp_path):
+    assert load_manifest(tmp_path / 'missing.json') == {'last_selected': None, 'days': {}}
+    (tmp_path / 'corrupt.json').write_text('{"days": [')
+    assert load_manifest(tmp_path / 'corrupt.json') == {'last_selected': None, 'days': {}}
+
+
+def test_days_are_saved_in_date_order(tmp_path):
+    manifest = load_manifest(tmp_path / 'manifest.json')
+    for day in (date(2024, 5, 3), date(2024, 5, 1), date(2024, 5, 2)):
+        daily_manifest.record_day(manifest, day, 'T', tmp_path / f'prayer_{day}.mp3')
+    save_manifest(tmp_path / 'manifest.json', manifest)
+
+    saved = json.loads((tmp_path / 'manifest.json').read_text())
+    assert list(saved['days']) == ['2024-05-01', '2024-05-02', '2024-05-03']
+    assert load_manifest(tmp_path / 'manifest.json') == saved
+
+
+@pytest.mark.parametrize('last_selected, expected', [
+    (None, TODAY),
+    # Days the app did not run are not made up; the cycle resumes today.
+    ('2024-04-20', TODAY),
+    # Today's prayer is taken, so the next one belongs to tomorrow.
+    ('2024-05-02', TODAY + timedelta(days=1)),
+    ('2024-05-05', date(2024, 5, 6)),
+])
+def test_next_unselected_day(last_selected, expected):
+    assert next_unselected_day({'last_selected': last_selected, 'days': {}}, TODAY) == expected
+
+
+def test_day_is_done_only_once_selected_and_its_audio_exists(tmp_path):
+    manifest = load_manifest(tmp_path / 'manifest.json')
+    audio_path = tmp_path / f'prayer_{TODAY}.mp3'
+    daily_manifest.record_day(manifest, TODAY, 'THE TRINITY', audio_path)
+    audio_path.write_bytes(b'mp3')
+    # Rendered ahead of time, but not yet taken from the cycle.
+    assert not daily_manifest.is_day_done(manifest, TODAY, tmp_path)
+
+    daily_manifest.mark_selected(manifest, TODAY, 'THE TRINITY')
+    assert daily_manifest.is_day_done(manifest, TODAY, tmp_path)
+    assert daily_manifest.selected_title(manifest, TODAY) == 'THE TRINITY'
+    assert daily_manifest.selected_title(manifest, TODAY + timedelta(days=1)) is None
+
+    audio_path.unlink()
+    assert not daily_manifest.is_day_done(manifest, TODAY, tmp_path)
+
+
+def test_prerendered_days_are_reused(tmp_path, monkeypatch):
+    pytest.importorskip('httpx')
+    import main
+    from tts_engine import TTSEngine
+
+    class CountingEngine(TTSEngine):
+        name = 'counting'
+        texts = []
+
+        async def _synthesize(self, text, voice):
+            CountingEngine.texts.append(text)
+            return b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+    (tmp_path / 'config.ini').write_text("[Paths]\nCycleStateFile = cycle.json\nOutputDir = output\n"
+                                         "DailyManifestFile = output/manifest.json\nLogFile = app.log\n")
+    prayers = [{'title': f'PRAYER {n}', 'body': f'Body {n}.'} for n in range(5)]
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+    monkeypatch.setattr(main, '_load_prayers', lambda config: prayers)
+    monkeypatch.setattr(main, '_create_engine', lambda config: CountingEngine(max_chunk_chars=4000))
+
+    main.prerender_upcoming_prayers(3)
+    manifest = load_manifest(tmp_path / 'output/manifest.json')
+    assert len(manifest['days']) == 3 and manifest['last_selected'] is None
+    rendered = len(CountingEngine.texts)
+
+    # The morning run takes the first prayer from the cycle and finds its audio ready.
+    main.run_daily_prayer_generation()
+    assert len(CountingEngine.texts) == rendered
+    manifest = load_manifest(tmp_path / 'output/manifest.json')
+    today = date.fromisoformat(manifest['last_selected'])
+    assert manifest['days'][today.isoformat()]['title'] == manifest['selected_title']
+
+    # Pre-rendering again starts after today and only renders the one new day.
+    main.prerender_upcoming_prayers(3)
+    manifest = load_manifest(tmp_path / 'output/manifest.json')
+    assert sorted(manifest['days']) == [(today + timedelta(days=n)).isoformat() for n in range(4)]
+    assert len(CountingEngine.texts) == rendered + rendered // 3
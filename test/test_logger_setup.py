@@ -0,0 +1,66 @@
+import json
+import logging
+import logging.handlers
+
+import pytest
+
+import logger_setup
+
+
+@pytest.fixture(autouse=True)
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    logger_setup._stop_listener()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_records_are_queued_and_written_by_the_listener(tmp_path):
+    log_file = tmp_path / 'logs' / 'app.log'
+    logger = logger_setup.setup_logger(log_file)
+    assert all(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers)
+
+    logging.getLogger('test').info("Prayer for %s", 'today')
+    logger_setup._stop_listener()
+    assert log_file.read_text(encoding='utf-8').endswith("INFO - Prayer for today\n")
+
+
+def test_log_is_kept_and_rotated_instead_of_truncated(tmp_path):
+    log_file = tmp_path / 'app.log'
+    log_file.write_text("yesterday's run\n", encoding='utf-8')
+
+    logger_setup.setup_logger(log_file, max_bytes=200, backup_count=2)
+    for number in range(20):
+        logging.info(f"line {number}")
+    logger_setup._stop_listener()
+
+    rotated = sorted(path.name for path in tmp_path.iterdir())
+    assert rotated == ['app.log', 'app.log.1', 'app.log.2']
+    assert all(path.stat().st_size <= 200 for path in tmp_path.iterdir())
+    assert log_file.read_text(encoding='utf-8').rstrip().endswith("line 19")
+
+
+def test_json_lines_format(tmp_path):
+    log_file = tmp_path / 'app.log'
+    logger_setup.setup_logger(log_file, json_format=True)
+    try:
+        raise ValueError("no audio")
+    except ValueError:
+        logging.getLogger('tts').exception("Synthesis failed for “Morning”")
+    logger_setup._stop_listener()
+
+    entry = json.loads(log_file.read_text(encoding='utf-8'))
+    assert entry['level'] == 'ERROR'
+    assert entry['logger'] == 'tts'
+    assert entry['message'] == "Synthesis failed for “Morning”"
+    assert 'ValueError: no audio' in entry['exception']
+
+
+def test_setting_up_again_replaces_the_listener(tmp_path):
+    logger_setup.setup_logger(tmp_path / 'first.log')
+    first = logger_setup._listener
+    logger_setup.setup_logger(tmp_path / 'second.log')
+    assert logger_setup._listener is not first
+    assert len(logging.getLogger().handlers) == 1
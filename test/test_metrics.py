@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from metrics import Metrics
+
+
+def test_spans_counters_and_exports(tmp_path):
+    m = Metrics()
+    with m.span('load'):
+        pass
+    with pytest.raises(ValueError):
+        with m.span('synthesize'):
+            raise ValueError("no audio")
+    m.increment('audio_cache_hits', 3)
+    m.increment('tts_api_bytes', 1000, backend='openai')
+    m.increment('tts_api_bytes', 500, backend='openai')
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        m.observe('tts_request_seconds', seconds, backend='openai')
+
+    m.export_jsonl(tmp_path / 'metrics.jsonl', command='daily')
+    m.export_jsonl(tmp_path / 'metrics.jsonl', command='daily')
+    lines = (tmp_path / 'metrics.jsonl').read_text().splitlines()
+    assert len(lines) == 2
+    run = json.loads(lines[0])
+    assert run['command'] == 'daily'
+    assert [(s['name'], s['ok']) for s in run['spans']] == [('load', True), ('synthesize', False)]
+    assert run['counters'] == {'audio_cache_hits': 3, 'tts_api_bytes[backend=openai]': 1500}
+
+    m.write_prometheus(tmp_path / 'metrics.prom')
+    text = (tmp_path / 'metrics.prom').read_text()
+    assert 'valley_of_vision_stage_seconds{stage="load"}' in text
+    assert 'valley_of_vision_audio_cache_hits_total 3' in text
+    assert 'valley_of_vision_tts_api_bytes_total{backend="openai"} 1500' in text
+    assert 'valley_of_vision_tts_request_seconds{backend="openai",quantile="0.5"} 0.300000' in text
+    assert 'valley_of_vision_tts_request_seconds_count{backend="openai"} 4' in text
@@ -0,0 +1,41 @@
+import pytest
+
+from mp3_utils import audio_frames, concat_mp3, frame_length, mp3_duration
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding: 417-byte frames.
+FRAME_HEADER = b'\xff\xfb\x90\x00'
+FRAME_LENGTH = 417
+
+
+def frame(fill: bytes = b'\x00') -> bytes:
+    return FRAME_HEADER + fill * (FRAME_LENGTH - 4)
+
+
+def info_frame() -> bytes:
+    return FRAME_HEADER + b'\x00' * 32 + b'Info' + b'\x00' * (FRAME_LENGTH - 40)
+
+
+def id3v2_tag() -> bytes:
+    return b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'TIT2\x00'
+
+
+def test_frame_length():
+    assert frame_length(FRAME_HEADER) == FRAME_LENGTH
+    assert frame_length(b'ID3\x04') is None
+
+
+def test_audio_frames_strips_tags_and_info_frame():
+    segment = id3v2_tag() + info_frame() + frame(b'\x01') + frame(b'\x02') + b'TAG' + b'\x00' * 125
+    assert audio_frames(segment) == frame(b'\x01') + frame(b'\x02')
+
+
+def test_concat_mp3_keeps_every_frame_in_order():
+    first = id3v2_tag() + info_frame() + frame(b'\x01')
+    second = info_frame() + frame(b'\x02') + frame(b'\x03')
+    assert concat_mp3([first, second]) == frame(b'\x01') + frame(b'\x02') + frame(b'\x03')
+
+
+def test_mp3_duration_counts_every_frame():
+    # Each MPEG-1 Layer III frame holds 1152 samples.
+    data = id3v2_tag() + info_frame() + frame(b'\x01') * 100
+    assert mp3_duration(data) == pytest.approx(100 * 1152 / 44100)
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import parse_cache
+from parse_cache import is_cache_valid, load_prayer_store
+
+
+def cache_paths(tmp_path):
+    return (tmp_path / 'prayers.json', tmp_path / 'prayers.bin', tmp_path / 'manifest.json', tmp_path / 'pages')
+
+
+def write_pdf(path, pages):
+    fitz = pytest.importorskip('fitz')
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+# Pages are joined with a newline, so a title at the top of a page follows
+# a blank line, just as in the book.
+BOOK = ["Preface.\n", "THE FIRST PRAYER\nLord, hear us.\n", "THE SECOND PRAYER\nAmen.\n"]
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'book.pdf'
+    write_pdf(path, BOOK)
+    return path
+
+
+def test_warm_start_does_not_parse_or_hash_the_pdf(tmp_path, pdf_path, monkeypatch):
+    with load_prayer_store(pdf_path, *cache_paths(tmp_path)) as store:
+        assert store.titles() == ['THE FIRST PRAYER', 'THE SECOND PRAYER']
+
+    # Touching the PDF without changing it costs one hash, after which the
+    # manifest has the new mtime and the stat check is enough again.
+    os.utime(pdf_path, ns=(1, 1))
+    monkeypatch.setattr(parse_cache, 'rebuild_prayer_cache', lambda *args: pytest.fail('cache was rebuilt'))
+    with load_prayer_store(pdf_path, *cache_paths(tmp_path)) as store:
+        assert len(store) == 2
+
+    monkeypatch.setattr(parse_cache, 'sha256_file', lambda path: pytest.fail('PDF was hashed'))
+    with load_prayer_store(pdf_path, *cache_paths(tmp_path)) as store:
+        assert len(store) == 2
+
+
+def test_new_parser_version_invalidates_the_cache(tmp_path, pdf_path, monkeypatch):
+    load_prayer_store(pdf_path, *cache_paths(tmp_path)).close()
+    _, store_path, manifest_path, _ = cache_paths(tmp_path)
+    assert is_cache_valid(pdf_path, store_path, manifest_path)
+
+    monkeypatch.setattr(parse_cache, 'PARSER_VERSION', parse_cache.PARSER_VERSION + 1)
+    assert not is_cache_valid(pdf_path, store_path, manifest_path)
+    load_prayer_store(pdf_path, *cache_paths(tmp_path)).close()
+    assert is_cache_valid(pdf_path, store_path, manifest_path)
+
+
+def test_only_changed_pages_are_extracted_again(tmp_path, pdf_path, monkeypatch):
+    import pdf_parser
+
+    load_prayer_store(pdf_path, *cache_paths(tmp_path)).close()
+
+    extracted = []
+    iter_selected_pages = pdf_parser.iter_selected_pages
+
+    def recording(path, page_numbers):
+        extracted.extend(page_numbers)
+        return iter_selected_pages(path, page_numbers)
+
+    monkeypatch.setattr(pdf_parser, 'iter_selected_pages', recording)
+    write_pdf(pdf_path, BOOK[:2] + ["THE SECOND PRAYER\nAmen, and amen.\n"])
+
+    with load_prayer_store(pdf_path, *cache_paths(tmp_path)) as store:
+        assert store.get('THE SECOND PRAYER')['body'] == 'Amen, and amen.'
+        assert store.get('THE FIRST PRAYER')['body'] == 'Lord, hear us.'
+    assert extracted == [2]
+    # The old version of the changed page is pruned from the page cache.
+    assert len(list(cache_paths(tmp_path)[3].glob('*.txt'))) == 3
+
+
+def test_corrupt_pdf_gives_no_prayers(tmp_path, caplog):
+    pytest.importorskip('fitz')
+    pdf_path = tmp_path / 'book.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4 this is not really a PDF')
+
+    assert load_prayer_store(pdf_path, *cache_paths(tmp_path)) is None
+    assert 'Could not read the PDF' in caplog.text
+    assert not (tmp_path / 'prayers.bin').exists()
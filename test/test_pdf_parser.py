@@ -0,0 +1,65 @@
+from concurrent.futures import Future
+
+import pytest
+
+fitz = pytest.importorskip('fitz')
+
+import pdf_parser
+from pdf_parser import iter_pages, iter_pages_parallel
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'book.pdf'
+    doc = fitz.open()
+    for page_number in range(37):
+        doc.new_page().insert_text((72, 72), f"Page {page_number}")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_parallel_pages_come_back_in_order(pdf_path):
+    expected = [f"Page {n}\n" for n in range(37)]
+    assert list(iter_pages(pdf_path)) == expected
+    # 13 shards of 3 pages through two workers: more shards than the window holds.
+    assert list(iter_pages_parallel(pdf_path, workers=2, pages_per_shard=3)) == expected
+    # Too few pages for a pool: read in this process.
+    assert list(iter_pages_parallel(pdf_path, workers=4, pages_per_shard=64)) == expected
+
+
+def test_only_a_window_of_shards_is_in_flight(pdf_path, monkeypatch):
+    in_flight = []
+    peak = []
+
+    class InlinePool:
+        """Runs each shard when it is submitted, and tracks how many are unread."""
+
+        def __init__(self, max_workers):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def submit(self, fn, task):
+            future = Future()
+            future.set_result(fn(task))
+            in_flight.append(future)
+            peak.append(len(in_flight))
+            original_result = future.result
+
+            def result():
+                in_flight.remove(future)
+                return original_result()
+
+            future.result = result
+            return future
+
+    monkeypatch.setattr(pdf_parser, 'ProcessPoolExecutor', InlinePool)
+    pages = list(iter_pages_parallel(pdf_path, workers=2, pages_per_shard=3))
+
+    assert pages == [f"Page {n}\n" for n in range(37)]
+    assert max(peak) == 4
@@ -0,0 +1,113 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from prayer_selector import (
+    TITLE_PATTERN, iter_prayers, parse_prayers, preview_cycle, select_prayer_from_cycle,
+)
+
+
+def reference_parse_prayers(full_text):
+    """The original re.split implementation that iter_prayers() replaces."""
+    parts = TITLE_PATTERN.split(full_text)
+    prayers = []
+    for i in range(1, len(parts), 2):
+        title = parts[i].strip()
+        if i + 1 < len(parts):
+            body = parts[i+1].strip()
+            prayers.append({'title': title, 'body': body})
+    return prayers
+
+
+def as_dicts(records):
+    return [{'title': title, 'body': body} for title, body, _ in records]
+
+
+def test_parse_prayers_matches_reference():
+    text = (
+        "Preface text\n\nTHE TRINITY\nO Father, thou art...\nAmen.\n\n"
+        "GOD THE ALL\nO LORD GOD, who inhabitest eternity\n\nYOUR’S TRULY\nLast body"
+    )
+    assert parse_prayers(text) == reference_parse_prayers(text)
+    assert [p['title'] for p in parse_prayers(text)] == ['THE TRINITY', 'GOD THE ALL', 'YOUR’S TRULY']
+
+
+def test_title_split_across_page_break():
+    pages = ["Intro\n\nTHE GREAT", "GOD\nO thou great God", "\nstill the same prayer\n\nTHE MOVER\nO Supreme"]
+    records = list(iter_prayers(pages))
+    assert as_dicts(records) == reference_parse_prayers("\n".join(pages))
+    assert records[0][0] == 'THE GREAT\nGOD'
+    assert records[0][2] == (0, 2)
+    assert records[1][2] == (2, 2)
+
+
+def test_streaming_matches_reference_on_random_books():
+    rng = random.Random(1234)
+    pieces = ["A", "Z", "'", "’", " ", "\t", "\xa0", "\n", "\n\n", "x", ".", "THE LORD", "\n\nA TITLE\n"]
+    for _ in range(5000):
+        pages = [
+            "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            for _ in range(rng.randint(0, 6))
+        ]
+        assert as_dicts(iter_prayers(pages)) == reference_parse_prayers("\n".join(pages))
+
+
+def test_streaming_matches_reference_on_bundled_book():
+    pytest.importorskip('fitz')
+    from pdf_parser import iter_pages
+
+    pdf_path = Path(__file__).resolve().parents[1] / 'data' / 'raw' / 'The Valley of Vision.pdf'
+    full_text = "\n".join(iter_pages(pdf_path))
+    assert as_dicts(iter_prayers(iter_pages(pdf_path))) == reference_parse_prayers(full_text)
+
+
+def test_cycle_uses_every_prayer_once_and_matches_preview(tmp_path):
+    prayers = [{'title': f"PRAYER {i}", 'body': f"Body {i}"} for i in range(23)]
+    state_path = tmp_path / 'prayer_cycle.json'
+
+    preview = [p['title'] for p in preview_cycle(prayers, 50, state_path)]
+    selected = [select_prayer_from_cycle(prayers, state_path)['title'] for _ in range(50)]
+
+    assert selected == preview
+    assert sorted(selected[:23]) == sorted(p['title'] for p in prayers)
+    assert sorted(selected[23:46]) == sorted(p['title'] for p in prayers)
+
+
+def test_cycle_restarts_when_prayers_change(tmp_path):
+    state_path = tmp_path / 'prayer_cycle.json'
+    select_prayer_from_cycle([{'title': 'OLD', 'body': ''}] * 3, state_path)
+
+    prayers = [{'title': 'NEW', 'body': 'Only one'}]
+    assert select_prayer_from_cycle(prayers, state_path)['title'] == 'NEW'
+
+
+def test_list_edited_in_place_starts_a_new_cycle(tmp_path, monkeypatch):
+    import prayer_selector
+
+    prayers = [{'title': f"PRAYER {i}", 'body': ''} for i in range(10)]
+    select_prayer_from_cycle(prayers, tmp_path / 'cycle.json')
+    seed = json.loads((tmp_path / 'cycle.json').read_text())['seed']
+
+    # Same list, same length, different titles: not the same collection.
+    prayers[3] = {'title': 'SOMETHING ELSE', 'body': ''}
+    select_prayer_from_cycle(prayers, tmp_path / 'cycle.json')
+    assert json.loads((tmp_path / 'cycle.json').read_text())['seed'] != seed
+
+    # A digest passed in by the caller is used instead of reading every title.
+    digest = prayer_selector.titles_digest(p['title'] for p in prayers)
+    monkeypatch.setattr(prayer_selector, 'titles_digest', lambda titles: pytest.fail("titles were digested"))
+    assert select_prayer_from_cycle(prayers, tmp_path / 'cycle.json', digest=digest) is not None
+
+
+@pytest.mark.parametrize('argv', [['--preview', '0'], ['--preview', '-3'], ['--prerender', '0'], ['--prerender', '-1']])
+def test_day_counts_below_one_are_rejected(argv, monkeypatch):
+    import sys
+    import main
+
+    monkeypatch.setattr(sys, 'argv', ['main.py', *argv])
+    monkeypatch.setattr(main, 'run_daily_prayer_generation', lambda: pytest.fail("the daily run must not start"))
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
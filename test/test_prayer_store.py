@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from prayer_store import MAGIC, PrayerStore, write_prayer_store
+
+PRAYERS = [
+    {'title': 'THE VALLEY OF VISION', 'body': 'Lord, high and holy, meek and lowly…', 'page_span': (0, 1)},
+    {'title': 'GRÂCE — “FREE”', 'body': 'Ô Dieu, ta grâce 🙏 suffit.', 'page_span': (2, 2)},
+    {'title': 'SILENCE', 'body': ''},
+    {'title': 'THE VALLEY OF VISION', 'body': 'A second prayer with the same title.'},
+]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = tmp_path / 'prayers.bin'
+    write_prayer_store(path, PRAYERS)
+    return path
+
+
+def test_round_trip(store_path):
+    with PrayerStore(store_path) as store:
+        assert len(store) == 4
+        assert store.titles() == [p['title'] for p in PRAYERS]
+        assert [record.to_dict() for record in store] == [{'title': p['title'], 'body': p['body']} for p in PRAYERS]
+        assert store.record_at(0).page_span == (0, 1)
+        assert store.record_at(2).page_span == (-1, -1)
+
+        # Lookups by title return the first prayer with that title.
+        assert store.get('THE VALLEY OF VISION')['body'] == PRAYERS[0]['body']
+        assert store.get('GRÂCE — “FREE”')['body'] == 'Ô Dieu, ta grâce 🙏 suffit.'
+        assert store.get('SILENCE')['body'] == ''
+        assert store.get('MISSING') is None and 'MISSING' not in store
+
+
+def test_bad_magic_or_version_is_rejected(store_path):
+    data = bytearray(store_path.read_bytes())
+    store_path.write_bytes(b'XXXX' + bytes(data[4:]))
+    with pytest.raises(ValueError):
+        PrayerStore(store_path)
+
+    struct.pack_into('<4sH', data, 0, MAGIC, 999)
+    store_path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        PrayerStore(store_path)
+
+
+@pytest.mark.parametrize('keep', [0, 10, -1, -20])
+def test_truncated_file_is_rejected(store_path, keep):
+    data = store_path.read_bytes()
+    store_path.write_bytes(data[:keep] if keep >= 0 else data[:keep])
+    with pytest.raises(ValueError):
+        PrayerStore(store_path)
+
+
+@pytest.mark.parametrize('command, args', [
+    ('run_daily_prayer_generation', ()),
+    ('preview_upcoming_prayers', (3,)),
+    ('prerender_upcoming_prayers', (3,)),
+])
+def test_commands_close_the_store_they_opened(tmp_path, monkeypatch, command, args):
+    import main
+
+    write_prayer_store(tmp_path / 'prayers.bin', PRAYERS)
+    opened = []
+
+    def load_prayers(config):
+        opened.append(PrayerStore(tmp_path / 'prayers.bin'))
+        return opened[-1]
+
+    (tmp_path / 'config.ini').write_text("[Paths]\nCycleStateFile = cycle.json\nOutputDir = output\n"
+                                         "DailyManifestFile = output/manifest.json\nLogFile = app.log\n")
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+    monkeypatch.setattr(main, '_load_prayers', load_prayers)
+    monkeypatch.setattr(main, '_render_jobs', lambda *args: None)
+
+    getattr(main, command)(*args)
+
+    [store] = opened
+    assert store._file.closed
@@ -0,0 +1,144 @@
+import shutil
+import subprocess
+
+import pytest
+
+from renditions import (MANIFEST_NAME, MASTER_PLAYLIST_NAME, RenditionSettings, bits_per_second, encode_renditions,
+                        load_day_manifest, master_playlist, plan_day)
+from file_utils import atomic_write_json, sha256_file
+
+
+def encoded_day(tmp_path, settings):
+    """A source file whose renditions have all been made already."""
+    source = tmp_path / 'prayer_2024-05-02.mp3'
+    source.write_bytes(b'audio')
+    day_dir = tmp_path / 'renditions' / source.stem
+    renditions = {}
+    for bitrate in settings.bitrates:
+        (day_dir / bitrate).mkdir(parents=True)
+        (day_dir / f"{bitrate}.mp3").write_bytes(b'x')
+        (day_dir / bitrate / 'index.m3u8').write_text('#EXTM3U\n')
+        renditions[bitrate] = {'bitrate': bitrate, 'file': f"{bitrate}.mp3", 'playlist': f"{bitrate}/index.m3u8"}
+    atomic_write_json(day_dir / MANIFEST_NAME, {'source': source.name, 'source_sha256': sha256_file(source),
+                                                'segment_seconds': settings.segment_seconds,
+                                                'renditions': renditions})
+    return source, day_dir
+
+
+def test_bits_per_second():
+    assert bits_per_second('64k') == 64000
+    assert bits_per_second('96000') == 96000
+
+
+def test_master_playlist_lists_lowest_bitrate_first():
+    playlist = master_playlist([{'bitrate': '128k', 'playlist': '128k/index.m3u8'},
+                                {'bitrate': '32k', 'playlist': '32k/index.m3u8'}])
+    assert playlist.splitlines() == [
+        '#EXTM3U', '#EXT-X-VERSION:3',
+        '#EXT-X-STREAM-INF:BANDWIDTH=32000,CODECS="mp4a.40.34"', '32k/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=128000,CODECS="mp4a.40.34"', '128k/index.m3u8',
+    ]
+
+
+def test_unchanged_source_needs_nothing(tmp_path):
+    settings = RenditionSettings(bitrates=('32k', '64k'))
+    source, day_dir = encoded_day(tmp_path, settings)
+    assert plan_day(source, day_dir, settings)[2] == []
+
+    # No worker pool (or ffmpeg) is needed when everything is up to date.
+    results = encode_renditions([source], tmp_path / 'renditions', settings)
+    assert set(results[source]['renditions']) == {'32k', '64k'}
+
+
+def test_changed_source_or_settings_need_encoding(tmp_path):
+    settings = RenditionSettings(bitrates=('32k', '64k'))
+    source, day_dir = encoded_day(tmp_path, settings)
+
+    assert plan_day(source, day_dir, RenditionSettings(bitrates=('32k', '64k', '96k')))[2] == ['96k']
+    assert plan_day(source, day_dir, RenditionSettings(bitrates=('32k',), segment_seconds=10))[2] == ['32k']
+
+    source.write_bytes(b'new audio')
+    _, manifest, missing = plan_day(source, day_dir, settings)
+    assert missing == ['32k', '64k'] and manifest['renditions'] == {}
+    assert load_day_manifest(day_dir)['source_sha256'] != manifest['source_sha256']
+
+
+def test_dropped_bitrates_are_deleted(tmp_path):
+    source, day_dir = encoded_day(tmp_path, RenditionSettings(bitrates=('32k', '64k')))
+
+    results = encode_renditions([source], tmp_path / 'renditions', RenditionSettings(bitrates=('32k',)))
+
+    assert set(results[source]['renditions']) == {'32k'}
+    assert not (day_dir / '64k.mp3').exists() and not (day_dir / '64k').exists()
+    assert (day_dir / '32k.mp3').exists()
+    assert '64k' not in (day_dir / MASTER_PLAYLIST_NAME).read_text()
+    assert set(load_day_manifest(day_dir)['renditions']) == {'32k'}
+
+
+def test_encode_with_ffmpeg(tmp_path):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        pytest.skip('ffmpeg is not installed')
+    source = tmp_path / 'prayer_2024-05-02.mp3'
+    subprocess.run([ffmpeg, '-v', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=5',
+                    '-codec:a', 'libmp3lame', str(source)], check=True)
+    settings = RenditionSettings(bitrates=('32k', '64k'), segment_seconds=2, workers=2, ffmpeg=ffmpeg)
+
+    # Two encodes through the process pool.
+    manifest = encode_renditions([source], tmp_path / 'renditions', settings)[source]
+
+    day_dir = tmp_path / 'renditions' / source.stem
+    assert list(manifest['renditions']) == ['32k', '64k']
+    for bitrate, rendition in manifest['renditions'].items():
+        assert (day_dir / rendition['file']).stat().st_size == rendition['bytes']
+        assert rendition['segments'] >= 2
+        playlist = (day_dir / rendition['playlist']).read_text()
+        segments = sorted(path.name for path in (day_dir / bitrate).glob('segment_*.ts'))
+        assert '#EXT-X-ENDLIST' in playlist
+        assert [line for line in playlist.splitlines() if line.endswith('.ts')] == segments
+    assert (day_dir / MASTER_PLAYLIST_NAME).read_text().count('#EXT-X-STREAM-INF') == 2
+    assert plan_day(source, day_dir, settings)[2] == []
+
+    # Encoding again replaces the playlist and leaves only the new segments behind.
+    source.write_bytes(source.read_bytes() + source.read_bytes())
+    manifest = encode_renditions([source], tmp_path / 'renditions', settings)[source]
+    playlist = (day_dir / '32k' / 'index.m3u8').read_text()
+    segments = sorted(path.name for path in (day_dir / '32k').glob('segment_*.ts'))
+    assert [line for line in playlist.splitlines() if line.endswith('.ts')] == segments
+    assert not list((day_dir / '32k').glob('.*'))
+
+
+def test_a_failed_worker_does_not_stop_the_others(tmp_path, monkeypatch, caplog):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+
+    import renditions
+
+    class BrokenPool:
+        def __init__(self, max_workers):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def submit(self, fn, source, day_dir, bitrate, *args):
+            future = Future()
+            if bitrate == '64k':
+                future.set_exception(BrokenProcessPool('A worker died.'))
+            else:
+                future.set_result({'bitrate': bitrate, 'file': f'{bitrate}.mp3', 'playlist': f'{bitrate}/index.m3u8'})
+            return future
+
+    monkeypatch.setattr(renditions, 'ProcessPoolExecutor', BrokenPool)
+    source = tmp_path / 'prayer_2024-05-02.mp3'
+    source.write_bytes(b'audio')
+
+    results = encode_renditions([source], tmp_path / 'renditions', RenditionSettings(bitrates=('32k', '64k')))
+
+    assert results[source] is None
+    assert 'A worker died.' in caplog.text
+    # The rendition that did finish is kept.
+    assert set(load_day_manifest(tmp_path / 'renditions' / source.stem)['renditions']) == {'32k'}
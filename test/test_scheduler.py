@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+from scheduler import DailySchedule, run_daily
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.time = start
+        self.sleeps = []
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += timedelta(seconds=seconds)
+
+
+def test_jitter_is_bounded_and_stable_per_day():
+    schedule = DailySchedule('05:00', jitter=600)
+    day = datetime(2024, 5, 1).date()
+    due = schedule.due_time(day)
+    assert datetime(2024, 5, 1, 5, 0) <= due <= datetime(2024, 5, 1, 5, 10)
+    assert DailySchedule('05:00', jitter=600).due_time(day) == due
+
+
+def test_catch_up_runs_a_missed_day_only_when_enabled():
+    started = datetime(2024, 5, 1, 9, 0)
+    assert DailySchedule('05:00', catch_up=True).should_run(started, False, started)
+    assert not DailySchedule('05:00', catch_up=False).should_run(started, False, started)
+    assert not DailySchedule('05:00').should_run(started, True, started)
+    # Already running before 05:00: the run happens either way.
+    assert DailySchedule('05:00', catch_up=False).should_run(started, False, datetime(2024, 5, 1, 4, 0))
+
+
+def test_runs_once_a_day_at_the_scheduled_time():
+    clock = FakeClock(datetime(2024, 5, 1, 4, 0))
+    done = set()
+    runs = []
+
+    def job():
+        runs.append(clock.now())
+        done.add(clock.now().date())
+
+    run_daily(job, lambda day: day in done, lambda: DailySchedule('05:00', jitter=120),
+              now=clock.now, sleep=clock.sleep, max_runs=2)
+
+    assert [run.date() for run in runs] == [datetime(2024, 5, 1).date(), datetime(2024, 5, 2).date()]
+    for run in runs:
+        assert timedelta(hours=5) <= run - datetime.combine(run.date(), datetime.min.time()) <= timedelta(hours=5, minutes=3)
+    assert max(clock.sleeps) <= 60
+
+
+def test_failed_job_is_retried_later(caplog):
+    clock = FakeClock(datetime(2024, 5, 1, 6, 0))
+    attempts = []
+
+    def job():
+        attempts.append(clock.now())
+        if len(attempts) == 1:
+            raise RuntimeError("network down")
+
+    run_daily(job, lambda day: len(attempts) > 1, lambda: DailySchedule('05:00'),
+              now=clock.now, sleep=clock.sleep, max_runs=2)
+
+    assert attempts[1] - attempts[0] >= timedelta(minutes=15)
+    assert 'network down' in caplog.text
+
+
+def test_failed_synthesis_is_retried_with_the_same_prayer(tmp_path, monkeypatch):
+    import configparser
+    import main
+
+    config = configparser.ConfigParser()
+    config.read_string("""
+[Paths]
+CycleStateFile = data/cycle.json
+OutputDir = output
+DailyManifestFile = output/manifest.json
+""")
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+    prayers = [{'title': f"PRAYER {i}", 'body': 'Amen.'} for i in range(5)]
+
+    class FlakyEngine:
+        """Fails the first synthesis, as a TTS outage would, and then works."""
+        titles = []
+
+        async def synthesize_to_file(self, text, path, voice=None):
+            FlakyEngine.titles.append(text.split('titled: ')[1].split('.')[0])
+            if len(FlakyEngine.titles) == 1:
+                return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'audio')
+            return True
+
+    start = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
+    clock = FakeClock(start)
+    engine = FlakyEngine()
+    run_daily(lambda: main.run_daily_prayer_generation(config, prayers, engine),
+              lambda day: main.is_day_done(config, day), lambda: DailySchedule('05:00'),
+              now=clock.now, sleep=clock.sleep, max_runs=2)
+
+    # The failed day was not counted as done, and the retry used the same prayer.
+    assert len(FlakyEngine.titles) == 2 and FlakyEngine.titles[0] == FlakyEngine.titles[1]
+    assert clock.sleeps[0] >= 15 * 60
+    assert main.is_day_done(config, start.date())
+
+
+def test_reloading_config_sets_up_logging_again(tmp_path, monkeypatch):
+    import logging
+
+    import logger_setup
+    import main
+    import scheduler
+
+    config_text = "[Paths]\nCycleStateFile = cycle.json\nOutputDir = output\nDailyManifestFile = output/manifest.json\n"
+    (tmp_path / 'config.ini').write_text(config_text + "LogFile = first.log\n")
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+
+    def fake_run_daily(job, is_done, schedule, on_config_change, config_path):
+        config_path.write_text(config_text + "LogFile = second.log\n")
+        on_config_change()
+        logging.getLogger().info("after the reload")
+
+    monkeypatch.setattr(scheduler, 'run_daily', fake_run_daily)
+    main.run_scheduler()
+    logger_setup._stop_listener()
+
+    assert "after the reload" in (tmp_path / 'second.log').read_text()
+    assert "after the reload" not in (tmp_path / 'first.log').read_text()
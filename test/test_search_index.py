@@ -0,0 +1,67 @@
+from search_index import SearchIndex, parse_query, snippet, tokenize, update_search_index
+
+PRAYERS = [
+    {'title': 'THE VALLEY OF VISION', 'body': 'Lord, high and holy, meek and lowly, thou hast brought me to the valley of vision.'},
+    {'title': 'MORNING', 'body': 'Compassionate Lord, thy mercies have brought me to the dawn of another day. Morning light, morning grace.'},
+    {'title': 'EVENING', 'body': 'O Lord, the vision of thy grace fades not with the evening light.'},
+]
+
+
+def test_tokenize_and_parse_query():
+    assert tokenize("Thou’rt the LORD, my God!") == ["thou'rt", 'the', 'lord', 'my', 'god']
+    assert parse_query('grace "valley of vision" Light') == (['grace', 'light'], [['valley', 'of', 'vision']])
+
+
+def test_bm25_ranks_more_frequent_terms_higher():
+    index = SearchIndex()
+    index.update(PRAYERS)
+
+    results = index.search('morning light')
+    assert [title for _, _, title in results] == ['MORNING', 'EVENING']
+    assert results[0][1] == 1
+    assert index.search('nonexistent') == []
+
+
+def test_phrases_must_match_in_order():
+    index = SearchIndex()
+    index.update(PRAYERS)
+
+    assert [title for _, _, title in index.search('"valley of vision"')] == ['THE VALLEY OF VISION']
+    assert index.search('"vision of valley"') == []
+    # The title is part of the text, so a phrase can run from the title into the body.
+    assert [title for _, _, title in index.search('"morning compassionate lord"')] == ['MORNING']
+
+
+def test_incremental_update_and_reload(tmp_path):
+    path = tmp_path / 'index.json'
+    update_search_index(path, PRAYERS)
+
+    changed = [{'title': 'NIGHT', 'body': 'Watch over me in the night.'}] + PRAYERS[:1] + PRAYERS[2:]
+    index = SearchIndex.load(path)
+    assert index.update(changed) == (1, 1)
+    assert index.search('night')[0][1:] == (0, 'NIGHT')
+    # Unchanged prayers now point at their new places.
+    assert index.search('"valley of vision"')[0][1] == 1
+    assert index.search('dawn') == []
+
+    index.save(path)
+    reloaded = SearchIndex.load(path)
+    assert reloaded.search('grace') == index.search('grace')
+    assert SearchIndex.load(tmp_path / 'missing.json') is None
+
+
+def test_reordered_prayers_are_saved(tmp_path):
+    path = tmp_path / 'index.json'
+    update_search_index(path, PRAYERS)
+    update_search_index(path, PRAYERS[::-1])
+
+    assert SearchIndex.load(path).search('"valley of vision"')[0][1] == 2
+
+
+def test_snippet_prefers_the_phrase_even_across_lines():
+    body = ('O Lord, thy deliverance came early, ' + 'and many words of praise follow it here. ' * 4
+            + 'Yet thy\ngrace is sufficient for me.')
+
+    assert snippet(body, '"thy grace"').startswith('…') and 'thy grace is sufficient' in snippet(body, '"thy grace"')
+    assert snippet(body, 'thy').startswith('O Lord, thy deliverance')
+    assert snippet(body, 'missing').startswith('O Lord')
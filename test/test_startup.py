@@ -0,0 +1,19 @@
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1] / 'src' / 'valley_of_vision_app'
+
+# Modules that are slow to import and only needed to re-parse the PDF or to
+# talk to a TTS service or post-process audio.
+HEAVY_MODULES = ['asyncio', 'fitz', 'pymupdf', 'httpx', 'openai', 'gtts', 'dotenv', 'pdf_parser', 'tts_engine', 'numpy']
+
+
+def test_main_imports_no_heavy_modules():
+    # A fresh interpreter, since the other tests import all of these.
+    code = (
+        "import sys, main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
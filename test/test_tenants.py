@@ -0,0 +1,94 @@
+import configparser
+import json
+import textwrap
+
+import pytest
+
+from tenants import RenderJob, Tenant, group_jobs, load_tenants
+
+PATHS = """
+[Paths]
+CycleStateFile = data/processed/prayer_cycle.json
+OutputDir = output
+DailyManifestFile = output/manifest.json
+LogFile = app.log
+"""
+
+
+def make_config(text):
+    config = configparser.ConfigParser()
+    config.read_string(PATHS + textwrap.dedent(text))
+    return config
+
+
+def test_single_default_tenant_uses_paths(tmp_path):
+    [tenant] = load_tenants(make_config(""), tmp_path)
+    assert tenant.name == 'default'
+    assert tenant.cycle_state_file == tmp_path / 'data/processed/prayer_cycle.json'
+    assert tenant.manifest_file == tmp_path / 'output/manifest.json'
+    assert tenant.voice is None and tenant.intro is None
+
+
+def test_tenant_sections_get_their_own_files(tmp_path):
+    tenants = load_tenants(make_config("""
+        [Tenant.youth]
+        Voice = nova
+        Intro = Hello friends.
+        [Tenant.elders]
+        OutputDir = audio/elders
+    """), tmp_path)
+
+    youth, elders = tenants
+    assert (youth.name, youth.voice, youth.intro) == ('youth', 'nova', 'Hello friends.')
+    assert youth.cycle_state_file == tmp_path / 'data/processed/cycles/youth.json'
+    assert youth.output_dir == tmp_path / 'output/youth'
+    assert elders.manifest_file == tmp_path / 'audio/elders/manifest.json'
+
+
+def test_group_jobs_shares_same_text_and_voice(tmp_path):
+    a, b, c = (Tenant(name, tmp_path, tmp_path, tmp_path, voice=voice)
+               for name, voice in [('a', 'onyx'), ('b', 'onyx'), ('c', 'nova')])
+    jobs = [RenderJob(t, None, 'T', 'same text', tmp_path / t.name) for t in (a, b, c)]
+    jobs.append(RenderJob(a, None, 'U', 'other text', tmp_path / 'a2'))
+
+    assert [[job.tenant.name for job in group] for group in group_jobs(jobs)] == [['a', 'b'], ['c'], ['a']]
+
+
+def test_daily_run_serves_every_tenant_in_one_pass(tmp_path, monkeypatch):
+    pytest.importorskip('httpx')
+    import main
+    from tts_engine import TTSEngine
+
+    class CountingEngine(TTSEngine):
+        name = 'counting'
+        texts = []
+
+        async def _synthesize(self, text, voice):
+            CountingEngine.texts.append((text, voice))
+            return b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+    (tmp_path / 'config.ini').write_text(PATHS + """
+[Tenant.first]
+Voice = onyx
+[Tenant.second]
+Voice = onyx
+[Tenant.third]
+Voice = onyx
+Intro = A different welcome.
+""")
+    monkeypatch.setattr(main, 'PROJECT_ROOT', tmp_path)
+    monkeypatch.setattr(main, '_load_prayers', lambda config: [{'title': 'THE ONLY PRAYER', 'body': 'Amen.'}])
+    monkeypatch.setattr(main, '_create_engine', lambda config: CountingEngine(max_chunk_chars=4000))
+
+    main.run_daily_prayer_generation()
+
+    for name in ('first', 'second', 'third'):
+        manifest = json.loads((tmp_path / 'output' / name / 'manifest.json').read_text())
+        [(day, entry)] = manifest['days'].items()
+        assert entry['title'] == 'THE ONLY PRAYER'
+        assert (tmp_path / 'output' / name / entry['file']).exists()
+        assert (tmp_path / 'data/processed/cycles' / f'{name}.json').exists()
+    # The first two tenants share one synthesis; the third has its own intro.
+    titles = [text for text, _ in CountingEngine.texts if text.startswith("Today's prayer")]
+    assert len(titles) == 2
+    assert ('A different welcome.', 'onyx') in CountingEngine.texts
@@ -0,0 +1,25 @@
+from text_chunker import chunk_text, split_sentences
+
+
+def test_split_sentences_keeps_punctuation_and_ellipses():
+    paragraph = "O Lord, hear me... Thou art holy! Art thou near? Yes. Amen…"
+    assert split_sentences(paragraph) == ["O Lord, hear me...", "Thou art holy!", "Art thou near?", "Yes.", "Amen…"]
+
+
+def test_chunks_never_cross_paragraphs_and_respect_the_limit():
+    intro = "Good morning. Let us pray."
+    body = " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = chunk_text(f"{intro}\n\n{body}\n\nAMEN.", max_chars=120)
+
+    assert chunks[0] == intro
+    assert chunks[-1] == "AMEN."
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert all(chunk.endswith('.') for chunk in chunks)
+    assert " ".join(chunks[1:-1]) == body
+
+
+def test_overlong_sentence_is_split_between_words():
+    sentence = "word " * 100
+    chunks = chunk_text(sentence, max_chars=50)
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == sentence.split()
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('httpx')
+
+import tts_engine
+from audio_cache import AudioCache
+from tts_engine import TTSEngine, TTSError
+from ttsopenai_synthesizer import TTSOpenAIEngine
+
+FAKE_MP3 = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+
+class MockTTSServer(ThreadingHTTPServer):
+    """A local stand-in for the TTS services that records what it was sent."""
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, status=200):
+        super().__init__(('127.0.0.1', 0), MockTTSHandler)
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.client_ports = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class MockTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers), json.loads(body)))
+            server.client_ports.add(self.client_address[1])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        payload = FAKE_MP3 if server.status == 200 else b'{"error": "bad request"}'
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**kwargs):
+        server = MockTTSServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fake_api_key(monkeypatch):
+    monkeypatch.setattr(tts_engine, '_dotenv_loaded', True)
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+
+
+def test_ttsopenai_engine_pools_connections_and_limits_concurrency(mock_server):
+    server = mock_server(delay=0.05)
+
+    async def run():
+        async with TTSOpenAIEngine(url=f"{server.url}/tts", max_concurrency=2) as engine:
+            return await engine.synthesize_many([f"Text {i}" for i in range(8)], voice='00002')
+
+    results = asyncio.run(run())
+
+    assert results == [FAKE_MP3] * 8
+    assert server.max_in_flight == 2
+    assert len(server.client_ports) <= 2
+    path, headers, body = server.requests[0]
+    assert path == '/tts' and headers['x-api-key'] == 'test-key'
+    assert body['voice_id'] == '00002'
+
+
+def test_ttsopenai_engine_reports_http_errors(mock_server, tmp_path):
+    server = mock_server(status=400)
+
+    async def run():
+        async with TTSOpenAIEngine(url=f"{server.url}/tts") as engine:
+            with pytest.raises(TTSError):
+                await engine.synthesize("Hello")
+            return await engine.synthesize_to_file("Hello", tmp_path / 'out.mp3')
+
+    assert asyncio.run(run()) is False
+    assert not (tmp_path / 'out.mp3').exists()
+
+
+def test_openai_engine_uses_shared_client(mock_server, tmp_path):
+    pytest.importorskip('openai')
+    from tts_synthesizer import OpenAITTSEngine
+
+    server = mock_server()
+    engine = OpenAITTSEngine(base_url=f"{server.url}/v1")
+
+    assert tts_engine.run_sync(engine.synthesize_to_file("Hello", tmp_path / 'out.mp3'))
+    assert tts_engine.run_sync(engine.synthesize_to_file("Again", tmp_path / 'again.mp3'))
+    assert (tmp_path / 'out.mp3').read_bytes() == FAKE_MP3
+    assert [r[0] for r in server.requests] == ['/v1/audio/speech'] * 2
+    assert server.requests[0][2]['voice'] == 'onyx'
+    assert len(server.client_ports) == 1
+
+
+def test_rate_limit_spaces_out_requests():
+    class InstantEngine(TTSEngine):
+        async def _synthesize(self, text, voice):
+            return text.encode()
+
+    async def run():
+        engine = InstantEngine(max_concurrency=1, rate_limit=20)
+        start = time.monotonic()
+        await engine.synthesize_many(["a"] * 5)
+        return time.monotonic() - start
+
+    # One request may start at once, then one every 1/20 s.
+    assert asyncio.run(run()) >= 0.19
+
+
+def test_long_text_is_chunked_and_joined_in_order():
+    class EchoEngine(TTSEngine):
+        async def _synthesize(self, text, voice):
+            # Later chunks finish first, to prove the join keeps reading order.
+            await asyncio.sleep(0.01 * (10 - len(text) % 10))
+            return b'\xff\xfb\x90\x00' + text.encode().ljust(413, b'\x00')
+
+    text = "First sentence here. Second one.\n\nA new paragraph."
+    audio = asyncio.run(EchoEngine(max_chunk_chars=25).synthesize_long(text))
+
+    frames = [audio[i:i + 417] for i in range(0, len(audio), 417)]
+    assert [f[4:].rstrip(b'\x00').decode() for f in frames] == [
+        "First sentence here.", "Second one.", "A new paragraph.",
+    ]
+
+
+def test_cached_segments_skip_the_service(mock_server, tmp_path):
+    server = mock_server(delay=0.05)
+    cache = AudioCache(tmp_path / 'cache')
+
+    async def run():
+        async with TTSOpenAIEngine(url=f"{server.url}/tts", cache=cache) as engine:
+            # Identical chunks requested together share a single request.
+            first = await engine.synthesize_many(["Amen."] * 3 + ["Selah."])
+        async with TTSOpenAIEngine(url=f"{server.url}/tts", cache=cache) as engine:
+            second = await engine.synthesize_many(["Amen.", "Selah."])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == [FAKE_MP3] * 4 and second == [FAKE_MP3] * 2
+    assert sorted(r[2]['input'] for r in server.requests) == ["Amen.", "Selah."]
+
+
+def test_failed_file_resumes_from_finished_parts(tmp_path):
+    class FlakyEngine(TTSEngine):
+        def __init__(self, **options):
+            super().__init__(**options)
+            self.requested = []
+            self.fail_on = "Second one."
+
+        async def _stream(self, text, voice):
+            self.requested.append(text)
+            yield b'\xff\xfb\x90\x00'
+            if text == self.fail_on:
+                raise TTSError("connection dropped")
+            yield text.encode().ljust(413, b'\x00')
+
+    output = tmp_path / 'prayer.mp3'
+    engine = FlakyEngine(max_chunk_chars=25)
+    text = "First sentence here. Second one.\n\nA new paragraph."
+
+    assert asyncio.run(engine.synthesize_to_file(text, output)) is False
+    assert not output.exists()
+    # Only whole parts are kept, never the half-streamed one.
+    assert len(list((tmp_path / 'prayer.mp3.parts').glob('*.mp3'))) == 2
+
+    engine.fail_on = None
+    engine.requested.clear()
+    assert asyncio.run(engine.synthesize_to_file(text, output)) is True
+    assert engine.requested == ["Second one."]
+    assert not (tmp_path / 'prayer.mp3.parts').exists()
+
+    audio = output.read_bytes()
+    frames = [audio[i:i + 417] for i in range(0, len(audio), 417)]
+    assert [f[4:].rstrip(b'\x00').decode() for f in frames] == [
+        "First sentence here.", "Second one.", "A new paragraph.",
+    ]
+    assert list(tmp_path.iterdir()) == [output]
+
+
+def test_cancelled_owner_does_not_cancel_other_waiters(tmp_path):
+    class SlowEngine(TTSEngine):
+        async def _synthesize(self, text, voice):
+            await asyncio.sleep(0.5)
+            return FAKE_MP3
+
+    async def run():
+        engine = SlowEngine(cache=AudioCache(tmp_path / 'cache'))
+        # The first job gives up on the shared request (as a failover timeout does).
+        owner = asyncio.ensure_future(asyncio.wait_for(engine.synthesize("Amen."), 0.1))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(engine.synthesize("Amen."))
+        return await asyncio.gather(owner, waiter, return_exceptions=True)
+
+    owner_result, waiter_result = asyncio.run(run())
+    assert isinstance(owner_result, asyncio.TimeoutError)
+    # The other job gets an ordinary error it can fail over from, not CancelledError.
+    assert isinstance(waiter_result, TTSError)
+
+
+def test_gtts_engine_uses_the_public_api(monkeypatch):
+    gtts = pytest.importorskip('gtts')
+    from gtts_synthesizer import GTTSEngine
+
+    def write_to_fp(self, fp):
+        if 'fail' in self.text:
+            raise gtts.gTTSError("503 (Service Unavailable)")
+        fp.write(b'\xff\xfb\x90\x00' + self.text.encode().ljust(413, b'\x00'))
+
+    monkeypatch.setattr(gtts.gTTS, 'write_to_fp', write_to_fp)
+    engine = GTTSEngine(max_chunk_chars=25)
+    audio = asyncio.run(engine.synthesize_long("First sentence here. Second one."))
+    assert [audio[i + 4:i + 417].rstrip(b'\x00').decode() for i in range(0, len(audio), 417)] == [
+        "First sentence here.", "Second one.",
+    ]
+    with pytest.raises(TTSError):
+        asyncio.run(engine.synthesize("This will fail."))
@@ -0,0 +1,162 @@
+import asyncio
+import configparser
+
+import pytest
+
+from tts_engine import TTSEngine, TTSError
+from tts_failover import Backend, FailoverEngine, LatencyTracker, create_engine_from_config
+
+
+class StubEngine(TTSEngine):
+    """A backend that answers after `delay` seconds, failing its first `failures` requests."""
+
+    def __init__(self, name, delay=0.0, failures=0):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self.cancelled = 0
+
+    async def _synthesize(self, text, voice):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.calls <= self.failures:
+            raise TTSError(f"{self.name} is down")
+        return f"{self.name}:{text}".encode()
+
+
+def test_falls_back_to_the_next_backend():
+    primary = StubEngine('primary', failures=10)
+    secondary = StubEngine('secondary')
+    engine = FailoverEngine([Backend(primary, retries=1, backoff=0), Backend(secondary)])
+
+    assert asyncio.run(engine.synthesize('Amen.')) == b'secondary:Amen.'
+    assert primary.calls == 2
+    assert secondary.calls == 1
+
+
+def test_retries_before_failing_over():
+    primary = StubEngine('primary', failures=2)
+    secondary = StubEngine('secondary')
+    engine = FailoverEngine([Backend(primary, retries=2, backoff=0.01), Backend(secondary)])
+
+    assert asyncio.run(engine.synthesize('Amen.')) == b'primary:Amen.'
+    assert secondary.calls == 0
+
+
+def test_timeout_moves_on_and_total_failure_raises():
+    slow = StubEngine('slow', delay=5)
+    engine = FailoverEngine([Backend(slow, timeout=0.05), Backend(StubEngine('broken', failures=10))])
+
+    with pytest.raises(TTSError) as excinfo:
+        asyncio.run(engine.synthesize('Amen.'))
+    assert 'slow: timed out' in str(excinfo.value)
+    assert 'broken' in str(excinfo.value)
+
+
+def test_hedges_a_slow_primary_after_its_p95(tmp_path):
+    latency = LatencyTracker(tmp_path / 'latency.json')
+    for _ in range(20):
+        latency.record('primary', 0.02)
+    primary = StubEngine('primary', delay=2)
+    secondary = StubEngine('secondary', delay=0.01)
+    engine = FailoverEngine([Backend(primary), Backend(secondary)], hedge=True, latency=latency)
+
+    async def run():
+        async with engine:
+            return await engine.synthesize('Amen.')
+
+    assert asyncio.run(run()) == b'secondary:Amen.'
+    assert primary.cancelled == 1
+
+    # The history is saved on close and picked up by the next run.
+    assert LatencyTracker(tmp_path / 'latency.json').p95('primary') == pytest.approx(0.02)
+
+
+def test_no_hedge_without_latency_history():
+    primary = StubEngine('primary', delay=0.05)
+    secondary = StubEngine('secondary')
+    engine = FailoverEngine([Backend(primary), Backend(secondary)], hedge=True)
+
+    assert asyncio.run(engine.synthesize('Amen.')) == b'primary:Amen.'
+    assert secondary.calls == 0
+
+
+def test_chain_from_config(tmp_path):
+    pytest.importorskip('httpx')
+    config = configparser.ConfigParser()
+    config.read_string("""
+        [TTS]
+        Backends = ttsopenai, openai
+        Hedge = true
+        Timeout = 30
+        Retries = 1
+        [TTS.ttsopenai]
+        Voice = 00002
+        Timeout = 5
+    """)
+    engine = create_engine_from_config(config, tmp_path)
+
+    names = [backend.name for backend in engine.backends]
+    assert names[0] == 'ttsopenai'
+    assert engine.backends[0].engine.voice == '00002'
+    assert engine.backends[0].timeout == 5
+    assert engine.backends[0].retries == 1
+    assert engine.hedge
+    if len(names) > 1:
+        assert engine.backends[1].timeout == 30
+
+
+def test_latency_is_kept_per_kind_of_call(tmp_path):
+    engine = FailoverEngine([Backend(StubEngine('primary', delay=0.01))], latency=LatencyTracker(tmp_path / 'l.json'))
+
+    async def run():
+        async with engine:
+            for _ in range(5):
+                await engine.synthesize('Amen.')
+            await engine.render_to_file('Amen.', tmp_path / 'amen.mp3')
+
+    asyncio.run(run())
+    latency = LatencyTracker(tmp_path / 'l.json')
+    assert latency.p95('primary', 'synthesize') is not None
+    # One whole-prayer render is not enough history, and is not mixed into the chunk timings.
+    assert latency.p95('primary', 'render_to_file') is None
+    assert len(latency._samples[('primary', 'synthesize')]) == 5
+
+
+def test_backend_without_its_package_is_left_out(tmp_path, monkeypatch):
+    pytest.importorskip('httpx')
+    import importlib.util
+
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name, *args: None if name == 'openai' else find_spec(name, *args))
+    config = configparser.ConfigParser()
+    config.read_string("""
+        [TTS]
+        Backends = openai, ttsopenai
+    """)
+    engine = create_engine_from_config(config, tmp_path)
+
+    assert [backend.name for backend in engine.backends] == ['ttsopenai']
+
+
+def test_queued_renders_do_not_time_out(tmp_path):
+    primary = StubEngine('primary', delay=0.1)
+    primary.max_concurrency = 1
+    secondary = StubEngine('secondary')
+    engine = FailoverEngine([Backend(primary, timeout=0.25), Backend(secondary)])
+
+    async def run():
+        # Each render waits its turn for the single request slot.
+        await asyncio.gather(*(engine.render_to_file(f'Amen {n}.', tmp_path / f'{n}.mp3') for n in range(8)))
+
+    asyncio.run(run())
+    assert primary.calls == 8 and secondary.calls == 0
+    assert (tmp_path / '7.mp3').read_bytes() == b'primary:Amen 7.'
+    # The time spent queued is not counted as the backend's latency.
+    assert engine.latency.p95('primary', 'render_to_file') < 0.25